@@ -0,0 +1,4 @@
+"""Standalone performance scripts; run them with ``python -m benchmarks.<name>`` from the repo root.
+
+Each script works on its own throwaway SQLite database, never on db.sqlite3.
+"""
@@ -0,0 +1,149 @@
+"""Shared setup for the benchmark scripts: a throwaway database and synthetic data."""
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+STATUSES = ('Denied', 'Under Review', 'Paid', 'Pending')
+INSURERS = (
+    'Aetna', 'Blue Cross', 'Cigna', 'Humana', 'Kaiser', 'Medicaid', 'Medicare',
+    'Molina', 'Oscar', 'UnitedHealthcare', 'WellCare', 'Anthem',
+)
+FIRST_NAMES = (
+    'James', 'Mary', 'Robert', 'Patricia', 'John', 'Jennifer', 'Michael', 'Linda', 'David', 'Elizabeth',
+    'William', 'Barbara', 'Richard', 'Susan', 'Joseph', 'Jessica', 'Thomas', 'Sarah', 'Carlos', 'Karen',
+)
+LAST_NAMES = (
+    'Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis', 'Rodriguez', 'Martinez',
+    'Hernandez', 'Lopez', 'Gonzalez', 'Wilson', 'Anderson', 'Thomas', 'Taylor', 'Moore', 'Jackson', 'Martin',
+    'Lee', 'Perez', 'Thompson', 'White', 'Harris', 'Sanchez', 'Clark', 'Ramirez', 'Lewis', 'Robinson',
+)
+CPT_CODES = ('99213', '99214', '99215', '80053', '85025', '93000', '71046', '36415', '97110', '99285')
+DENIAL_REASONS = ('Missing modifier', 'Not medically necessary', 'Duplicate claim', 'Prior authorization required', '')
+
+
+def setup_django(db_path: str = None) -> str:
+    """Configure Django against a fresh SQLite file and migrate it; returns the database path"""
+    if str(BASE_DIR) not in sys.path:
+        sys.path.insert(0, str(BASE_DIR))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'claims_burger.settings')
+    workdir = tempfile.mkdtemp(prefix='claims-bench-')
+    db_path = db_path or os.path.join(workdir, 'bench.sqlite3')
+    os.environ.setdefault('CLAIMS_CACHE_DIR', os.path.join(workdir, 'cache'))
+
+    import django
+    from django.conf import settings
+
+    settings.DATABASES['default']['NAME'] = db_path
+    django.setup()
+
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+    return db_path
+
+
+def cleanup(db_path: str) -> None:
+    """Close connections and remove a database created by setup_django() in a temp directory"""
+    from django.db import connections
+
+    connections.close_all()
+    workdir = os.path.dirname(db_path)
+    if os.path.basename(workdir).startswith('claims-bench-'):
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _insert(cursor, model, columns, rows, batch_size=10000):
+    table = model._meta.db_table
+    placeholders = ', '.join(['%s'] * len(columns))
+    sql = f'INSERT INTO {table} ({", ".join(columns)}) VALUES ({placeholders})'
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            cursor.executemany(sql, batch)
+            batch = []
+    if batch:
+        cursor.executemany(sql, batch)
+
+
+def seed(claims: int, reviewers: int = 50, flag_ratio: float = 0.05, note_ratio: float = 0.1,
+         detail_ratio: float = 1.0, seed_value: int = 42, supervisors: int = 2) -> dict:
+    """Insert synthetic users, claims, details, flags and notes with raw executemany.
+
+    Signals and search triggers are bypassed for speed, so the KPI summary and
+    search index are rebuilt at the end.
+    Every account's password is 'bench'.
+    Returns ``{'reviewers': [user ids], 'supervisors': [user ids], 'admin': admin id}``.
+    """
+    from django.contrib.auth.models import User
+    from django.db import connection, transaction
+
+    from claims import cpt, kpis, search
+    from claims.models import Claim, ClaimDetail, Flag, Note, UserProfile
+
+    rng = random.Random(seed_value)
+    started = time.perf_counter()
+
+    admin = User.objects.create_user('bench-admin', password='bench', is_staff=True, is_superuser=True)
+    UserProfile.objects.create(user=admin, role='admin')
+    # Hashing once and copying keeps seeding fast with many accounts
+    password = admin.password
+    User.objects.bulk_create(User(username=f'bench-reviewer-{i}', password=password) for i in range(reviewers))
+    User.objects.bulk_create(User(username=f'bench-supervisor-{i}', password=password) for i in range(supervisors))
+    users = list(User.objects.filter(username__startswith='bench-reviewer-').order_by('id'))
+    supervisor_users = list(User.objects.filter(username__startswith='bench-supervisor-').order_by('id'))
+    UserProfile.objects.bulk_create(UserProfile(user=u, role='reviewer') for u in users)
+    UserProfile.objects.bulk_create(UserProfile(user=u, role='supervisor') for u in supervisor_users)
+    user_ids = [u.id for u in users]
+    all_user_ids = user_ids + [admin.id]
+
+    base_time = datetime(2024, 1, 1)
+    base_date = date(2023, 1, 1)
+
+    def claim_rows():
+        for i in range(1, claims + 1):
+            billed = rng.randint(10000, 5000000) / 100
+            paid = round(billed * rng.choice((0, 0.5, 0.8, 1.0)), 2)
+            created = base_time + timedelta(seconds=i * 30 + rng.randint(0, 29))
+            yield (
+                i, f'C{i:08d}', f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}', f'{billed:.2f}', f'{paid:.2f}',
+                rng.choice(STATUSES), rng.choice(INSURERS), (base_date + timedelta(days=rng.randint(0, 700))).isoformat(),
+                rng.choice(user_ids) if rng.random() < 0.8 else None,
+                created.isoformat(' '), created.isoformat(' '),
+            )
+
+    def detail_rows():
+        for i in range(1, claims + 1):
+            if rng.random() < detail_ratio:
+                codes = ','.join(rng.sample(CPT_CODES, rng.randint(1, 4)))
+                yield (i, codes, rng.choice(DENIAL_REASONS), base_time.isoformat(' '))
+
+    def flag_rows():
+        for i in range(int(claims * flag_ratio)):
+            yield (rng.randint(1, claims), rng.choice(all_user_ids), 'Underpayment', (base_time + timedelta(minutes=i)).isoformat(' '))
+
+    def note_rows():
+        for i in range(int(claims * note_ratio)):
+            stamp = (base_time + timedelta(minutes=i)).isoformat(' ')
+            yield (rng.randint(1, claims), rng.choice(all_user_ids), f'Follow up #{i}', stamp, stamp)
+
+    with search.suspended(), connection.cursor() as cursor, transaction.atomic():
+        _insert(cursor, Claim, ['id', 'claim_id', 'patient_name', 'billed_amount', 'paid_amount', 'status',
+                                'insurer_name', 'discharge_date', 'assigned_to_id', 'created_at', 'updated_at'], claim_rows())
+        _insert(cursor, ClaimDetail, ['claim_id', 'cpt_codes', 'denial_reason', 'created_at'], detail_rows())
+        _insert(cursor, Flag, ['claim_id', 'user_id', 'reason', 'created_at'], flag_rows())
+        _insert(cursor, Note, ['claim_id', 'user_id', 'content', 'created_at', 'updated_at'], note_rows())
+    kpis.rebuild()
+    cpt.rebuild()
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    print(f'Seeded {claims:,} claims in {time.perf_counter() - started:.1f}s', file=sys.stderr)
+    return {'reviewers': user_ids, 'supervisors': [u.id for u in supervisor_users], 'admin': admin.id}
@@ -0,0 +1,127 @@
+"""Compare model-instance and projected claim reads: memory per row and serialization throughput.
+
+Measures the shapes the views used to read (full Claim instances, with
+amounts converted by float() in Python) against ``.only()`` and the lean
+projections in claims/serializers.py that the list view, /api/claims/ and
+the JSON export now use.
+
+    python -m benchmarks.projections                       # 1M claims
+    python -m benchmarks.projections --claims 100000 --rows 20000
+    python -m benchmarks.projections --db /tmp/claims1m.sqlite3   # seeded once, kept
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+
+from benchmarks.common import cleanup, seed, setup_django
+
+CHUNK_SIZE = 2000
+
+
+def _model_record(claim) -> dict:
+    """How /api/claims/ used to build each record"""
+    return {
+        'id': claim.claim_id,
+        'patient_name': claim.patient_name,
+        'billed_amount': float(claim.billed_amount),
+        'paid_amount': float(claim.paid_amount),
+        'status': claim.status,
+        'insurer_name': claim.insurer_name,
+        'discharge_date': claim.discharge_date.strftime('%Y-%m-%d') if claim.discharge_date else None,
+    }
+
+
+def memory_cases() -> list:
+    """``(label, queryset)`` for holding one list page / API response worth of rows"""
+    from claims.models import Claim
+    from claims.serializers import LIST_FIELDS, list_rows, record_values
+
+    ordered = Claim.objects.order_by('-created_at', '-id')
+    return [
+        ('list: model instances', ordered),
+        ('list: only()', ordered.only(*LIST_FIELDS)),
+        ('list: values() dicts', ordered.values(*LIST_FIELDS)),
+        ('list: list_rows() named tuples', list_rows(ordered)),
+        ('api: record_values() tuples', record_values(ordered)),
+    ]
+
+
+def throughput_cases() -> list:
+    """``(label, queryset, row -> record)`` producing /api/claims/ records"""
+    from claims.models import Claim
+    from claims.serializers import claim_record, record_values
+
+    api_fields = ('claim_id', 'patient_name', 'billed_amount', 'paid_amount', 'status', 'insurer_name', 'discharge_date')
+    return [
+        ('before: model instances + float()', Claim.objects.all(), _model_record),
+        ('only() + float()', Claim.objects.only(*api_fields), _model_record),
+        ('after: record_values() + claim_record()', record_values(Claim.objects.all()), claim_record),
+    ]
+
+
+def bytes_per_row(queryset, rows: int) -> float:
+    """Memory retained by a list of ``rows`` results, per row"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        held = list(queryset[:rows].iterator(chunk_size=CHUNK_SIZE))
+        retained = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    return retained / max(1, len(held))
+
+
+def serialize(queryset, to_record) -> tuple:
+    """Stream every row into JSON-encoded record batches; returns (rows, bytes, seconds)"""
+    from django.core.serializers.json import DjangoJSONEncoder
+
+    encode = DjangoJSONEncoder().encode
+    rows = size = 0
+    batch = []
+    started = time.perf_counter()
+    for row in queryset.iterator(chunk_size=CHUNK_SIZE):
+        batch.append(to_record(row))
+        if len(batch) >= CHUNK_SIZE:
+            size += len(encode(batch))
+            rows += len(batch)
+            batch = []
+    if batch:
+        size += len(encode(batch))
+        rows += len(batch)
+    return rows, size, time.perf_counter() - started
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--claims', type=int, default=1_000_000, help='Synthetic claims to generate (default 1M)')
+    parser.add_argument('--reviewers', type=int, default=50, help='Reviewer accounts to spread claims over')
+    parser.add_argument('--rows', type=int, default=100_000, help='Rows held in memory for the per-row measurement (default 100k)')
+    parser.add_argument('--db', help='SQLite file to use and keep; seeded only if it has no claims yet')
+    args = parser.parse_args()
+
+    db_path = setup_django(args.db)
+    try:
+        from claims.models import Claim
+
+        if not Claim.objects.exists():
+            seed(args.claims, reviewers=args.reviewers)
+        total = Claim.objects.count()
+
+        print(f'Memory per row ({min(args.rows, total):,} rows held in a list)')
+        for label, queryset in memory_cases():
+            print(f'  {label:<42} {bytes_per_row(queryset, args.rows):>8,.0f} B/row')
+
+        print(f'\nSerialization throughput ({total:,} rows as /api/claims/ JSON records)')
+        for label, queryset, to_record in throughput_cases():
+            rows, size, elapsed = serialize(queryset, to_record)
+            print(f'  {label:<42} {rows / elapsed:>10,.0f} rows/s  {elapsed:>6.2f}s  {size / 1e6:>7.1f} MB')
+    finally:
+        if not args.db:
+            cleanup(db_path)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
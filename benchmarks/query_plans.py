@@ -0,0 +1,121 @@
+"""Show SQLite query plans (EXPLAIN QUERY PLAN) and timings for the hot claim queries.
+
+Seeds a throwaway database, then explains the exact querysets the claims list,
+filters, search, dropdowns and claim detail views run, flagging full table
+scans and temporary sort B-trees (ranked searches always sort their matches).
+
+    python -m benchmarks.query_plans                     # 1M claims
+    python -m benchmarks.query_plans --claims 100000
+    python -m benchmarks.query_plans --baseline          # same, without the 0005 indexes
+"""
+import argparse
+import re
+import statistics
+import time
+
+from benchmarks.common import INSURERS, cleanup, setup_django, seed
+
+WARNINGS = (
+    (re.compile(r'\bSCAN claims_\w+\b(?! USING| VIRTUAL TABLE)'), 'full table scan'),
+    (re.compile(r'USE TEMP B-TREE FOR (RIGHT PART OF )?ORDER BY'), 'sorts in a temp B-tree'),
+)
+
+
+def _timed(queryset, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        list(queryset.all())
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1000
+
+
+def build_queries(users: dict, claims: int) -> list:
+    """``(label, queryset)`` pairs mirroring what the views execute"""
+    from django.contrib.auth.models import User
+    from django.db.models import Count, Sum
+
+    from claims.models import Claim, Flag, Note
+    from claims.pagination import KeysetPaginator
+    from claims.search import SEARCH_ORDERING
+
+    admin = User.objects.get(pk=users['admin'])
+    reviewer = User.objects.get(pk=users['reviewers'][0])
+    ordering = ('-created_at', '-id')
+
+    def listing(user, **filters):
+        return KeysetPaginator(Claim.objects.accessible_to(user).filter_list(**filters), ordering=ordering)
+
+    def searching(user, text, **filters):
+        claims = Claim.objects.accessible_to(user).filter_list(text, **filters).ranked(text)
+        return KeysetPaginator(claims, ordering=SEARCH_ORDERING)
+
+    # A cursor from the middle of the table, as if the user had scrolled far down
+    middle = Claim.objects.order_by(*ordering).values('created_at', 'id')[claims // 2]
+    deep_cursor = listing(admin).cursor_for(middle)
+    reviewer_middle = Claim.objects.filter(assigned_to=reviewer).order_by(*ordering).values('created_at', 'id')[10]
+    claim = Claim.objects.get(pk=claims // 3)
+
+    return [
+        ('list: admin, first page', listing(admin).page_queryset()),
+        ('list: admin, deep cursor', listing(admin).page_queryset(deep_cursor)),
+        ('list: reviewer, first page', listing(reviewer).page_queryset()),
+        ('list: reviewer, next page', listing(reviewer).page_queryset(listing(reviewer).cursor_for(reviewer_middle))),
+        ('list: status filter', listing(admin, status='Denied').page_queryset()),
+        ('list: insurer filter', listing(admin, insurer=INSURERS[0]).page_queryset()),
+        ('list: status + insurer filter', listing(admin, status='Denied', insurer=INSURERS[0]).page_queryset()),
+        ('list: reviewer + status filter', listing(reviewer, status='Paid').page_queryset()),
+        ('search: rare prefix', searching(admin, 'C0000042').page_queryset()),
+        ('search: name, two prefixes', searching(admin, 'carl rodr').page_queryset()),
+        ('search: reviewer, common word', searching(reviewer, 'smith').page_queryset()),
+        ('search: count for KPIs', Claim.objects.filter_list('carl rodr').order_by().values('status').annotate(n=Count('id'))),
+        ('dropdown: statuses', Claim.objects.order_by().values_list('status', flat=True).distinct()),
+        ('dropdown: insurers', Claim.objects.order_by().values_list('insurer_name', flat=True).distinct()),
+        ('kpis: reviewer totals', Claim.objects.filter(assigned_to=reviewer).order_by()
+            .values('assigned_to').annotate(n=Count('id'), billed=Sum('billed_amount'))),
+        ('kpis: status + insurer count', Claim.objects.filter(status='Denied', insurer_name=INSURERS[0]).order_by()
+            .values('status').annotate(n=Count('id'))),
+        ('detail: user flags', Flag.objects.filter(claim=claim, user=reviewer).order_by('-created_at')),
+        ('detail: all notes', Note.objects.filter(claim=claim).order_by('-created_at')),
+    ]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--claims', type=int, default=1_000_000, help='Synthetic claims to generate (default 1M)')
+    parser.add_argument('--reviewers', type=int, default=50, help='Reviewer accounts to spread claims over')
+    parser.add_argument('--repeat', type=int, default=5, help='Timed runs per query (median is reported)')
+    parser.add_argument('--db', help='SQLite file to create and keep (default: a temp file, removed afterwards)')
+    parser.add_argument('--baseline', action='store_true', help='Drop the composite indexes first, for comparison')
+    args = parser.parse_args()
+
+    db_path = setup_django(args.db)
+    from django.core.management import call_command
+
+    if args.baseline:
+        call_command('migrate', 'claims', '0004_kpisummary', verbosity=0)
+    users = seed(args.claims, reviewers=args.reviewers)
+
+    problems = 0
+    try:
+        for label, queryset in build_queries(users, args.claims):
+            plan = queryset.explain()
+            elapsed = _timed(queryset, args.repeat)
+            print(f'== {label}  ({elapsed:.2f} ms)')
+            for line in plan.splitlines():
+                print(f'   {line}')
+            for pattern, message in WARNINGS:
+                if pattern.search(plan):
+                    problems += 1
+                    print(f'   !! {message}')
+            print()
+    finally:
+        if not args.db:
+            cleanup(db_path)
+
+    print(f'{problems} potential problem(s) found')
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
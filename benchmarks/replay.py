@@ -0,0 +1,348 @@
+"""Replay a realistic request mix and report latency, queries and throughput per endpoint.
+
+Seeds a throwaway database (or reuses --db), generates a weighted mix of list,
+search, detail, flag, note, export, stats and API requests across admin,
+supervisor and reviewer accounts, and replays it through the Django test
+client. Each endpoint gets p50/p95/p99 latency, queries per request and
+throughput. Results can be written as JSON and compared with an earlier run.
+
+    python -m benchmarks.replay                                   # 10k claims, 2000 requests
+    python -m benchmarks.replay --claims 1m --requests 5000 --json after.json
+    python -m benchmarks.replay --claims 1m --compare before.json
+    python -m benchmarks.replay --record traffic.jsonl            # save the generated mix
+    python -m benchmarks.replay --traffic traffic.jsonl           # replay a saved or captured one
+
+Traffic files are JSON lines: ``{"endpoint", "method", "path", "role", "user", "data"}``,
+with ``role`` one of admin/supervisor/reviewer, ``user`` an optional username
+(defaults to the first seeded account of the role) and ``data`` an optional
+JSON body. Synthetic claim ids (C00000042) are deterministic, so a recording
+replays against any database seeded at the same scale.
+
+With --url the traffic goes to a running server over HTTP instead
+(``--concurrency`` threads; seeded accounts log in with password "bench").
+Query counts are only available in-process.
+"""
+import argparse
+import http.cookiejar
+import json
+import platform
+import random
+import re
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+from benchmarks.common import BASE_DIR, INSURERS, STATUSES, cleanup, seed, setup_django
+
+SCALES = {'10k': 10_000, '100k': 100_000, '1m': 1_000_000}
+
+# (endpoint, weight, roles that send it)
+MIX = (
+    ('list', 25, ('admin', 'supervisor', 'reviewer')),
+    ('list_filtered', 10, ('admin', 'supervisor', 'reviewer')),
+    ('search', 10, ('admin', 'reviewer')),
+    ('detail', 20, ('admin', 'supervisor', 'reviewer')),
+    ('flag', 5, ('admin', 'reviewer')),
+    ('note', 5, ('admin', 'reviewer')),
+    ('export', 2, ('admin', 'reviewer')),
+    ('stats', 10, ('admin', 'supervisor')),
+    ('analytics', 3, ('admin',)),
+    ('api', 10, ('admin', 'reviewer')),
+)
+SEARCH_TERMS = ('smith', 'carl rodr', 'maria', 'C0000042', 'johnson', 'aetna')
+
+
+def parse_scale(value: str) -> int:
+    return SCALES.get(value.lower()) or int(value.replace('_', '').replace(',', ''))
+
+
+def _users() -> dict:
+    """The seeded accounts per role, with the claim ids each reviewer may open"""
+    from django.contrib.auth.models import User
+
+    from claims.models import Claim
+
+    users = {
+        'admin': list(User.objects.filter(userprofile__role='admin').order_by('pk')[:1]),
+        'supervisor': list(User.objects.filter(userprofile__role='supervisor').order_by('pk')[:5]),
+        'reviewer': list(User.objects.filter(userprofile__role='reviewer').order_by('pk')[:10]),
+    }
+    claims = {
+        user.username: list(Claim.objects.filter(assigned_to=user).order_by('-created_at').values_list('claim_id', flat=True)[:500])
+        for user in users['reviewer']
+    }
+    return users, claims
+
+
+def generate(count: int, rng: random.Random) -> list:
+    """``count`` traffic entries drawn from MIX"""
+    from claims.models import Claim
+
+    users, reviewer_claims = _users()
+    roles = {role: [user.username for user in accounts] for role, accounts in users.items() if accounts}
+    all_claims = list(Claim.objects.order_by('-created_at').values_list('claim_id', flat=True)[:5000])
+    endpoints = [endpoint for endpoint, _, _ in MIX]
+    weights = [weight for _, weight, _ in MIX]
+    allowed = {endpoint: [role for role in endpoint_roles if role in roles] for endpoint, _, endpoint_roles in MIX}
+
+    traffic = []
+    while len(traffic) < count:
+        endpoint = rng.choices(endpoints, weights)[0]
+        if not allowed[endpoint]:
+            continue
+        role = rng.choice(allowed[endpoint])
+        username = rng.choice(roles[role])
+        claim_pool = reviewer_claims.get(username) if role == 'reviewer' else all_claims
+        if endpoint in ('detail', 'flag', 'note') and not claim_pool:
+            continue
+        method, data = 'GET', None
+        if endpoint == 'list':
+            path = '/'
+        elif endpoint == 'list_filtered':
+            params = {'status': rng.choice(STATUSES)}
+            if rng.random() < 0.5:
+                params['insurer'] = rng.choice(INSURERS)
+            path = '/?' + urllib.parse.urlencode(params)
+        elif endpoint == 'search':
+            path = '/?' + urllib.parse.urlencode({'search': rng.choice(SEARCH_TERMS)})
+        elif endpoint == 'detail':
+            path = f'/claim/{rng.choice(claim_pool)}/'
+        elif endpoint == 'flag':
+            method, path, data = 'POST', f'/claim/{rng.choice(claim_pool)}/flag/', {'reason': 'Replay check'}
+        elif endpoint == 'note':
+            method, path, data = 'POST', f'/claim/{rng.choice(claim_pool)}/note/', {'content': 'Replay note'}
+        elif endpoint == 'export':
+            # Narrow enough to be a realistic download at any scale
+            params = {'status': rng.choice(STATUSES)}
+            if role != 'reviewer':
+                params['insurer'] = rng.choice(INSURERS)
+            path = '/export/claims/csv/?' + urllib.parse.urlencode(params)
+        elif endpoint == 'stats':
+            path = '/api/admin/stats/'
+        elif endpoint == 'analytics':
+            path = '/api/admin/analytics/?' + urllib.parse.urlencode({'insurer': rng.choice(INSURERS)})
+        else:
+            path = '/api/claims/'
+        traffic.append({'endpoint': endpoint, 'method': method, 'path': path, 'role': role, 'user': username, 'data': data})
+    return traffic
+
+
+def _sample(entry: dict, status: int, elapsed: float, queries=None) -> dict:
+    return {'endpoint': entry['endpoint'], 'status': status, 'ms': elapsed * 1000, 'queries': queries}
+
+
+def replay_in_process(traffic: list) -> list:
+    """Send every entry through the test client, counting queries"""
+    from django.contrib.auth.models import User
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext
+
+    clients = {}
+    samples = []
+    for entry in traffic:
+        username = entry['user']
+        client = clients.get(username)
+        if client is None:
+            client = clients[username] = Client(HTTP_HOST='localhost')
+            client.force_login(User.objects.get(username=username))
+        body = json.dumps(entry['data']) if entry.get('data') is not None else ''
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = client.generic(entry['method'], entry['path'], body, content_type='application/json')
+            if response.streaming:
+                for _ in response.streaming_content:
+                    pass
+            elapsed = time.perf_counter() - started
+        samples.append(_sample(entry, response.status_code, elapsed, len(queries)))
+    return samples
+
+
+def _login(base_url: str, username: str, password: str) -> urllib.request.OpenerDirector:
+    jar = http.cookiejar.CookieJar()
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(jar))
+    login_url = f'{base_url}/auth/login/'
+    page = opener.open(login_url).read().decode()
+    token = re.search(r'name="csrfmiddlewaretoken" value="([^"]+)"', page).group(1)
+    body = urllib.parse.urlencode({'username': username, 'password': password, 'csrfmiddlewaretoken': token}).encode()
+    opener.open(urllib.request.Request(login_url, body, headers={'Referer': login_url}))
+    if not any(cookie.name == 'sessionid' for cookie in jar):
+        raise SystemExit(f'Could not log in to {base_url} as {username}')
+    return opener
+
+
+def replay_http(traffic: list, base_url: str, password: str, concurrency: int) -> list:
+    """Send every entry to a running server from ``concurrency`` threads"""
+    base_url = base_url.rstrip('/')
+    openers = {username: _login(base_url, username, password) for username in {entry['user'] for entry in traffic}}
+
+    def send(entry):
+        body = json.dumps(entry['data']).encode() if entry.get('data') is not None else None
+        request = urllib.request.Request(base_url + entry['path'], body, method=entry['method'],
+                                         headers={'Content-Type': 'application/json'})
+        started = time.perf_counter()
+        try:
+            with openers[entry['user']].open(request) as response:
+                while response.read(65536):
+                    pass
+                status = response.status
+        except urllib.error.HTTPError as e:
+            status = e.code
+        return _sample(entry, status, time.perf_counter() - started)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return list(pool.map(send, traffic))
+
+
+def _percentile(ordered: list, pct: float) -> float:
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def summarize(samples: list, wall_seconds: float) -> dict:
+    """Per-endpoint and overall latency percentiles, query counts, error counts and throughput"""
+    def stats(group):
+        ordered = sorted(sample['ms'] for sample in group)
+        queries = [sample['queries'] for sample in group if sample['queries'] is not None]
+        return {
+            'requests': len(group),
+            'errors': sum(1 for sample in group if sample['status'] >= 400),
+            'p50_ms': round(statistics.median(ordered), 2),
+            'p95_ms': round(_percentile(ordered, 95), 2),
+            'p99_ms': round(_percentile(ordered, 99), 2),
+            'mean_ms': round(statistics.fmean(ordered), 2),
+            'queries_mean': round(statistics.fmean(queries), 1) if queries else None,
+            'queries_max': max(queries) if queries else None,
+            # Requests per second of time spent serving this endpoint
+            'throughput_rps': round(len(group) / (sum(ordered) / 1000), 1) if sum(ordered) else None,
+        }
+
+    by_endpoint = {}
+    for sample in samples:
+        by_endpoint.setdefault(sample['endpoint'], []).append(sample)
+    overall = stats(samples)
+    overall['throughput_rps'] = round(len(samples) / wall_seconds, 1)
+    return {'endpoints': {name: stats(group) for name, group in sorted(by_endpoint.items())}, 'overall': overall}
+
+
+def _git_revision() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def print_report(report: dict) -> None:
+    header = f"{'endpoint':<15}{'reqs':>6}{'errs':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'queries':>9}{'req/s':>9}"
+    print(header)
+    print('-' * len(header))
+    rows = list(report['endpoints'].items()) + [('overall', report['overall'])]
+    for name, row in rows:
+        queries = '-' if row['queries_mean'] is None else f"{row['queries_mean']:.1f}"
+        print(f"{name:<15}{row['requests']:>6}{row['errors']:>6}{row['p50_ms']:>10.2f}{row['p95_ms']:>10.2f}"
+              f"{row['p99_ms']:>10.2f}{queries:>9}{row['throughput_rps'] or 0:>9.1f}")
+
+
+def print_comparison(base: dict, report: dict) -> None:
+    """p50/p95 and query deltas against an earlier JSON report"""
+    print(f"\nvs {base['meta'].get('revision') or 'baseline'} ({base['meta'].get('claims', '?')} claims)")
+    print(f"{'endpoint':<15}{'p50 ms':>22}{'p95 ms':>22}{'queries':>16}")
+    rows = list(report['endpoints'].items()) + [('overall', report['overall'])]
+    for name, row in rows:
+        old = base['endpoints'].get(name) if name != 'overall' else base['overall']
+        if not old:
+            continue
+        cells = []
+        for key in ('p50_ms', 'p95_ms'):
+            change = (row[key] - old[key]) / old[key] * 100 if old[key] else 0
+            cells.append(f"{old[key]:.1f} -> {row[key]:.1f} ({change:+.0f}%)")
+        queries = '-' if row['queries_mean'] is None or old['queries_mean'] is None else f"{old['queries_mean']:.1f} -> {row['queries_mean']:.1f}"
+        print(f"{name:<15}{cells[0]:>22}{cells[1]:>22}{queries:>16}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--claims', type=parse_scale, default=10_000, help='Claims to seed: 10k, 100k, 1m or a number (default 10k)')
+    parser.add_argument('--reviewers', type=int, default=50, help='Reviewer accounts to spread claims over')
+    parser.add_argument('--requests', type=int, default=2000, help='Requests to generate (ignored with --traffic)')
+    parser.add_argument('--warmup', type=int, default=50, help='Unreported requests sent first (default 50)')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed for data and traffic')
+    parser.add_argument('--db', help='SQLite file to use and keep; seeded only if it has no claims yet')
+    parser.add_argument('--traffic', help='Replay this JSONL traffic file instead of generating a mix')
+    parser.add_argument('--record', help='Write the generated traffic to this JSONL file')
+    parser.add_argument('--url', help='Replay against a running server at this URL instead of in-process')
+    parser.add_argument('--password', default='bench', help='Password of the accounts used with --url')
+    parser.add_argument('--concurrency', type=int, default=1, help='Parallel requests with --url (default 1)')
+    parser.add_argument('--json', dest='json_path', help='Write the report to this JSON file')
+    parser.add_argument('--compare', help='Print deltas against an earlier --json report')
+    args = parser.parse_args()
+
+    db_path = setup_django(args.db)
+    try:
+        from claims.models import Claim
+
+        if not Claim.objects.exists():
+            seed(args.claims, reviewers=args.reviewers, seed_value=args.seed)
+        claims = Claim.objects.count()
+
+        rng = random.Random(args.seed)
+        if args.traffic:
+            traffic = [json.loads(line) for line in Path(args.traffic).read_text().splitlines() if line.strip()]
+            users, _ = _users()
+            for entry in traffic:
+                entry['user'] = entry.get('user') or users[entry['role']][0].username
+        else:
+            traffic = generate(args.requests + args.warmup, rng)
+        if args.record:
+            Path(args.record).write_text(''.join(json.dumps(entry) + '\n' for entry in traffic))
+        warmup, measured = traffic[:args.warmup], traffic[args.warmup:]
+        if not measured:
+            raise SystemExit('No requests to replay')
+
+        def replay(entries):
+            if args.url:
+                return replay_http(entries, args.url, args.password, args.concurrency)
+            return replay_in_process(entries)
+
+        replay(warmup)
+        started = time.perf_counter()
+        samples = replay(measured)
+        wall = time.perf_counter() - started
+    finally:
+        if not args.db:
+            cleanup(db_path)
+
+    import django
+
+    report = summarize(samples, wall)
+    report['meta'] = {
+        'revision': _git_revision(),
+        'claims': claims,
+        'requests': len(samples),
+        'mode': 'http' if args.url else 'test-client',
+        'concurrency': args.concurrency if args.url else 1,
+        'seed': args.seed,
+        'traffic': args.traffic or 'generated',
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'recorded_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+    }
+    print(f"{len(samples)} requests against {claims:,} claims in {wall:.1f}s ({report['meta']['mode']})\n")
+    print_report(report)
+    if args.compare:
+        print_comparison(json.loads(Path(args.compare).read_text()), report)
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps(report, indent=2) + '\n')
+        print(f'\nReport written to {args.json_path}', file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
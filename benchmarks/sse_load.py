@@ -0,0 +1,297 @@
+"""Hold many concurrent admin SSE connections and time how fast events fan out to them.
+
+By default the ASGI application is driven in-process (no server needed):
+every connection is a real request through Django's ASGIHandler, the
+middleware and the events view, with an asyncio task standing in for the
+socket. Events are published with notify_clients() and their delivery
+latency to every connection is measured.
+
+    python -m benchmarks.sse_load                          # 2000 connections, 20 events
+    python -m benchmarks.sse_load --connections 5000 --events 50
+    python -m benchmarks.sse_load --burst 5000             # then 5000 events back-to-back
+
+With --url it opens real sockets against a running server instead, e.g.
+``CLAIMS_EVENT_BROKER=sqlite uvicorn claims_burger.asgi:application --workers 4``.
+It logs in with --username/--password and publishes by flagging --claim
+(the flags it creates are removed afterwards).
+"""
+import argparse
+import asyncio
+import json
+import re
+import resource
+import statistics
+import threading
+import time
+import urllib.parse
+
+# In-process runs know each event's sequence id; against a server the flag reason identifies it
+EVENT_ID = re.compile(rb'^id: (\d+)$', re.MULTILINE)
+FLAG_REASON = re.compile(rb'"reason": "(sse-load-\d+)"')
+FLAG_ID = re.compile(rb'"flag": \{"id": (\d+)')
+
+
+class Stats:
+    """Delivery bookkeeping shared by all connections"""
+
+    def __init__(self, key: re.Pattern):
+        self.key = key
+        self.connected = 0
+        self.published = {}
+        self.latencies = []
+        self.flag_ids = set()
+
+    def frame(self, frame: bytes) -> None:
+        if b'"connection"' in frame:
+            self.connected += 1
+            return
+        match = self.key.search(frame)
+        published = self.published.get(match.group(1)) if match else None
+        if published is not None:
+            self.latencies.append(time.perf_counter() - published)
+        flag_id = FLAG_ID.search(frame)
+        if flag_id:
+            self.flag_ids.add(int(flag_id.group(1)))
+
+
+def _split_frames(buffer: bytes, stats: Stats) -> bytes:
+    while b'\n\n' in buffer:
+        frame, buffer = buffer.split(b'\n\n', 1)
+        stats.frame(frame)
+    return buffer
+
+
+def _percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] if ordered else 0.0
+
+
+def _max_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def _wait_for(predicate, timeout: float) -> bool:
+    deadline = time.perf_counter() + timeout
+    while not predicate():
+        if time.perf_counter() > deadline:
+            return False
+        await asyncio.sleep(0.01)
+    return True
+
+
+# In-process ASGI -------------------------------------------------------------
+
+async def _asgi_connection(app, cookie: bytes, stats: Stats, closing: asyncio.Event) -> None:
+    request_sent = False
+    buffer = b''
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await closing.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        nonlocal buffer
+        if message['type'] == 'http.response.body':
+            buffer = _split_frames(buffer + message.get('body', b''), stats)
+
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'scheme': 'http',
+        'method': 'GET', 'path': '/events', 'raw_path': b'/events', 'query_string': b'', 'root_path': '',
+        'headers': [(b'host', b'localhost'), (b'accept', b'text/event-stream'), (b'cookie', cookie)],
+        'client': ('127.0.0.1', 50000), 'server': ('localhost', 80),
+    }
+    await app(scope, receive, send)
+
+
+def admin_session_cookie() -> bytes:
+    """Log a fresh admin user in and return its session cookie"""
+    from django.conf import settings
+    from django.contrib.auth.models import User
+    from django.test import Client
+
+    from claims.models import UserProfile
+
+    admin = User.objects.create_user('sse-admin', password='x', is_staff=True)
+    UserProfile.objects.create(user=admin, role='admin')
+    client = Client()
+    client.force_login(admin)
+    return f'{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}'.encode()
+
+
+def _publish_burst(count: int) -> int:
+    from claims.events import notify_clients
+
+    seq = 0
+    for i in range(count):
+        seq = notify_clients('load_test', {'burst': i})
+    return seq
+
+
+async def run_in_process(cookie: bytes, connections: int, events: int, interval: float, burst: int) -> Stats:
+    from django.core.asgi import get_asgi_application
+
+    from claims.asgi import EventStreamApp
+    from claims.events import get_hub, metrics, notify_clients
+
+    # As claims_burger.asgi serves it
+    app = EventStreamApp(get_asgi_application())
+    stats = Stats(EVENT_ID)
+    closing = asyncio.Event()
+    threads_before = threading.active_count()
+
+    started = time.perf_counter()
+    tasks = [asyncio.create_task(_asgi_connection(app, cookie, stats, closing)) for _ in range(connections)]
+    if not await _wait_for(lambda: stats.connected >= connections, 120):
+        print(f'only {stats.connected} of {connections} connections opened')
+    print(f'{stats.connected} connections open in {time.perf_counter() - started:.2f}s; '
+          f'threads {threads_before} -> {threading.active_count()}; max RSS {_max_rss_mb():.0f} MB')
+    print(f'hub subscribers: {len(get_hub().subscribers)}')
+
+    loop = asyncio.get_running_loop()
+    for i in range(events):
+        # Publish from a thread, as a WSGI/sync view would
+        published = time.perf_counter()
+        seq = await loop.run_in_executor(None, notify_clients, 'load_test', {'n': i})
+        stats.published[str(seq).encode()] = published
+        await asyncio.sleep(interval)
+    await _wait_for(lambda: len(stats.latencies) >= connections * events, 30)
+
+    if burst:
+        # Clients are told to refetch instead of receiving every event of the burst
+        delivered = len(stats.latencies)
+        started = time.perf_counter()
+        last_seq = await loop.run_in_executor(None, _publish_burst, burst)
+        stats.published[str(last_seq).encode()] = time.perf_counter()
+        await _wait_for(lambda: len(stats.latencies) >= delivered + connections, 30)
+        print(f'burst of {burst} settled in {time.perf_counter() - started:.2f}s; '
+              f'{len(stats.latencies) - delivered} frames carried the last event; max RSS {_max_rss_mb():.0f} MB')
+        stats.latencies = stats.latencies[:delivered]
+    print(f'event stream: {metrics.snapshot()}')
+
+    closing.set()
+    await asyncio.wait_for(asyncio.gather(*tasks, return_exceptions=True), 30)
+    await asyncio.sleep(0.1)
+    print(f'after disconnect: hub subscribers {len(get_hub().subscribers)}, threads {threading.active_count()}')
+    return stats
+
+
+# Real server -----------------------------------------------------------------
+
+async def _request(host: str, port: int, raw: bytes) -> bytes:
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(raw)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    return response
+
+
+async def _login(host: str, port: int, username: str, password: str) -> bytes:
+    page = await _request(host, port, f'GET /auth/login/ HTTP/1.0\r\nHost: {host}\r\n\r\n'.encode())
+    csrf = re.search(rb'csrftoken=([^;]+)', page).group(1)
+    body = urllib.parse.urlencode({'username': username, 'password': password, 'csrfmiddlewaretoken': csrf.decode()})
+    response = await _request(host, port, (
+        f'POST /auth/login/ HTTP/1.0\r\nHost: {host}\r\nCookie: csrftoken={csrf.decode()}\r\n'
+        f'Content-Type: application/x-www-form-urlencoded\r\nContent-Length: {len(body)}\r\n'
+        f'Referer: http://{host}:{port}/auth/login/\r\n\r\n{body}'
+    ).encode())
+    session = re.search(rb'sessionid=([^;]+)', response)
+    if session is None:
+        raise SystemExit('login failed')
+    return b'sessionid=' + session.group(1)
+
+
+async def _socket_connection(host: str, port: int, cookie: bytes, stats: Stats, closing: asyncio.Event) -> None:
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(f'GET /events HTTP/1.1\r\nHost: {host}\r\nAccept: text/event-stream\r\n'.encode()
+                 + b'Cookie: ' + cookie + b'\r\n\r\n')
+    await writer.drain()
+    await reader.readuntil(b'\r\n\r\n')
+    buffer = b''
+    try:
+        while not closing.is_set():
+            chunk = await reader.read(65536)
+            if not chunk:
+                break
+            # Chunked transfer encoding: drop the size lines, frames end in a blank line anyway
+            buffer = _split_frames(buffer + re.sub(rb'\r\n[0-9a-fA-F]+\r\n', b'', b'\r\n' + chunk), stats)
+    finally:
+        writer.close()
+
+
+async def run_against_server(url: str, connections: int, events: int, interval: float,
+                             username: str, password: str, claim: str) -> Stats:
+    parsed = urllib.parse.urlparse(url)
+    host, port = parsed.hostname, parsed.port or 80
+    cookie = await _login(host, port, username, password)
+    stats = Stats(FLAG_REASON)
+    closing = asyncio.Event()
+
+    started = time.perf_counter()
+    tasks = [asyncio.create_task(_socket_connection(host, port, cookie, stats, closing)) for _ in range(connections)]
+    await _wait_for(lambda: stats.connected >= connections, 120)
+    print(f'{stats.connected} connections open in {time.perf_counter() - started:.2f}s')
+
+    for i in range(events if claim else 0):
+        reason = f'sse-load-{i:05d}'
+        body = json.dumps({'reason': reason})
+        stats.published[reason.encode()] = time.perf_counter()
+        await _request(host, port, (
+            f'POST /claim/{claim}/flag/ HTTP/1.0\r\nHost: {host}\r\nCookie: {cookie.decode()}\r\n'
+            f'Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n{body}'
+        ).encode())
+        await asyncio.sleep(interval)
+    await _wait_for(lambda: len(stats.latencies) >= connections * events, 30)
+
+    closing.set()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    for flag_id in stats.flag_ids:
+        await _request(host, port, (
+            f'DELETE /flag/{flag_id}/remove/ HTTP/1.0\r\nHost: {host}\r\nCookie: {cookie.decode()}\r\n\r\n'
+        ).encode())
+    return stats
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--connections', type=int, default=2000, help='Concurrent SSE connections (default 2000)')
+    parser.add_argument('--events', type=int, default=20, help='Events to publish while connected')
+    parser.add_argument('--interval', type=float, default=0.05, help='Seconds between published events')
+    parser.add_argument('--burst', type=int, default=0, help='Then publish this many events back-to-back (in-process only)')
+    parser.add_argument('--url', help='Run against a server at this URL instead of in-process')
+    parser.add_argument('--username', default='admin', help='Admin login for --url')
+    parser.add_argument('--password', default='admin123', help='Admin password for --url')
+    parser.add_argument('--claim', help='Claim id to flag for publishing events with --url')
+    args = parser.parse_args()
+
+    if args.url:
+        stats = asyncio.run(run_against_server(args.url, args.connections, args.events, args.interval,
+                                               args.username, args.password, args.claim))
+        expected = args.connections * (args.events if args.claim else 0)
+    else:
+        from benchmarks.common import cleanup, setup_django
+
+        db_path = setup_django()
+        try:
+            stats = asyncio.run(run_in_process(admin_session_cookie(), args.connections, args.events, args.interval,
+                                              args.burst))
+        finally:
+            cleanup(db_path)
+        expected = args.connections * args.events
+
+    latencies = [value * 1000 for value in stats.latencies]
+    print(f'delivered {len(latencies)} of {expected} events')
+    if latencies:
+        print(f'latency ms: p50 {statistics.median(latencies):.1f}  p95 {_percentile(latencies, 95):.1f}  '
+              f'p99 {_percentile(latencies, 99):.1f}  max {max(latencies):.1f}')
+    return 0 if len(latencies) >= expected else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
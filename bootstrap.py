@@ -45,6 +45,7 @@ def main() -> int:
     parser.add_argument('--csv-detail', default=str(BASE_DIR / 'claim_detail_data.csv'), help='Path to claim detail CSV')
     parser.add_argument('--append', action='store_true', help='Append-only: create new rows; do not update existing')
     parser.add_argument('--batch-size', default=1000, type=int, help='Batch size for operations (default 1000)')
+    parser.add_argument('--workers', default=0, type=int, help='Parse CSVs in N worker processes (default: in-process)')
     parser.add_argument('--verbose', action='store_true', help='Increase logging (default is quiet)')
     parser.add_argument('--samples', action='store_true', help='(Optional) create demo flags/notes during load')
     args = parser.parse_args()
@@ -61,9 +62,9 @@ def main() -> int:
         quiet = not args.verbose
 
         if args.clear:
-            call_command('load_sample_data', clear=True, csv_list=args.csv_list, csv_detail=args.csv_detail, samples=args.samples, append=args.append, batch_size=args.batch_size, quiet=quiet, verbosity=1)
+            call_command('load_sample_data', clear=True, csv_list=args.csv_list, csv_detail=args.csv_detail, samples=args.samples, append=args.append, batch_size=args.batch_size, workers=args.workers, quiet=quiet, verbosity=1)
         else:
-            call_command('load_sample_data', csv_list=args.csv_list, csv_detail=args.csv_detail, samples=args.samples, append=args.append, batch_size=args.batch_size, quiet=quiet, verbosity=1)
+            call_command('load_sample_data', csv_list=args.csv_list, csv_detail=args.csv_detail, samples=args.samples, append=args.append, batch_size=args.batch_size, workers=args.workers, quiet=quiet, verbosity=1)
 
     # 3) Optionally remove CSVs
     if args.cleanup:
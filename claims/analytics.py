@@ -0,0 +1,72 @@
+"""Which CPT codes and denial reasons drive underpayment.
+
+Each breakdown is a single grouped SQL statement over the ClaimCptCode or
+ClaimDetail rows joined to their claims. It returns every distinct value with
+its count and total underpayment (billed - paid). Values are few, so the
+grouped result is cached per filter set and the top-N lists are cut from it
+in Python. That way neither the limit nor the sort order costs a query.
+"""
+from decimal import Decimal
+
+from django.db.models import Count, Sum
+
+from .cache import get_or_compute
+from .models import ClaimCptCode, ClaimDetail
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 100
+CENTS = Decimal('0.01')
+
+RANKINGS = {
+    'by_count': lambda row: (-row['count'], row['value']),
+    'by_underpayment': lambda row: (-row['underpayment'], row['value']),
+}
+
+
+def clamp_limit(value) -> int:
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        return DEFAULT_LIMIT
+    return max(1, min(limit, MAX_LIMIT))
+
+
+def breakdown(rows, field: str, insurer: str = '', date_from=None, date_to=None) -> list:
+    """``{'value', 'count', 'underpayment'}`` for every distinct ``field`` value of ``rows``.
+
+    ``rows`` is a ClaimCptCode or ClaimDetail queryset. A claim listing a code
+    (or reason) more than once counts once per row, and a claim's whole
+    underpayment is attributed to each of its codes.
+    """
+    if insurer:
+        rows = rows.filter(claim__insurer_name=insurer)
+    if date_from:
+        rows = rows.filter(claim__discharge_date__gte=date_from)
+    if date_to:
+        rows = rows.filter(claim__discharge_date__lte=date_to)
+    grouped = rows.order_by().values(field).annotate(
+        count=Count('pk'),
+        billed=Sum('claim__billed_amount'),
+        paid=Sum('claim__paid_amount'),
+    )
+    # SQLite sums decimals as floats; round back to cents
+    return [
+        {'value': row[field], 'count': row['count'], 'underpayment': (Decimal(row['billed'] or 0) - Decimal(row['paid'] or 0)).quantize(CENTS)}
+        for row in grouped
+    ]
+
+
+def underpayment_drivers(insurer: str = '', date_from=None, date_to=None, limit: int = DEFAULT_LIMIT) -> dict:
+    """Top ``limit`` CPT codes and denial reasons by count and by underpayment"""
+    def compute():
+        reasons = ClaimDetail.objects.exclude(denial_reason__isnull=True).exclude(denial_reason='')
+        return {
+            'cpt_codes': breakdown(ClaimCptCode.objects.all(), 'code', insurer, date_from, date_to),
+            'denial_reasons': breakdown(reasons, 'denial_reason', insurer, date_from, date_to),
+        }
+
+    grouped = get_or_compute('underpayment_drivers', (insurer, date_from, date_to), compute)
+    return {
+        name: {ranking: sorted(rows, key=key)[:limit] for ranking, key in RANKINGS.items()}
+        for name, rows in grouped.items()
+    }
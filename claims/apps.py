@@ -5,3 +5,6 @@ class ClaimsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'claims'
     verbose_name = 'Medical Claims Management'
+
+    def ready(self):
+        from . import signals  # noqa: F401
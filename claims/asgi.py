@@ -0,0 +1,98 @@
+"""Serve the admin SSE stream straight from the event loop under ASGI.
+
+Django's ASGI handler runs every request inside a ThreadSensitiveContext:
+its sync middleware and signals get a dedicated thread that lives until the
+response is finished, which for an event stream is as long as the dashboard
+stays open. EventStreamApp sits in front of Django (see claims_burger.asgi)
+and answers GET requests for the events URL itself. It authenticates the
+session cookie with Django's session and auth APIs in a pooled thread, closes
+that thread's database connections, then streams from the shared AsyncHub, so
+an open stream costs a queue and no thread. Other requests go to Django.
+
+These streams skip Django's middleware, so they are not in the request
+metrics, which would only be skewed by hour-long responses anyway.
+"""
+import asyncio
+from importlib import import_module
+from types import SimpleNamespace
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.db import connections
+from django.http import QueryDict
+from django.http.cookie import parse_cookie
+from django.urls import reverse
+
+from .events import get_broker
+
+
+def _authorize(scope) -> tuple:
+    """``(allowed, after, missed)`` for a stream request; runs in a worker thread"""
+    from .views import _can_watch_events, _parse_event_id
+
+    try:
+        headers = {name.decode('latin1').lower(): value.decode('latin1') for name, value in scope['headers']}
+        session_key = parse_cookie(headers.get('cookie', '')).get(settings.SESSION_COOKIE_NAME)
+        session = import_module(settings.SESSION_ENGINE).SessionStore(session_key)
+        user = get_user(SimpleNamespace(session=session))
+        if not _can_watch_events(SimpleNamespace(user=user)):
+            return False, 0, False
+        query = QueryDict(scope.get('query_string', b'').decode('latin1'))
+        after, missed = get_broker().resume(_parse_event_id(headers.get('last-event-id') or query.get('last_event_id')))
+        return True, after, missed
+    finally:
+        # The stream never queries the database; don't keep this thread's connections open
+        connections.close_all()
+
+
+class EventStreamApp:
+    """ASGI app serving the admin event stream itself and passing everything else to ``app``"""
+
+    def __init__(self, app):
+        self.app = app
+        self._path = None
+
+    @property
+    def path(self) -> str:
+        # Resolved on first use, once the URLconf can be loaded
+        if self._path is None:
+            self._path = reverse('claims:events')
+        return self._path
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['method'] != 'GET' or scope['path'] != self.path:
+            return await self.app(scope, receive, send)
+
+        allowed, after, missed = await sync_to_async(_authorize, thread_sensitive=False)(scope)
+        if not allowed:
+            await send({'type': 'http.response.start', 'status': 403, 'headers': [(b'content-type', b'text/html; charset=utf-8')]})
+            await send({'type': 'http.response.body', 'body': b'Access denied'})
+            return
+
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [(b'content-type', b'text/event-stream'), (b'cache-control', b'no-cache')],
+        })
+        sending = asyncio.ensure_future(self._send_frames(send, after, missed))
+        disconnect = asyncio.ensure_future(self._disconnected(receive))
+        try:
+            await asyncio.wait({sending, disconnect}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            # Cancelling the sender runs the stream's cleanup, which unsubscribes it from the hub
+            for task in (sending, disconnect):
+                task.cancel()
+            await asyncio.gather(sending, disconnect, return_exceptions=True)
+
+    @staticmethod
+    async def _send_frames(send, after: int, missed: bool) -> None:
+        from .views import _async_event_stream
+
+        async for frame in _async_event_stream(after, missed):
+            await send({'type': 'http.response.body', 'body': frame, 'more_body': True})
+
+    @staticmethod
+    async def _disconnected(receive) -> None:
+        while (await receive())['type'] != 'http.disconnect':
+            pass
@@ -0,0 +1,118 @@
+"""Spread unassigned claims across reviewers, least-loaded first.
+
+A reviewer's load is ``count_weight * claims + billed_weight * billed / mean``,
+where ``mean`` is the average billed amount of the claims being handed out,
+so a typical claim adds about one unit to either term. Existing workloads
+come from the KPI summary's assignee rows. Claims are placed largest first,
+each going to the reviewer at the top of a min-heap of loads (the LPT greedy
+heuristic), which keeps both claim counts and dollar totals close. The plan
+is computed in memory and written by bulk.apply_assignments(): one UPDATE per
+reviewer in a single transaction, with KPI deltas applied once. Claims that
+someone assigned after they were read are skipped, not overwritten.
+"""
+import heapq
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+
+from .bulk import CLAIM_FIELDS, apply_assignments
+from .models import Claim, KpiSummary
+
+
+def active_reviewers(usernames=None) -> list:
+    """Active users with the reviewer role, optionally limited to ``usernames``"""
+    if usernames is not None and (not isinstance(usernames, (list, tuple)) or not all(isinstance(name, str) for name in usernames)):
+        raise ValueError('reviewers must be a list of usernames')
+    reviewers = User.objects.filter(is_active=True, userprofile__role='reviewer').order_by('pk')
+    if usernames:
+        reviewers = reviewers.filter(username__in=usernames)
+    return list(reviewers)
+
+
+def current_loads(reviewers) -> dict:
+    """``{user id: (claims, billed)}`` already assigned to each reviewer"""
+    loads = {reviewer.pk: (0, Decimal(0)) for reviewer in reviewers}
+    rows = KpiSummary.objects.filter(scope='assignee', key__in=[str(pk) for pk in loads]).values_list('key', 'claim_count', 'billed_total')
+    for key, count, billed in rows:
+        loads[int(key)] = (count, Decimal(billed))
+    return loads
+
+
+def check_filters(statuses=None, insurer: str = '', limit=None) -> None:
+    """Raise ValueError unless ``statuses`` is a list of status values and ``limit`` is None or at least 1"""
+    if limit is not None and (isinstance(limit, bool) or not isinstance(limit, int) or limit < 1):
+        raise ValueError('limit must be a positive integer')
+    if statuses is not None:
+        valid = {value for value, _ in Claim.STATUS_CHOICES}
+        if not isinstance(statuses, (list, tuple)) or not all(isinstance(status, str) and status in valid for status in statuses):
+            raise ValueError(f"statuses must be a list of: {', '.join(sorted(valid))}")
+    if not isinstance(insurer, str):
+        raise ValueError('insurer must be a string')
+
+
+def unassigned_claims(statuses=None, insurer: str = '', limit=None) -> list:
+    """``CLAIM_FIELDS`` rows of unassigned claims, oldest first; ``limit=None`` means all of them"""
+    check_filters(statuses, insurer, limit)
+    claims = Claim.objects.filter(assigned_to__isnull=True)
+    if statuses:
+        claims = claims.filter(status__in=statuses)
+    if insurer:
+        claims = claims.filter(insurer_name=insurer)
+    claims = claims.order_by('created_at', 'pk').values(*CLAIM_FIELDS)
+    return list(claims[:limit] if limit else claims)
+
+
+def plan(rows: list, loads: dict, count_weight: float = 1.0, billed_weight: float = 1.0) -> dict:
+    """``{claim pk: reviewer id}`` balancing the weighted loads of the reviewers in ``loads``"""
+    if not rows or not loads:
+        return {}
+    mean = float(sum(row['billed_amount'] for row in rows)) / len(rows) or 1.0
+    heap = [
+        (count_weight * count + billed_weight * float(billed) / mean, reviewer_id)
+        for reviewer_id, (count, billed) in loads.items()
+    ]
+    heapq.heapify(heap)
+    assignments = {}
+    for row in sorted(rows, key=lambda row: (-row['billed_amount'], row['pk'])):
+        load, reviewer_id = heap[0]
+        assignments[row['pk']] = reviewer_id
+        heapq.heapreplace(heap, (load + count_weight + billed_weight * float(row['billed_amount']) / mean, reviewer_id))
+    return assignments
+
+
+def auto_assign(statuses=None, insurer: str = '', limit=None, usernames=None,
+                count_weight: float = 1.0, billed_weight: float = 1.0, dry_run: bool = False) -> dict:
+    """Plan (and unless ``dry_run``, apply) assignments; returns a per-reviewer summary"""
+    check_filters(statuses, insurer, limit)
+    reviewers = active_reviewers(usernames)
+    if not reviewers:
+        raise ValueError('No active reviewers to assign claims to')
+    loads = current_loads(reviewers)
+    rows = unassigned_claims(statuses, insurer, limit)
+    assignments = plan(rows, loads, count_weight, billed_weight)
+    if not dry_run:
+        # Claims assigned by someone else since they were read are left out
+        changed = set(apply_assignments(rows, assignments))
+        rows = [row for row in rows if row['pk'] in changed]
+
+    added = {reviewer.pk: [0, Decimal(0)] for reviewer in reviewers}
+    for row in rows:
+        totals = added[assignments[row['pk']]]
+        totals[0] += 1
+        totals[1] += row['billed_amount']
+    return {
+        'claims': len(rows),
+        'assigned': 0 if dry_run else len(rows),
+        'dry_run': dry_run,
+        'reviewers': [
+            {
+                'id': reviewer.pk,
+                'username': reviewer.username,
+                'claims_added': added[reviewer.pk][0],
+                'billed_added': added[reviewer.pk][1],
+                'claims_total': loads[reviewer.pk][0] + added[reviewer.pk][0],
+                'billed_total': loads[reviewer.pk][1] + added[reviewer.pk][1],
+            }
+            for reviewer in reviewers
+        ],
+    }
@@ -0,0 +1,164 @@
+"""Flag, annotate or assign many claims in one request.
+
+Access is checked for the whole batch with one query, and each operation
+writes with a single bulk_create() or update() inside one transaction. Those
+bypass the model signals, so the KPI deltas and cache invalidation the
+signal handlers would have done per row are applied here once per batch.
+A batch is all-or-nothing: any unknown or inaccessible claim id rejects it.
+"""
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from . import cache, kpis
+from .models import Claim, Flag, Note
+
+MAX_BATCH = 1000
+
+CLAIM_FIELDS = ('pk', 'claim_id', 'patient_name', 'insurer_name', 'status', 'assigned_to_id', 'billed_amount', 'paid_amount')
+
+
+class BatchError(Exception):
+    """The batch was rejected; ``status`` is the HTTP status to answer with"""
+
+    def __init__(self, message: str, status: int = 400, claim_ids=None):
+        super().__init__(message)
+        self.status = status
+        self.claim_ids = claim_ids or []
+
+
+def parse_claim_ids(value) -> list:
+    """Distinct claim ids from a JSON list (or a form's repeated values), in order"""
+    if not isinstance(value, (list, tuple)) or not value:
+        raise BatchError('claim_ids must be a non-empty list')
+    claim_ids = list(dict.fromkeys(str(claim_id).strip() for claim_id in value if str(claim_id).strip()))
+    if not claim_ids:
+        raise BatchError('claim_ids must be a non-empty list')
+    if len(claim_ids) > MAX_BATCH:
+        raise BatchError(f'At most {MAX_BATCH} claims per request')
+    return claim_ids
+
+
+def accessible_claims(user, claim_ids: list) -> list:
+    """Rows of ``CLAIM_FIELDS`` for ``claim_ids``, if ``user`` may act on every one of them"""
+    rows = list(Claim.objects.filter(claim_id__in=claim_ids).values(*CLAIM_FIELDS))
+    found = {row['claim_id'] for row in rows}
+    missing = [claim_id for claim_id in claim_ids if claim_id not in found]
+    if missing:
+        raise BatchError('Claims not found', 404, missing)
+    user_profile = getattr(user, 'userprofile', None)
+    if not (user_profile and user_profile.can_see_all_claims):
+        forbidden = [row['claim_id'] for row in rows if row['assigned_to_id'] != user.pk]
+        if forbidden:
+            raise BatchError('You do not have permission to change these claims', 403, forbidden)
+    return rows
+
+
+def _keys(row) -> list:
+    return kpis.scope_keys(row['insurer_name'], row['status'], row['assigned_to_id'])
+
+
+def _invalidate(rows, listings: bool = True) -> None:
+    if listings:
+        # Fragment keys include the global version too, so this covers every claim
+        cache.invalidate()
+    else:
+        cache.invalidate_claims(row['pk'] for row in rows)
+
+
+def flag_claims(user, rows: list, reason: str) -> list:
+    """Create one flag per claim; returns the flags"""
+    now = timezone.now()
+    deltas = {}
+    for row in rows:
+        kpis.add_delta(deltas, _keys(row), {'flag_count': 1})
+    with transaction.atomic():
+        flags = Flag.objects.bulk_create(
+            Flag(claim_id=row['pk'], user=user, reason=reason, created_at=now) for row in rows
+        )
+        kpis.apply_deltas(deltas)
+    _invalidate(rows)
+    return flags
+
+
+def add_notes(user, rows: list, content: str) -> list:
+    """Add the same note to every claim; returns the notes"""
+    now = timezone.now()
+    with transaction.atomic():
+        notes = Note.objects.bulk_create(
+            Note(claim_id=row['pk'], user=user, content=content, created_at=now, updated_at=now) for row in rows
+        )
+    # Notes only appear on the claim detail page
+    _invalidate(rows, listings=False)
+    return notes
+
+
+def _chunks(items: list, size: int = MAX_BATCH):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _current_rows(pks: list) -> dict:
+    """``{pk: CLAIM_FIELDS row}`` as stored now, locked until the transaction ends where supported"""
+    current = {}
+    for chunk in _chunks(pks):
+        current.update((row['pk'], row) for row in Claim.objects.select_for_update().filter(pk__in=chunk).values(*CLAIM_FIELDS))
+    return current
+
+
+def apply_assignments(rows: list, plan: dict) -> list:
+    """Set each claim's assignee from ``plan`` (``{claim pk: user id or None}``); returns the pks changed.
+
+    ``rows`` carry ``CLAIM_FIELDS`` as read when the plan was made. Claims are
+    re-read (and locked) inside the transaction, and any whose assignee has
+    changed since, or that were deleted, are left alone, so a concurrent
+    assignment is never overwritten. Each UPDATE also requires the expected
+    previous assignee, and KPI deltas are applied only for rows it changed.
+    There is one UPDATE per (previous, new) assignee pair, chunked to stay
+    under SQL parameter limits, all in one transaction.
+    """
+    planned = {row['pk']: row['assigned_to_id'] for row in rows if row['pk'] in plan and row['assigned_to_id'] != plan[row['pk']]}
+    if not planned:
+        return []
+    with transaction.atomic():
+        current = _current_rows(list(planned))
+        rows = [current[pk] for pk, previous in planned.items() if pk in current and current[pk]['assigned_to_id'] == previous]
+        by_move = {}
+        for row in rows:
+            by_move.setdefault((row['assigned_to_id'], plan[row['pk']]), []).append(row['pk'])
+
+        now = timezone.now()
+        changed = set()
+        for (previous, assignee_id), pks in by_move.items():
+            for chunk in _chunks(pks):
+                claims = Claim.objects.filter(pk__in=chunk)
+                claims = claims.filter(assigned_to__isnull=True) if previous is None else claims.filter(assigned_to_id=previous)
+                if claims.update(assigned_to_id=assignee_id, updated_at=now) == len(chunk):
+                    changed.update(chunk)
+                else:
+                    # Only reachable without row locks (SQLite): our writes are the ones stamped ``now``
+                    changed.update(Claim.objects.filter(pk__in=chunk, assigned_to_id=assignee_id, updated_at=now).values_list('pk', flat=True))
+        rows = [row for row in rows if row['pk'] in changed]
+
+        flag_counts = {}
+        for chunk in _chunks([row['pk'] for row in rows]):
+            flag_counts.update(
+                Flag.objects.filter(claim_id__in=chunk).order_by().values_list('claim_id').annotate(n=Count('id'))
+            )
+        deltas = {}
+        # Each claim moves between assignee rows along with its flags, as update_claim_kpis does
+        for row in rows:
+            assignee_id = plan[row['pk']]
+            flags = flag_counts.get(row['pk'], 0)
+            kpis.add_delta(deltas, _keys(row), kpis.claim_vector(row['billed_amount'], row['paid_amount'], row['assigned_to_id'], flags), sign=-1)
+            kpis.add_delta(deltas, _keys({**row, 'assigned_to_id': assignee_id}), kpis.claim_vector(row['billed_amount'], row['paid_amount'], assignee_id, flags))
+        kpis.apply_deltas(deltas)
+    if rows:
+        _invalidate(rows)
+    return [row['pk'] for row in rows]
+
+
+def assign_claims(rows: list, assignee) -> int:
+    """Assign every claim to ``assignee`` (None unassigns); returns the number changed"""
+    assignee_id = assignee.pk if assignee else None
+    return len(apply_assignments(rows, {row['pk']: assignee_id for row in rows}))
@@ -0,0 +1,98 @@
+"""Versioned caching for filter options, KPI blocks, analytics and claim detail fragments.
+
+Keys embed a data version instead of being deleted one by one: bumping the
+global version (any claim/flag/detail change, imports) orphans every list-level
+entry at once, and bumping a claim's version orphans just its detail
+fragments. Orphaned entries simply expire.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+GLOBAL_VERSION_KEY = 'claims:version'
+CLAIM_VERSION_KEY = 'claims:version:claim:{}'
+
+
+def _timeout() -> int:
+    return getattr(settings, 'CLAIMS_CACHE_TIMEOUT', 300)
+
+
+def _fragment_timeout() -> int:
+    return getattr(settings, 'CLAIMS_FRAGMENT_CACHE_TIMEOUT', 60)
+
+
+def _version(key: str) -> int:
+    version = cache.get(key)
+    if version is None:
+        version = time.time_ns()
+        # add() keeps a concurrently set value instead of overwriting it
+        if not cache.add(key, version, None):
+            version = cache.get(key, version)
+    return version
+
+
+def _bump(key: str) -> None:
+    cache.set(key, time.time_ns(), None)
+
+
+def invalidate() -> None:
+    """Drop every cached list/KPI/fragment entry (claims or flags changed in bulk)"""
+    _bump(GLOBAL_VERSION_KEY)
+
+
+def invalidate_claim(claim_pk) -> None:
+    """Drop cached detail fragments for one claim"""
+    _bump(CLAIM_VERSION_KEY.format(claim_pk))
+
+
+def invalidate_claims(claim_pks) -> None:
+    """Drop cached detail fragments for many claims in one cache round-trip"""
+    version = time.time_ns()
+    cache.set_many({CLAIM_VERSION_KEY.format(pk): version for pk in claim_pks}, None)
+
+
+def role_scope(user) -> str:
+    """Cache scope for a user's view of the data: everyone with full access shares one"""
+    user_profile = getattr(user, 'userprofile', None)
+    if user_profile and user_profile.can_see_all_claims:
+        return 'all'
+    return f'user:{user.pk}'
+
+
+def make_key(name: str, *parts) -> str:
+    raw = ':'.join(str(part) for part in parts)
+    digest = hashlib.md5(raw.encode('utf-8')).hexdigest()
+    return f'claims:{_version(GLOBAL_VERSION_KEY)}:{name}:{digest}'
+
+
+def get_or_compute(name: str, parts: tuple, compute, timeout=None):
+    """Return the cached value for ``name``/``parts``, computing and storing it on a miss"""
+    key = make_key(name, *parts)
+    value = cache.get(key)
+    if value is None:
+        value = compute()
+        cache.set(key, value, _timeout() if timeout is None else timeout)
+    return value
+
+
+def filter_options(user, claims) -> tuple:
+    """Distinct (statuses, insurers) for the dropdowns over a user's accessible claims"""
+    def compute():
+        # order_by() drops the default -created_at ordering, which would otherwise defeat DISTINCT
+        statuses = sorted(claims.order_by().values_list('status', flat=True).distinct())
+        insurers = sorted(claims.order_by().values_list('insurer_name', flat=True).distinct())
+        return statuses, insurers
+    return get_or_compute('filters', (role_scope(user),), compute)
+
+
+def claim_fragment(request, claim, render_fragment) -> str:
+    """Rendered claim detail fragment, cached per claim version, role scope and CSRF secret"""
+    csrf_secret = request.META.get('CSRF_COOKIE', '')
+    if not csrf_secret:
+        # The render would mint a new CSRF secret; never share that token through the cache
+        return render_fragment()
+    claim_version = _version(CLAIM_VERSION_KEY.format(claim.pk))
+    parts = (claim.pk, claim_version, role_scope(request.user), csrf_secret)
+    return get_or_compute('claim_fragment', parts, render_fragment, timeout=_fragment_timeout())
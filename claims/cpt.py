@@ -0,0 +1,82 @@
+"""Normalized CPT codes (ClaimCptCode rows) derived from ClaimDetail.cpt_codes.
+
+The free-text column stays the source of truth. A post_save signal keeps the
+rows of individually saved details in sync; bulk imports call replace() per
+batch and rebuild() regenerates the whole table. Tokens longer than the code
+column are not CPT codes (usually a missing delimiter) and are left out.
+"""
+from django.db import connections, transaction
+
+from .importing import parse_cpt_codes
+
+REBUILD_BATCH_SIZE = 5000
+
+
+def _models(apps=None):
+    if apps is not None:
+        return apps.get_model('claims', 'ClaimDetail'), apps.get_model('claims', 'ClaimCptCode')
+    from .models import ClaimCptCode, ClaimDetail
+    return ClaimDetail, ClaimCptCode
+
+
+def _max_length(code_model) -> int:
+    return code_model._meta.get_field('code').max_length
+
+
+def codes(cpt_codes, max_length: int) -> tuple:
+    """(codes that fit the code column, number of longer tokens rejected) for one cpt_codes text"""
+    parsed = parse_cpt_codes(cpt_codes)
+    kept = [code for code in parsed if len(code) <= max_length]
+    return kept, len(parsed) - len(kept)
+
+
+def replace(details) -> int:
+    """Rewrite the code rows of saved ClaimDetail instances; returns the number of tokens rejected"""
+    _, ClaimCptCode = _models()
+    details = [detail for detail in details if detail.pk is not None]
+    if not details:
+        return 0
+    max_length = _max_length(ClaimCptCode)
+    rows, rejected = [], 0
+    for detail in details:
+        kept, too_long = codes(detail.cpt_codes, max_length)
+        rows.extend(
+            ClaimCptCode(detail_id=detail.pk, claim_id=detail.claim_id, code=code, position=position)
+            for position, code in enumerate(kept)
+        )
+        rejected += too_long
+    with transaction.atomic():
+        ClaimCptCode.objects.filter(detail_id__in=[detail.pk for detail in details]).delete()
+        ClaimCptCode.objects.bulk_create(rows, batch_size=REBUILD_BATCH_SIZE)
+    return rejected
+
+
+def rebuild(apps=None, using: str = 'default', batch_size: int = REBUILD_BATCH_SIZE) -> int:
+    """Regenerate every code row from ClaimDetail.cpt_codes; returns the number of rows.
+
+    Rows are written with a plain executemany(): building millions of model
+    instances for bulk_create() would dominate the rebuild.
+    """
+    ClaimDetail, ClaimCptCode = _models(apps)
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    meta = ClaimCptCode._meta
+    columns = [meta.get_field(name).column for name in ('detail', 'claim', 'code', 'position')]
+    sql = 'INSERT INTO {} ({}) VALUES (%s, %s, %s, %s)'.format(qn(meta.db_table), ', '.join(qn(c) for c in columns))
+    max_length = _max_length(ClaimCptCode)
+    details = ClaimDetail.objects.using(using).exclude(cpt_codes__isnull=True).exclude(cpt_codes='')
+    total = 0
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        ClaimCptCode.objects.using(using).all().delete()
+        rows = []
+        for detail_pk, claim_pk, cpt_codes in details.values_list('pk', 'claim_id', 'cpt_codes').iterator(chunk_size=batch_size):
+            kept, _ = codes(cpt_codes, max_length)
+            rows.extend((detail_pk, claim_pk, code, position) for position, code in enumerate(kept))
+            if len(rows) >= batch_size:
+                cursor.executemany(sql, rows)
+                total += len(rows)
+                rows = []
+        if rows:
+            cursor.executemany(sql, rows)
+            total += len(rows)
+    return total
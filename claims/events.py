@@ -0,0 +1,378 @@
+"""Live event fan-out for the admin SSE stream.
+
+Publishers append events to a broker, which numbers them with an increasing
+sequence id and keeps the most recent ones in a bounded buffer. Subscribers
+never register anywhere. Each reads "everything after seq N" and blocks
+until something newer arrives. That makes ``Last-Event-ID`` replay after a
+reconnect the same operation as normal streaming. A client that died costs
+nothing, because nothing holds a queue for it.
+
+``CLAIMS_EVENT_BROKER`` picks the implementation:
+
+* ``memory`` (default): a ring buffer in this process. Only clients served
+  by the publishing process see the events, which suits runserver and a
+  single worker.
+* ``sqlite``: a small WAL-mode SQLite file (``CLAIMS_EVENTS_DB``) shared by
+  every worker process on the host, e.g. under multi-process gunicorn.
+* a dotted path to a Broker subclass.
+
+Under WSGI each SSE client reads the broker from its own worker thread.
+Under ASGI, an AsyncHub per event loop does the reading, and clients are
+just asyncio.Queue objects, so a process can hold thousands of streams.
+
+Events are JSON-encoded once when published, and the hub builds each SSE
+frame once for all of its clients. A client never has more than
+``CLAIMS_SSE_CLIENT_BUFFER`` frames pending. A burst that would exceed that
+(a bulk update, or a client too slow to keep up) is collapsed into a single
+``stats_changed`` frame telling the page to refetch. ``metrics`` counts what
+was delivered, coalesced and dropped.
+"""
+import asyncio
+import itertools
+import json
+import logging
+import sqlite3
+import threading
+import time
+import weakref
+from collections import deque
+from typing import List, Optional, Tuple
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+DEFAULT_BUFFER_SIZE = 1000
+# Most frames one SSE client may have pending before they are coalesced
+DEFAULT_CLIENT_BUFFER = 100
+# How often cross-process brokers look for events published by other processes
+DEFAULT_POLL_INTERVAL = 0.25
+# Longest a hub's broker read blocks before it re-checks for subscribers
+HUB_READ_TIMEOUT = 5
+# Seconds a hub waits after a failed broker read, doubling per failure up to the maximum
+HUB_RETRY_DELAY = 0.5
+HUB_MAX_RETRY_DELAY = 30
+
+logger = logging.getLogger(__name__)
+
+_broker = None
+_broker_lock = threading.Lock()
+# One hub per running event loop (ASGI servers run one loop per worker process)
+_hubs = weakref.WeakKeyDictionary()
+
+
+class EventMetrics:
+    """Counters for this process's event stream, safe to bump from any thread"""
+
+    # delivered: frames queued or written for a client; coalesced: stats_changed frames sent in
+    # place of a burst; dropped: events a client only learned about through one of those;
+    # failed: events the broker could not publish
+    FIELDS = ('published', 'delivered', 'coalesced', 'dropped', 'failed')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = dict.fromkeys(self.FIELDS, 0)
+
+    def add(self, **counts) -> None:
+        with self._lock:
+            for name, value in counts.items():
+                self._counts[name] += value
+
+    def snapshot(self) -> dict:
+        """Counter values plus the number of clients currently subscribed to a hub"""
+        with self._lock:
+            counts = dict(self._counts)
+        counts['subscribers'] = sum(len(hub.subscribers) for hub in list(_hubs.values()))
+        return counts
+
+
+metrics = EventMetrics()
+
+
+def encode_frame(data: str, seq: Optional[int] = None) -> bytes:
+    """An SSE frame for already JSON-encoded ``data``"""
+    prefix = f'id: {seq}\n' if seq is not None else ''
+    return f'{prefix}data: {data}\n\n'.encode()
+
+
+def stats_changed_frame(seq: int, count: int) -> bytes:
+    """The frame that stands in for ``count`` coalesced events up to ``seq``"""
+    return encode_frame(json.dumps({'type': 'stats_changed', 'coalesced': count}), seq)
+
+
+def bounded(frames: List[Tuple[int, bytes]], limit: int, clients: int = 1) -> List[Tuple[int, bytes]]:
+    """``frames``, or a single stats_changed frame if there are more than ``limit``.
+
+    ``clients`` is how many clients the frames are for, which is what the
+    coalesced/dropped counters count.
+    """
+    if len(frames) <= limit:
+        return frames
+    metrics.add(coalesced=clients, dropped=len(frames) * clients)
+    last_seq = frames[-1][0]
+    return [(last_seq, stats_changed_frame(last_seq, len(frames)))]
+
+
+def client_buffer() -> int:
+    return getattr(settings, 'CLAIMS_SSE_CLIENT_BUFFER', DEFAULT_CLIENT_BUFFER)
+
+
+class Broker:
+    """Sequence-numbered event log with bounded retention"""
+
+    def publish(self, event: dict) -> int:
+        """Append an event and return its sequence id"""
+        raise NotImplementedError
+
+    def read(self, after: int, timeout: float) -> List[Tuple[int, str]]:
+        """``(seq, JSON data)`` pairs newer than ``after``, waiting up to ``timeout`` seconds for one"""
+        raise NotImplementedError
+
+    def bounds(self) -> Tuple[int, int]:
+        """``(oldest retained seq, latest seq)``; oldest is latest + 1 while the buffer is empty"""
+        raise NotImplementedError
+
+    def resume(self, last_event_id: Optional[int]) -> Tuple[int, bool]:
+        """Where a (re)connecting client should read from, and whether it missed events.
+
+        Without a Last-Event-ID the client only wants new events. An id older
+        than the buffer, or newer than anything published (the broker was
+        restarted), cannot be replayed, so the client is told to resync.
+        """
+        oldest, latest = self.bounds()
+        if last_event_id is None:
+            return latest, False
+        if last_event_id > latest or last_event_id < oldest - 1:
+            return latest, True
+        return last_event_id, False
+
+
+class InProcessBroker(Broker):
+    """Ring buffer shared by the threads of one process"""
+
+    def __init__(self, buffer_size: int = DEFAULT_BUFFER_SIZE, **options):
+        self._events = deque(maxlen=buffer_size)
+        self._seq = itertools.count(1)
+        self._latest = 0
+        self._changed = threading.Condition()
+
+    def publish(self, event: dict) -> int:
+        data = json.dumps(event)
+        with self._changed:
+            seq = next(self._seq)
+            self._events.append((seq, data))
+            self._latest = seq
+            self._changed.notify_all()
+        return seq
+
+    def read(self, after: int, timeout: float) -> List[Tuple[int, str]]:
+        with self._changed:
+            self._changed.wait_for(lambda: self._latest > after, timeout)
+            if self._latest <= after:
+                return []
+            # Sequence ids are contiguous, so the newer events are the buffer's tail
+            return list(itertools.islice(self._events, max(0, len(self._events) - (self._latest - after)), None))
+
+    def bounds(self) -> Tuple[int, int]:
+        with self._changed:
+            oldest = self._events[0][0] if self._events else self._latest + 1
+            return oldest, self._latest
+
+
+class SQLiteBroker(Broker):
+    """Event log in a local SQLite file, shared by every process on the host.
+
+    Readers poll (a primary-key range probe) every ``poll_interval`` seconds;
+    publishes from the same process wake them immediately.
+    """
+
+    SCHEMA = (
+        'CREATE TABLE IF NOT EXISTS claims_events ('
+        'seq INTEGER PRIMARY KEY AUTOINCREMENT, published REAL NOT NULL, data TEXT NOT NULL)'
+    )
+
+    def __init__(self, path: str, buffer_size: int = DEFAULT_BUFFER_SIZE,
+                 poll_interval: float = DEFAULT_POLL_INTERVAL, **options):
+        self.path = str(path)
+        self.buffer_size = buffer_size
+        self.poll_interval = poll_interval
+        self._local = threading.local()
+        self._changed = threading.Condition()
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(self.SCHEMA)
+            self._local.connection = connection
+        return connection
+
+    def publish(self, event: dict) -> int:
+        connection = self._connection()
+        with connection:
+            seq = connection.execute(
+                'INSERT INTO claims_events (published, data) VALUES (?, ?)',
+                (time.time(), json.dumps(event)),
+            ).lastrowid
+            connection.execute('DELETE FROM claims_events WHERE seq <= ?', (seq - self.buffer_size,))
+        with self._changed:
+            self._changed.notify_all()
+        return seq
+
+    def _fetch(self, after: int) -> List[Tuple[int, str]]:
+        return self._connection().execute(
+            'SELECT seq, data FROM claims_events WHERE seq > ? ORDER BY seq', (after,)
+        ).fetchall()
+
+    def read(self, after: int, timeout: float) -> List[Tuple[int, str]]:
+        deadline = time.monotonic() + timeout
+        while True:
+            events = self._fetch(after)
+            remaining = deadline - time.monotonic()
+            if events or remaining <= 0:
+                return events
+            with self._changed:
+                self._changed.wait(min(self.poll_interval, remaining))
+
+    def bounds(self) -> Tuple[int, int]:
+        connection = self._connection()
+        oldest, latest = connection.execute('SELECT min(seq), max(seq) FROM claims_events').fetchone()
+        if latest is None:
+            # Empty buffer: AUTOINCREMENT still remembers the last id handed out
+            row = connection.execute("SELECT seq FROM sqlite_sequence WHERE name = 'claims_events'").fetchone()
+            latest = row[0] if row else 0
+            oldest = latest + 1
+        return oldest, latest
+
+
+class AsyncHub:
+    """Fans a broker's events out to asyncio.Queue subscribers on one event loop.
+
+    A single pump task reads the broker (blocking reads run in a worker
+    thread), however many subscribers are connected, encodes each batch into
+    frames once and hands them to every subscriber's bounded queue. Failed
+    reads are logged and retried with backoff. The pump stops when the last
+    subscriber leaves, and a new subscriber restarts it if it is not running.
+    """
+
+    def __init__(self, broker: Broker, buffer: int = DEFAULT_CLIENT_BUFFER):
+        self.broker = broker
+        self.buffer = buffer
+        self.subscribers = set()
+        # Sequence id of the last event handed to the subscribers
+        self.position = 0
+        self._pump_task = None
+
+    async def subscribe(self, after: int) -> Tuple[List[Tuple[int, bytes]], asyncio.Queue]:
+        """``(backlog, queue)`` of ``(seq, frame)`` that together deliver every event newer than ``after``.
+
+        The queue receives what the pump distributes from now on; the backlog
+        is what was published after ``after`` but already distributed.
+        """
+        subscriber = asyncio.Queue(maxsize=self.buffer)
+        if self._pump_task is None or self._pump_task.done():
+            # (Re)start the pump; subscribers still attached to a pump that died keep its position
+            if not self.subscribers:
+                self.position = after
+            self._pump_task = asyncio.get_running_loop().create_task(self._pump())
+        self.subscribers.add(subscriber)
+        position = self.position
+        if after >= position:
+            return [], subscriber
+        backlog = await asyncio.to_thread(self.broker.read, after, 0)
+        frames = [(seq, encode_frame(data, seq)) for seq, data in backlog if seq <= position]
+        return bounded(frames, self.buffer), subscriber
+
+    def unsubscribe(self, subscriber: asyncio.Queue) -> None:
+        self.subscribers.discard(subscriber)
+
+    async def _pump(self) -> None:
+        delay = HUB_RETRY_DELAY
+        while self.subscribers:
+            try:
+                events = await asyncio.to_thread(self.broker.read, self.position, HUB_READ_TIMEOUT)
+            except Exception:
+                # e.g. "database is locked" from SQLiteBroker: keep the subscribers and try again
+                logger.exception('Reading SSE events failed; retrying in %.1fs', delay)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, HUB_MAX_RETRY_DELAY)
+                continue
+            delay = HUB_RETRY_DELAY
+            if not events:
+                continue
+            self.position = events[-1][0]
+            frames = [(seq, encode_frame(data, seq)) for seq, data in events]
+            self.distribute(bounded(frames, self.buffer, len(self.subscribers)))
+
+    def distribute(self, frames: List[Tuple[int, bytes]]) -> None:
+        """Queue ``frames`` for every subscriber, coalescing for any that would overflow"""
+        delivered = coalesced = dropped = 0
+        last_seq = frames[-1][0]
+        for subscriber in list(self.subscribers):
+            pending = subscriber.qsize()
+            if pending + len(frames) <= self.buffer:
+                for item in frames:
+                    subscriber.put_nowait(item)
+                delivered += len(frames)
+                continue
+            # Slow client: replace everything it has not read yet with one refetch hint
+            while not subscriber.empty():
+                subscriber.get_nowait()
+            subscriber.put_nowait((last_seq, stats_changed_frame(last_seq, pending + len(frames))))
+            delivered += 1
+            coalesced += 1
+            dropped += pending + len(frames)
+        metrics.add(delivered=delivered, coalesced=coalesced, dropped=dropped)
+
+
+def get_hub() -> AsyncHub:
+    """The AsyncHub for the running event loop"""
+    loop = asyncio.get_running_loop()
+    hub = _hubs.get(loop)
+    if hub is None:
+        hub = _hubs[loop] = AsyncHub(get_broker(), client_buffer())
+    return hub
+
+
+BROKERS = {
+    'memory': InProcessBroker,
+    'sqlite': SQLiteBroker,
+}
+
+
+def create_broker(name: str) -> Broker:
+    broker_class = BROKERS.get(name) or import_string(name)
+    return broker_class(
+        path=getattr(settings, 'CLAIMS_EVENTS_DB', None),
+        buffer_size=getattr(settings, 'CLAIMS_EVENT_BUFFER', DEFAULT_BUFFER_SIZE),
+    )
+
+
+def get_broker() -> Broker:
+    """The process-wide broker configured by CLAIMS_EVENT_BROKER"""
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = create_broker(getattr(settings, 'CLAIMS_EVENT_BROKER', 'memory'))
+    return _broker
+
+
+def notify_clients(event_type: str, payload: dict) -> Optional[int]:
+    """Publish an event to every SSE subscriber; returns its sequence id, or None if it failed.
+
+    Callers publish after their change is saved, so a broker error (e.g. a
+    locked SQLite event log) is logged rather than raised: the change stands,
+    and dashboards catch up on their next refresh.
+    """
+    event = {'type': event_type, 'timestamp': timezone.now().isoformat(), **payload}
+    try:
+        seq = get_broker().publish(event)
+    except Exception:
+        logger.exception('Could not publish %s event', event_type)
+        metrics.add(failed=1)
+        return None
+    metrics.add(published=1)
+    return seq
@@ -0,0 +1,212 @@
+"""Streaming claim exports.
+
+Rows are read with a single query (first detail joined through subqueries)
+using ``.iterator()``, and serialized into buffered text chunks for a
+StreamingHttpResponse, so memory stays flat however many claims are exported.
+"""
+import csv
+import functools
+import io
+import json
+import tempfile
+import zlib
+from typing import AsyncIterator, Iterable, Iterator
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Exists, OuterRef, Subquery
+
+from .importing import require_pyarrow
+from .models import ClaimDetail
+from .serializers import claim_record, record_values
+
+# Rows fetched from the database per round trip
+EXPORT_CHUNK_SIZE = 2000
+# Approximate size of each chunk handed to the response
+STREAM_BUFFER_BYTES = 64 * 1024
+# Rows per Arrow record batch (and Parquet row group)
+ARROW_BATCH_ROWS = 64 * 1024
+
+CSV_HEADER = ('id', 'patient_name', 'billed_amount', 'paid_amount', 'status', 'insurer_name', 'discharge_date')
+
+CLAIM_EXPORT_FIELDS = ('claim_id', 'patient_name', 'billed_amount', 'paid_amount', 'status', 'insurer_name', 'discharge_date')
+
+
+def _with_first_detail(claims):
+    """Annotate ``has_detail``, ``detail_cpt_codes`` and ``detail_denial_reason`` from each claim's first detail"""
+    details = ClaimDetail.objects.filter(claim=OuterRef('pk')).order_by('pk')
+    return claims.annotate(
+        has_detail=Exists(details),
+        detail_cpt_codes=Subquery(details.values('cpt_codes')[:1]),
+        detail_denial_reason=Subquery(details.values('denial_reason')[:1]),
+    )
+
+
+def export_rows(claims, chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[tuple]:
+    """Iterate ``CLAIM_EXPORT_FIELDS + (has_detail, cpt_codes, denial_reason)`` tuples.
+
+    The detail columns come from each claim's first ClaimDetail (by id), like
+    ``claim.details.first()``, but without a query per claim.
+    """
+    return _with_first_detail(claims).values_list(
+        *CLAIM_EXPORT_FIELDS, 'has_detail', 'detail_cpt_codes', 'detail_denial_reason'
+    ).iterator(chunk_size=chunk_size)
+
+
+def claim_records(claims, chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[dict]:
+    """Export dicts in the JSON export's shape (detail keys only for claims that have details)"""
+    rows = record_values(_with_first_detail(claims), 'has_detail', 'detail_cpt_codes', 'detail_denial_reason')
+    for row in rows.iterator(chunk_size=chunk_size):
+        record = claim_record(row)
+        if row[7]:
+            record['cpt_codes'] = row[8] or None
+            record['denial_reason'] = row[9] or None
+        yield record
+
+
+def buffered(pieces: Iterable[str], size: int = STREAM_BUFFER_BYTES) -> Iterator[str]:
+    """Join small string pieces into chunks of roughly ``size`` characters"""
+    buffer = []
+    length = 0
+    for piece in pieces:
+        buffer.append(piece)
+        length += len(piece)
+        if length >= size:
+            yield ''.join(buffer)
+            buffer = []
+            length = 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def json_array(records: Iterable[dict]) -> Iterator[str]:
+    """Stream ``json.dumps(list(records), indent=2)`` piece by piece (records must be flat dicts)"""
+    # indent= forces json's pure-Python encoder; laying out flat objects by hand keeps the C one
+    encode = json.JSONEncoder().encode
+    first = True
+    for record in records:
+        body = ',\n    '.join(f'{encode(key)}: {encode(value)}' for key, value in record.items())
+        yield f'{"[" if first else ","}\n  {{\n    {body}\n  }}'
+        first = False
+    yield '[]' if first else '\n]'
+
+
+def ndjson(records: Iterable[dict]) -> Iterator[str]:
+    """One compact JSON object per line"""
+    for record in records:
+        yield json.dumps(record, separators=(',', ':')) + '\n'
+
+
+class Echo:
+    """File-like object whose write() returns the line, so csv.writer can feed a generator"""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(claims, delimiter: str = '|', chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[str]:
+    """The CSV export (header plus one line per claim) as a stream of lines"""
+    writer = csv.writer(Echo(), delimiter=delimiter)
+    yield writer.writerow(CSV_HEADER)
+    for row in claims.values_list(*CLAIM_EXPORT_FIELDS).iterator(chunk_size=chunk_size):
+        discharge = row[-1]
+        yield writer.writerow((*row[:-1], discharge.isoformat() if discharge else ''))
+
+
+def gzipped(chunks: Iterable[str], encoding: str = 'utf-8') -> Iterator[bytes]:
+    """Gzip-compress a stream of text chunks on the fly"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode(encoding))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def arrow_schema():
+    """Typed columns of the Arrow/Parquet export; readable by ``load_sample_data --format parquet``"""
+    pa = require_pyarrow()
+    return pa.schema([
+        ('id', pa.string()),
+        ('patient_name', pa.string()),
+        ('billed_amount', pa.decimal128(10, 2)),
+        ('paid_amount', pa.decimal128(10, 2)),
+        ('status', pa.string()),
+        ('insurer_name', pa.string()),
+        ('discharge_date', pa.date32()),
+        ('cpt_codes', pa.string()),
+        ('denial_reason', pa.string()),
+    ])
+
+
+def arrow_batches(claims, batch_rows: int = ARROW_BATCH_ROWS) -> Iterator:
+    """Claims (with their first detail's columns) as Arrow record batches"""
+    pa = require_pyarrow()
+    schema = arrow_schema()
+    columns = [[] for _ in schema]
+
+    def flush():
+        arrays = [pa.array(values, type=field.type) for values, field in zip(columns, schema)]
+        for values in columns:
+            values.clear()
+        return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+    for *claim_values, _has_detail, cpt_codes, denial_reason in export_rows(claims):
+        for values, value in zip(columns, (*claim_values, cpt_codes, denial_reason)):
+            values.append(value)
+        if len(columns[0]) >= batch_rows:
+            yield flush()
+    if columns[0]:
+        yield flush()
+
+
+def arrow_stream(claims) -> Iterator[bytes]:
+    """Arrow IPC stream bytes, one record batch at a time"""
+    pa = require_pyarrow()
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, arrow_schema()) as writer:
+        for batch in arrow_batches(claims):
+            writer.write_batch(batch)
+            yield sink.getvalue()
+            sink.seek(0)
+            sink.truncate()
+    yield sink.getvalue()
+
+
+def parquet_file(claims):
+    """Write claims to a zstd-compressed Parquet temp file and return it rewound.
+
+    Parquet's footer is written last, so the file is spooled to disk (one row
+    group in memory at a time) rather than streamed.
+    """
+    pa = require_pyarrow()
+    spool = tempfile.TemporaryFile()
+    with pa.parquet.ParquetWriter(spool, arrow_schema(), compression='zstd') as writer:
+        for batch in arrow_batches(claims):
+            writer.write_batch(batch)
+    spool.seek(0)
+    return spool
+
+
+async def _pulled(chunks: Iterator) -> AsyncIterator:
+    """Advance a sync iterator one chunk at a time on the request's sync thread"""
+    done = object()
+    pull = sync_to_async(next, thread_sensitive=True)
+    while (chunk := await pull(chunks, done)) is not done:
+        yield chunk
+
+
+def stream_under_asgi(view):
+    """Keep a view's streaming export streamed when served over ASGI.
+
+    Django's ASGI handler reads a sync streaming body to the end before
+    sending any of it, which would hold a whole export in memory. Under ASGI
+    the body is pulled chunk by chunk instead; under WSGI nothing changes.
+    """
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        if isinstance(request, ASGIRequest) and response.streaming and not response.is_async:
+            response.streaming_content = _pulled(iter(response.streaming_content))
+        return response
+    return wrapper
@@ -0,0 +1,304 @@
+"""Streaming readers and value parsers for claim CSV imports.
+
+Nothing here touches Django, so the parsers can run in worker processes.
+"""
+import csv
+import io
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from typing import Callable, Iterator, Optional
+
+# Logical field -> accepted header spellings (lower-cased), in priority order
+CLAIM_COLUMNS = {
+    'claim_id': ('id', 'claim_id', 'claim id', 'claimid'),
+    'patient_name': ('patient_name', 'patient'),
+    'billed_amount': ('billed_amount', 'billed'),
+    'paid_amount': ('paid_amount', 'paid'),
+    'status': ('status',),
+    'insurer_name': ('insurer_name', 'insurer'),
+    'discharge_date': ('discharge_date', 'discharge date', 'date'),
+}
+
+DETAIL_COLUMNS = {
+    'claim_id': ('claim_id', 'id', 'claim id', 'claimid'),
+    'cpt_codes': ('cpt_codes', 'cpt', 'codes'),
+    'denial_reason': ('denial_reason', 'denial', 'reason'),
+}
+
+# Only this much of the file is read to detect the delimiter
+SNIFF_BYTES = 64 * 1024
+DEFAULT_DELIMITER = '|'
+
+# Size of the byte ranges handed to each worker in parallel mode
+DEFAULT_CHUNK_BYTES = 4 * 1024 * 1024
+
+# Rows per Arrow record batch when reading Parquet
+PARQUET_BATCH_ROWS = 64 * 1024
+
+PYARROW_MISSING = 'Parquet support requires pyarrow (pip install pyarrow)'
+
+
+def parse_money(value) -> Decimal:
+    if value is None:
+        return Decimal('0')
+    # Typed sources (Parquet) already carry numbers
+    if isinstance(value, Decimal):
+        return value
+    if isinstance(value, (int, float)):
+        return Decimal(repr(value))
+    # Fast path: plain numbers (the common case) need no clean-up
+    try:
+        return Decimal(value)
+    except (InvalidOperation, TypeError):
+        pass
+    txt = str(value).strip().replace('$', '').replace(',', '')
+    if txt == '':
+        return Decimal('0')
+    try:
+        return Decimal(txt)
+    except InvalidOperation:
+        return Decimal('0')
+
+
+def parse_date(value):
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    # ISO dates go through the C parser instead of four strptime attempts
+    if len(value) == 10 and value[4] == '-':
+        try:
+            return date.fromisoformat(value)
+        except ValueError:
+            pass
+    for fmt in ('%Y-%m-%d', '%m/%d/%Y', '%m/%d/%y', '%Y/%m/%d'):
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def parse_cpt_codes(value) -> list:
+    """Split a free-text CPT code list on commas, tabs and newlines, deduplicated in order"""
+    if not value:
+        return []
+    parts = (p.strip() for p in str(value).replace('\n', ',').replace('\t', ',').split(','))
+    return list(dict.fromkeys(p for p in parts if p))
+
+
+def parse_claim_values(values: tuple) -> tuple:
+    """Convert a CLAIM_COLUMNS tuple (strings, or typed Parquet values) into typed values (discharge_date may be None)"""
+    claim_id, patient, billed, paid, status, insurer, discharge = values
+    if not claim_id:
+        raise ValueError('Missing claim id')
+    return (
+        claim_id,
+        patient or 'Unknown Patient',
+        parse_money(billed),
+        parse_money(paid),
+        status or 'Pending',
+        insurer or 'Unknown Insurer',
+        parse_date(discharge),
+    )
+
+
+def sniff_delimiter(sample: str) -> str:
+    """Detect the delimiter from a leading sample, ignoring a trailing partial line"""
+    if '\n' in sample:
+        sample = sample[:sample.rindex('\n') + 1]
+    try:
+        return csv.Sniffer().sniff(sample, delimiters='|,\t').delimiter
+    except csv.Error:
+        return DEFAULT_DELIMITER
+
+
+def resolve_columns(header: list, columns: dict) -> tuple:
+    """Map each logical field to its column index in ``header`` (None when absent)"""
+    positions = {}
+    for i, name in enumerate(header):
+        positions.setdefault((name or '').strip().lower(), i)
+    resolved = []
+    for candidates in columns.values():
+        resolved.append(next((positions[c] for c in candidates if c in positions), None))
+    return tuple(resolved)
+
+
+def _iter_rows(reader, indexes: tuple, parse: Optional[Callable]) -> Iterator[tuple]:
+    """Yield ``(line_no, values, error)`` for each non-blank row of a csv.reader"""
+    width = max((i for i in indexes if i is not None), default=-1) + 1
+    for row in reader:
+        if not row:
+            continue
+        if len(row) < width:
+            row = row + [''] * (width - len(row))
+        values = tuple('' if i is None else row[i].strip() for i in indexes)
+        if parse is None:
+            yield reader.line_num, values, None
+            continue
+        try:
+            yield reader.line_num, parse(values), None
+        except Exception as e:
+            yield reader.line_num, values, str(e)
+
+
+class CsvSource:
+    """Iterate a delimited file as ``(line_no, values, error)`` without loading it into memory.
+
+    ``values`` is a tuple of stripped strings ordered like ``columns`` (fields
+    missing from the header come back as ''), passed through ``parse`` when
+    given. Rows that ``parse`` rejects carry the raw values and an error
+    message instead. The delimiter and header mapping are resolved once per file.
+    """
+
+    def __init__(self, path: str, columns: dict, parse: Optional[Callable] = None, encoding: str = 'utf-8-sig'):
+        self.path = path
+        self.columns = columns
+        self.parse = parse
+        self.encoding = encoding
+        self.delimiter = None
+
+    def __iter__(self) -> Iterator[tuple]:
+        with open(self.path, 'r', encoding=self.encoding, newline='') as f:
+            self.delimiter = sniff_delimiter(f.read(SNIFF_BYTES))
+            f.seek(0)
+            reader = csv.reader(f, delimiter=self.delimiter)
+            header = next(reader, None)
+            if header is None:
+                return
+            yield from _iter_rows(reader, resolve_columns(header, self.columns), self.parse)
+
+
+def _parse_chunk(path: str, start: int, end: int, delimiter: str, indexes: tuple, parse: Optional[Callable]):
+    """Worker: parse the byte range [start, end) and return ``(line_count, rows)``.
+
+    Line numbers in ``rows`` are relative to the chunk (first line is 1).
+    """
+    with open(path, 'rb') as f:
+        f.seek(start)
+        text = f.read(end - start).decode('utf-8')
+    line_count = text.count('\n') + (1 if text and not text.endswith('\n') else 0)
+    reader = csv.reader(io.StringIO(text, newline=''), delimiter=delimiter)
+    return line_count, list(_iter_rows(reader, indexes, parse))
+
+
+class ParallelCsvSource(CsvSource):
+    """CsvSource that parses newline-aligned byte ranges in a process pool.
+
+    Chunks are consumed in file order, so rows, line numbers and errors come
+    out exactly as the serial reader would produce them. Quoted fields must not
+    span lines, since chunk boundaries are placed at raw newlines.
+    """
+
+    def __init__(self, path: str, columns: dict, parse: Optional[Callable] = None, workers: int = 2,
+                 chunk_bytes: int = DEFAULT_CHUNK_BYTES, encoding: str = 'utf-8-sig'):
+        super().__init__(path, columns, parse=parse, encoding=encoding)
+        self.workers = workers
+        self.chunk_bytes = chunk_bytes
+
+    def _chunks(self, f, start: int, size: int) -> Iterator[tuple]:
+        pos = start
+        while pos < size:
+            f.seek(min(pos + self.chunk_bytes, size))
+            f.readline()
+            end = min(f.tell(), size)
+            yield pos, end
+            pos = end
+
+    def __iter__(self) -> Iterator[tuple]:
+        size = os.path.getsize(self.path)
+        with open(self.path, 'rb') as f:
+            sample = f.read(SNIFF_BYTES).decode(self.encoding, errors='ignore')
+            self.delimiter = sniff_delimiter(sample)
+            f.seek(0)
+            header_line = f.readline()
+            header = next(csv.reader([header_line.decode(self.encoding)], delimiter=self.delimiter), None)
+            if header is None:
+                return
+            indexes = resolve_columns(header, self.columns)
+            chunks = self._chunks(f, f.tell(), size)
+
+            context = multiprocessing.get_context('spawn')
+            with ProcessPoolExecutor(max_workers=self.workers, mp_context=context) as pool:
+                # Keep a bounded window of chunks in flight so memory stays flat on huge files
+                pending = deque()
+                for start, end in chunks:
+                    pending.append(pool.submit(_parse_chunk, self.path, start, end, self.delimiter, indexes, self.parse))
+                    if len(pending) >= self.workers * 2:
+                        break
+                first_line = 2
+                while pending:
+                    line_count, rows = pending.popleft().result()
+                    next_chunk = next(chunks, None)
+                    if next_chunk is not None:
+                        pending.append(pool.submit(_parse_chunk, self.path, *next_chunk, self.delimiter, indexes, self.parse))
+                    for line_no, values, error in rows:
+                        yield first_line + line_no - 1, values, error
+                    first_line += line_count
+
+
+def require_pyarrow():
+    """Import pyarrow and pyarrow.parquet, raising ImportError with an install hint when absent"""
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as exc:
+        raise ImportError(PYARROW_MISSING) from exc
+    return pyarrow
+
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def _arrow_values(array, pyarrow) -> list:
+    """Python values of an Arrow array; decimals and dates avoid pyarrow's slow per-value conversion"""
+    types = pyarrow.types
+    if types.is_decimal(array.type):
+        return [None if v is None else Decimal(v) for v in array.cast(pyarrow.string()).to_pylist()]
+    if types.is_date32(array.type):
+        from_ordinal = date.fromordinal
+        return [None if v is None else from_ordinal(_EPOCH_ORDINAL + v) for v in array.cast(pyarrow.int32()).to_pylist()]
+    return array.to_pylist()
+
+
+class ParquetSource:
+    """Iterate a Parquet file as ``(row_no, values, error)``, like CsvSource.
+
+    Columns are matched by name (case-insensitively) against ``columns`` and
+    read in record batches, so memory stays flat. Values keep their Arrow types
+    (Decimal, date, str); fields missing from the file come back as None.
+    """
+
+    def __init__(self, path: str, columns: dict, parse: Optional[Callable] = None, batch_rows: int = PARQUET_BATCH_ROWS):
+        self.path = path
+        self.columns = columns
+        self.parse = parse
+        self.batch_rows = batch_rows
+
+    def __iter__(self) -> Iterator[tuple]:
+        pyarrow = require_pyarrow()
+        parquet_file = pyarrow.parquet.ParquetFile(self.path)
+        names = parquet_file.schema_arrow.names
+        indexes = resolve_columns(names, self.columns)
+        wanted = sorted({i for i in indexes if i is not None})
+        position = {index: n for n, index in enumerate(wanted)}
+        row_no = 0
+        for batch in parquet_file.iter_batches(batch_size=self.batch_rows, columns=[names[i] for i in wanted]):
+            data = [_arrow_values(batch.column(n), pyarrow) for n in range(batch.num_columns)]
+            missing = [None] * batch.num_rows
+            ordered = [missing if i is None else data[position[i]] for i in indexes]
+            for values in zip(*ordered):
+                row_no += 1
+                if self.parse is None:
+                    yield row_no, values, None
+                    continue
+                try:
+                    yield row_no, self.parse(values), None
+                except Exception as e:
+                    yield row_no, values, str(e)
@@ -0,0 +1,134 @@
+"""Materialized KPI totals (KpiSummary rows) and their incremental maintenance.
+
+Every claim contributes to four rows: the global row, its insurer, its status
+and its assignee ('' when unassigned). Signal handlers in claims.signals apply
+deltas as claims and flags change; bulk paths (imports, queryset updates) skip
+signals and call rebuild() instead.
+"""
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+
+COUNTERS = ('claim_count', 'flag_count', 'assigned_count', 'billed_total', 'paid_total')
+
+_state = threading.local()
+
+
+def _models():
+    from .models import Claim, Flag, KpiSummary
+    return Claim, Flag, KpiSummary
+
+
+def is_suspended() -> bool:
+    return getattr(_state, 'suspended', 0) > 0
+
+
+@contextmanager
+def suspended():
+    """Skip incremental updates (e.g. during a bulk delete); call rebuild() afterwards"""
+    _state.suspended = getattr(_state, 'suspended', 0) + 1
+    try:
+        yield
+    finally:
+        _state.suspended -= 1
+
+
+def scope_keys(insurer_name, status, assigned_to_id) -> list:
+    """The (scope, key) rows a claim with these attributes contributes to"""
+    return [
+        ('global', ''),
+        ('insurer', insurer_name or ''),
+        ('status', status or ''),
+        ('assignee', str(assigned_to_id) if assigned_to_id else ''),
+    ]
+
+
+def claim_vector(billed, paid, assigned_to_id, flags: int = 0) -> dict:
+    return {
+        'claim_count': 1,
+        'flag_count': flags,
+        'assigned_count': 1 if assigned_to_id else 0,
+        'billed_total': Decimal(billed or 0),
+        'paid_total': Decimal(paid or 0),
+    }
+
+
+def apply_deltas(deltas: dict) -> None:
+    """Add ``{(scope, key): {counter: delta}}`` to the summary rows, creating missing rows"""
+    _, _, KpiSummary = _models()
+    for (scope, key), changes in deltas.items():
+        changes = {name: value for name, value in changes.items() if value}
+        if not changes:
+            continue
+        updates = {name: F(name) + value for name, value in changes.items()}
+        if KpiSummary.objects.filter(scope=scope, key=key).update(**updates):
+            continue
+        try:
+            with transaction.atomic():
+                KpiSummary.objects.create(scope=scope, key=key, **changes)
+        except IntegrityError:
+            # Another writer created the row first
+            KpiSummary.objects.filter(scope=scope, key=key).update(**updates)
+
+
+def add_delta(deltas: dict, keys, vector: dict, sign: int = 1) -> None:
+    for key in keys:
+        row = deltas.setdefault(key, defaultdict(int))
+        for name, value in vector.items():
+            row[name] += sign * value
+
+
+def _grouped(queryset, group_field: str, aggregates: dict) -> dict:
+    return {
+        row[group_field]: row
+        for row in queryset.order_by().values(group_field).annotate(**aggregates)
+    }
+
+
+def rebuild(models=None) -> int:
+    """Recompute every summary row from the base tables; returns the number of rows written.
+
+    ``models`` optionally overrides the (Claim, Flag, KpiSummary) classes, for use
+    with historical models inside migrations.
+    """
+    Claim, Flag, KpiSummary = models or _models()
+    claim_aggregates = {
+        'claim_count': Count('id'),
+        'assigned_count': Count('id', filter=Q(assigned_to__isnull=False)),
+        'billed_total': Sum('billed_amount'),
+        'paid_total': Sum('paid_amount'),
+    }
+    rows = {}
+
+    def add(scope, key, values, flags):
+        row = rows.setdefault((scope, key), {name: 0 for name in COUNTERS})
+        for name in ('claim_count', 'assigned_count', 'billed_total', 'paid_total'):
+            row[name] += (values or {}).get(name) or 0
+        row['flag_count'] += flags
+
+    totals = Claim.objects.order_by().aggregate(**claim_aggregates)
+    add('global', '', totals, Flag.objects.count())
+
+    for scope, field in (('insurer', 'insurer_name'), ('status', 'status'), ('assignee', 'assigned_to')):
+        claims = _grouped(Claim.objects.all(), field, claim_aggregates)
+        flags = _grouped(Flag.objects.all(), f'claim__{field}', {'n': Count('id')})
+        for value in set(claims) | set(flags):
+            key = '' if value is None else str(value)
+            add(scope, key, claims.get(value), (flags.get(value) or {}).get('n', 0))
+
+    with transaction.atomic():
+        KpiSummary.objects.all().delete()
+        KpiSummary.objects.bulk_create(
+            KpiSummary(scope=scope, key=key, **values) for (scope, key), values in rows.items()
+        )
+    return len(rows)
+
+
+def get_summary(scope: str = 'global', key: str = ''):
+    """Counters for one summary row, or None when the row does not exist"""
+    _, _, KpiSummary = _models()
+    return KpiSummary.objects.filter(scope=scope, key=key).values(*COUNTERS).first()
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+from claims.assignment import auto_assign
+from claims.models import Claim
+import time
+
+
+class Command(BaseCommand):
+    help = 'Distribute unassigned claims across active reviewers, balancing claim counts and billed amounts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--status', dest='statuses', action='append', choices=[value for value, _ in Claim.STATUS_CHOICES], help='Only claims with this status (repeatable)')
+        parser.add_argument('--insurer', dest='insurer', default='', help='Only claims from this insurer')
+        parser.add_argument('--limit', dest='limit', type=int, default=None, help='Assign at most N claims (oldest first)')
+        parser.add_argument('--reviewer', dest='reviewers', action='append', help='Only assign to this reviewer username (repeatable)')
+        parser.add_argument('--count-weight', dest='count_weight', type=float, default=1.0, help='Weight of claim counts in a reviewer\'s load (default 1)')
+        parser.add_argument('--billed-weight', dest='billed_weight', type=float, default=1.0, help='Weight of billed amounts in a reviewer\'s load (default 1)')
+        parser.add_argument('--dry-run', dest='dry_run', action='store_true', help='Print the plan without saving it')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            summary = auto_assign(
+                statuses=options['statuses'],
+                insurer=options['insurer'],
+                limit=options['limit'],
+                usernames=options['reviewers'],
+                count_weight=options['count_weight'],
+                billed_weight=options['billed_weight'],
+                dry_run=options['dry_run'],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        for reviewer in summary['reviewers']:
+            self.stdout.write(
+                f"{reviewer['username']:<20} +{reviewer['claims_added']:>7} claims  +${reviewer['billed_added']:>14,.2f}  "
+                f"-> {reviewer['claims_total']:>7} claims  ${reviewer['billed_total']:>14,.2f}"
+            )
+        elapsed = time.perf_counter() - started
+        if summary['dry_run']:
+            self.stdout.write(self.style.WARNING(f"Dry run: {summary['claims']} unassigned claims planned, nothing saved ({elapsed:.2f}s)"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Assigned {summary['assigned']} claims to {len(summary['reviewers'])} reviewers ({elapsed:.2f}s)"))
@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand, CommandError
+from claims.profiling import list_profiles, load_stats, prune
+import io
+
+SORT_KEYS = ('cumulative', 'tottime', 'ncalls')
+
+
+class Command(BaseCommand):
+    help = 'List captured request profiles and summarise their hottest functions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--view', dest='view', default='', help='Only profiles of this view name (e.g. claims:index)')
+        parser.add_argument('--limit', dest='limit', type=int, default=20, help='Show at most N profiles, newest first (default 20)')
+        parser.add_argument('--show', dest='show', help='Print the hottest functions of this profile id')
+        parser.add_argument('--summary', dest='summary', action='store_true', help='Print the hottest functions across the listed profiles combined')
+        parser.add_argument('--top', dest='top', type=int, default=25, help='Functions to print with --show/--summary (default 25)')
+        parser.add_argument('--sort', dest='sort', choices=SORT_KEYS, default='cumulative', help='Order functions by this pstats key (default cumulative)')
+        parser.add_argument('--keep', dest='keep', type=int, help='Delete all but the newest N profiles first')
+
+    def handle(self, *args, **options):
+        if options['keep'] is not None:
+            removed = prune(options['keep'])
+            self.stdout.write(f'Removed {removed} profiles')
+
+        if options['show']:
+            selected = [profile for profile in list_profiles() if profile['id'] == options['show']]
+            if not selected:
+                raise CommandError(f"No profile with id {options['show']}")
+            self._print_stats(selected, options)
+            return
+
+        profiles = list_profiles(options['view'])[:options['limit']]
+        if not profiles:
+            self.stdout.write('No profiles captured yet')
+            return
+        for profile in profiles:
+            trigger = 'admin' if profile.get('requested') else 'sampled'
+            self.stdout.write(
+                f"{profile['id']:<56} {profile.get('status', ''):>3} {profile.get('duration_ms', 0):>9.1f} ms "
+                f"{profile.get('calls', 0):>9} calls  {trigger:<7} {profile.get('method', '')} {profile.get('path', '')}"
+            )
+        self.stdout.write(f'{len(profiles)} profiles; view one with --show <id>, or open its .prof file in snakeviz')
+        if options['summary']:
+            self._print_stats(profiles, options)
+
+    def _print_stats(self, profiles, options):
+        try:
+            stats = load_stats(profiles)
+        except ValueError as e:
+            raise CommandError(str(e))
+        output = io.StringIO()
+        stats.stream = output
+        stats.sort_stats(options['sort']).print_stats(options['top'])
+        self.stdout.write(output.getvalue())
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from claims import kpis
+import time
+
+
+class Command(BaseCommand):
+    help = 'Recompute the materialized KPI summary table from claims and flags'
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        rows = kpis.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'KPI summary rebuilt: {rows} rows ({time.perf_counter() - started:.2f}s)'))
@@ -0,0 +1,144 @@
+"""In-process request histograms, rendered in the Prometheus text format.
+
+The instrumentation middleware (claims/middleware.py) records one observation
+per request here, labelled with the resolved view name so the series stay few
+and stable. Each worker process keeps its own counts; Prometheus scrapes every
+worker (or sums them) as it would any multi-process exporter. Updates take a
+single lock per request and only touch preallocated bucket lists.
+"""
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+# name: (help, buckets)
+HISTOGRAMS = {
+    'claims_http_request_duration_seconds': ('Wall time until the view returned a response', DURATION_BUCKETS),
+    'claims_db_duration_seconds': ('Time spent in database queries per request', DURATION_BUCKETS),
+    'claims_db_queries': ('Database queries per request', QUERY_BUCKETS),
+    'claims_http_response_size_bytes': ('Response body size (non-streaming responses)', SIZE_BUCKETS),
+}
+
+
+class Histogram:
+    """Cumulative-on-render bucket counts plus sum and count"""
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        # bisect_left puts a value equal to a bound in that bucket, matching Prometheus' ``le``
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _label(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Registry:
+    """Per-view request metrics for this process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._requests = defaultdict(int)
+        self._duplicates = defaultdict(int)
+        self._histograms = {}
+
+    def _histogram(self, name: str, view: str) -> Histogram:
+        histogram = self._histograms.get((name, view))
+        if histogram is None:
+            histogram = self._histograms[(name, view)] = Histogram(HISTOGRAMS[name][1])
+        return histogram
+
+    def observe(self, view: str, method: str, status: int, duration: float, db_time: float,
+                queries: int, duplicates: int, size=None) -> None:
+        with self._lock:
+            self._requests[(view, method, status)] += 1
+            if duplicates:
+                self._duplicates[view] += duplicates
+            self._histogram('claims_http_request_duration_seconds', view).observe(duration)
+            self._histogram('claims_db_duration_seconds', view).observe(db_time)
+            self._histogram('claims_db_queries', view).observe(queries)
+            if size is not None:
+                self._histogram('claims_http_response_size_bytes', view).observe(size)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._requests.clear()
+            self._duplicates.clear()
+            self._histograms.clear()
+
+    def render(self) -> str:
+        """All series in the Prometheus text exposition format (version 0.0.4)"""
+        with self._lock:
+            requests = sorted(self._requests.items())
+            duplicates = sorted(self._duplicates.items())
+            histograms = {
+                key: (list(h.counts), h.sum, h.count) for key, h in self._histograms.items()
+            }
+
+        lines = [
+            '# HELP claims_http_requests_total Requests handled, by view, method and status',
+            '# TYPE claims_http_requests_total counter',
+        ]
+        for (view, method, status), count in requests:
+            lines.append(f'claims_http_requests_total{{view="{_label(view)}",method="{method}",status="{status}"}} {count}')
+
+        lines += [
+            '# HELP claims_db_duplicate_queries_total Queries that repeated an earlier query (same SQL and parameters) in the same request',
+            '# TYPE claims_db_duplicate_queries_total counter',
+        ]
+        for view, count in duplicates:
+            lines.append(f'claims_db_duplicate_queries_total{{view="{_label(view)}"}} {count}')
+
+        for name, (help_text, buckets) in HISTOGRAMS.items():
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+            for (series, view), (counts, total, count) in sorted(histograms.items()):
+                if series != name:
+                    continue
+                view = _label(view)
+                cumulative = 0
+                for bound, bucket_count in zip(buckets, counts):
+                    cumulative += bucket_count
+                    lines.append(f'{name}_bucket{{view="{view}",le="{_number(bound)}"}} {cumulative}')
+                lines.append(f'{name}_bucket{{view="{view}",le="+Inf"}} {count}')
+                lines.append(f'{name}_sum{{view="{view}"}} {_number(total)}')
+                lines.append(f'{name}_count{{view="{view}"}} {count}')
+
+        lines += self._event_stream_lines()
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _event_stream_lines() -> list:
+        from .events import metrics as event_metrics
+
+        counts = event_metrics.snapshot()
+        lines = [
+            '# HELP claims_sse_events_total Admin event stream activity in this process',
+            '# TYPE claims_sse_events_total counter',
+        ]
+        for kind in event_metrics.FIELDS:
+            lines.append(f'claims_sse_events_total{{kind="{kind}"}} {counts[kind]}')
+        lines += [
+            '# HELP claims_sse_subscribers Admin event stream clients currently connected',
+            '# TYPE claims_sse_subscribers gauge',
+            f'claims_sse_subscribers {counts["subscribers"]}',
+        ]
+        return lines
+
+
+registry = Registry()
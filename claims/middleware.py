@@ -0,0 +1,273 @@
+"""Per-request timing and SQL instrumentation.
+
+RequestMetricsMiddleware times each request, counts its queries and their
+database time, spots duplicates (the same SQL with the same parameters run
+again in one request), adds a ``Server-Timing`` header and records everything
+in claims.metrics, which /metrics serves to Prometheus.
+
+Queries are observed through an execute wrapper installed once on every
+database connection. It reads the current request's stats from a context
+variable, so queries run by async views through sync_to_async threads are
+counted too, and anything outside a request (management commands, streamed
+export bodies) costs one ContextVar lookup. Set CLAIMS_REQUEST_METRICS=0 to
+take the middleware out of the stack entirely.
+
+ProfilingMiddleware captures cProfile data for admin-requested or sampled
+requests; see claims/profiling.py.
+"""
+import cProfile
+import logging
+import random
+import time
+from contextvars import ContextVar
+from functools import partial
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from .metrics import registry
+from .profiling import new_profile_id, save
+
+logger = logging.getLogger(__name__)
+
+_current = ContextVar('claims_request_stats', default=None)
+
+
+class RequestStats:
+    """Queries seen while handling one request"""
+
+    __slots__ = ('queries', 'db_time', 'duplicates', '_seen')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.duplicates = 0
+        self._seen = set()
+
+    def add(self, sql: str, params, many: bool, elapsed: float) -> None:
+        self.queries += 1
+        self.db_time += elapsed
+        if many:
+            # executemany parameter lists can be huge and are never an accidental repeat
+            return
+        try:
+            key = hash((sql, tuple(params) if isinstance(params, list) else params))
+        except TypeError:
+            key = hash((sql, repr(params)))
+        if key in self._seen:
+            self.duplicates += 1
+        else:
+            self._seen.add(key)
+
+
+def _record_query(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.add(sql, params, many, time.perf_counter() - started)
+
+
+def _install(connection) -> None:
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+def _on_connection_created(sender, connection, **kwargs):
+    _install(connection)
+
+
+def _view_name(request) -> str:
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match else '<unresolved>'
+
+
+class RequestMetricsMiddleware:
+    """Times every request and its SQL; works under both WSGI and ASGI"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'CLAIMS_REQUEST_METRICS', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.server_timing = getattr(settings, 'CLAIMS_SERVER_TIMING', True)
+        self.duplicate_warning = getattr(settings, 'CLAIMS_DUPLICATE_QUERY_WARNING', 10)
+        connection_created.connect(_on_connection_created, dispatch_uid='claims_request_metrics')
+        # Connections opened before the middleware was loaded (this thread only; others open lazily)
+        for connection in connections.all(initialized_only=True):
+            _install(connection)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = RequestStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, stats, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, stats, time.perf_counter() - started)
+
+    def _finish(self, request, response, stats: RequestStats, duration: float):
+        view = _view_name(request)
+        size = None if response.streaming else len(response.content)
+        registry.observe(view, request.method, response.status_code, duration,
+                         stats.db_time, stats.queries, stats.duplicates, size)
+
+        if self.server_timing:
+            description = f'{stats.queries} queries'
+            if stats.duplicates:
+                description += f', {stats.duplicates} duplicate'
+            response.headers['Server-Timing'] = (
+                f'app;dur={duration * 1000:.1f}, db;dur={stats.db_time * 1000:.1f};desc="{description}"'
+            )
+        if self.duplicate_warning and stats.duplicates >= self.duplicate_warning:
+            logger.warning('%s %s (%s) ran %d duplicate queries out of %d',
+                           request.method, request.path, view, stats.duplicates, stats.queries)
+        return response
+
+
+def _finish_profile(request, response, profile_id: str, profiler, started: float, requested: bool) -> None:
+    profiler.disable()
+    try:
+        save(profile_id, profiler, {
+            'view': _view_name(request),
+            'method': request.method,
+            'path': request.get_full_path(),
+            'status': response.status_code,
+            'streaming': response.streaming,
+            'requested': requested,
+            'duration_ms': round((time.perf_counter() - started) * 1000, 1),
+            'captured_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        })
+    except OSError:
+        logger.exception('Could not save profile %s', profile_id)
+
+
+class _ProfileFinisher:
+    """Finishes a request's profile once its streamed body is done.
+
+    The subclasses call ``close()`` after the last chunk; Django calls it from
+    response.close() too, so a body that is never read (or is abandoned by
+    the client) still stops the profiler.
+    """
+
+    def __init__(self, content, finish):
+        self.content = content
+        self._finish = finish
+
+    def close(self) -> None:
+        if self._finish is not None:
+            finish, self._finish = self._finish, None
+            finish()
+
+
+class _ProfiledBody(_ProfileFinisher):
+    def __iter__(self):
+        try:
+            yield from self.content
+        finally:
+            self.close()
+
+
+class _AsyncProfiledBody(_ProfileFinisher):
+    """For async streaming content (exports served over ASGI)"""
+
+    async def __aiter__(self):
+        try:
+            async for chunk in self.content:
+                yield chunk
+        finally:
+            # Stop the profiler in the request's thread, where process_view started it
+            await sync_to_async(self.close)()
+
+
+class ProfilingMiddleware:
+    """Profiles admin-requested (``?profile=1`` / ``X-Profile: 1``) or sampled requests.
+
+    The profiler starts in process_view, which Django runs in the same thread
+    as a sync view (under ASGI too), and stops in that thread once the response
+    is built or, for streamed exports, once the body has been sent. Async views are not
+    profiled, nor are requests that start while Python (3.12+) refuses a
+    second active profiler. Must come after AuthenticationMiddleware.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'CLAIMS_PROFILING', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'CLAIMS_PROFILE_SAMPLE_RATE', 0.0)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self._attach(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        if getattr(request, '_claims_profile', None) is None:
+            return response
+        # process_view started the profiler on the request's sync thread; stop it there too
+        return await sync_to_async(self._attach)(request, response)
+
+    @staticmethod
+    def _requested(request) -> bool:
+        asked = request.GET.get('profile') == '1' or request.headers.get('X-Profile') == '1'
+        return asked and getattr(getattr(request.user, 'userprofile', None), 'is_admin', False)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if iscoroutinefunction(view_func):
+            return None
+        requested = self._requested(request)
+        if not (requested or (self.sample_rate and random.random() < self.sample_rate)):
+            return None
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Python 3.12+ allows one active profiler per process; another request holds it
+            logger.info('Skipped profiling %s: another profile is being captured', request.path)
+            return None
+        request._claims_profile = (new_profile_id(_view_name(request)), profiler, time.perf_counter(), requested)
+        return None
+
+    def _attach(self, request, response):
+        capture = getattr(request, '_claims_profile', None)
+        if capture is None:
+            return response
+        profile_id, profiler, started, requested = capture
+        response.headers['X-Profile-Id'] = profile_id
+        finish = partial(_finish_profile, request, response, profile_id, profiler, started, requested)
+        if not response.streaming:
+            finish()
+        elif response.is_async:
+            response.streaming_content = _AsyncProfiledBody(response.streaming_content, finish)
+        else:
+            response.streaming_content = _ProfiledBody(response.streaming_content, finish)
+        return response
@@ -0,0 +1,99 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:28
+
+from django.db import migrations, models
+
+
+def backfill_kpi_summary(apps, schema_editor):
+    from claims import kpis
+
+    kpis.rebuild(
+        models=(
+            apps.get_model("claims", "Claim"),
+            apps.get_model("claims", "Flag"),
+            apps.get_model("claims", "KpiSummary"),
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("claims", "0003_auto_20250822_1948"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="KpiSummary",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "scope",
+                    models.CharField(
+                        choices=[
+                            ("global", "Global"),
+                            ("insurer", "Insurer"),
+                            ("status", "Status"),
+                            ("assignee", "Assignee"),
+                        ],
+                        max_length=20,
+                        verbose_name="Scope",
+                    ),
+                ),
+                (
+                    "key",
+                    models.CharField(
+                        blank=True, default="", max_length=200, verbose_name="Key"
+                    ),
+                ),
+                (
+                    "claim_count",
+                    models.BigIntegerField(default=0, verbose_name="Claims"),
+                ),
+                ("flag_count", models.BigIntegerField(default=0, verbose_name="Flags")),
+                (
+                    "assigned_count",
+                    models.BigIntegerField(default=0, verbose_name="Assigned Claims"),
+                ),
+                (
+                    "billed_total",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=0,
+                        max_digits=18,
+                        verbose_name="Total Billed",
+                    ),
+                ),
+                (
+                    "paid_total",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=0,
+                        max_digits=18,
+                        verbose_name="Total Paid",
+                    ),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="Updated At"),
+                ),
+            ],
+            options={
+                "verbose_name": "KPI Summary",
+                "verbose_name_plural": "KPI Summaries",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("scope", "key"), name="unique_kpi_summary_scope_key"
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_kpi_summary, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:34
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("claims", "0004_kpisummary"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="claim",
+            index=models.Index(fields=["-created_at", "-id"], name="claim_created_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="claim",
+            index=models.Index(
+                fields=["assigned_to", "-created_at", "-id"],
+                name="claim_assignee_created_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="claim",
+            index=models.Index(
+                fields=["status", "insurer_name", "-created_at", "-id"],
+                name="claim_status_insurer_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="claim",
+            index=models.Index(
+                fields=["insurer_name", "-created_at", "-id"],
+                name="claim_insurer_created_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="flag",
+            index=models.Index(
+                fields=["claim", "user", "-created_at"],
+                name="flag_claim_user_created_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="note",
+            index=models.Index(
+                fields=["claim", "-created_at"], name="note_claim_created_idx"
+            ),
+        ),
+    ]
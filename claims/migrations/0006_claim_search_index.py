@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:39
+
+import claims.search
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def create_search_index(apps, schema_editor):
+    from claims import search
+
+    search.install(schema_editor.connection)
+
+
+def drop_search_index(apps, schema_editor):
+    from claims import search
+
+    search.uninstall(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("claims", "0005_claim_flag_note_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ClaimSearchEntry",
+            fields=[
+                (
+                    "claim",
+                    models.OneToOneField(
+                        db_column="rowid",
+                        db_constraint=False,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        primary_key=True,
+                        related_name="search_entry",
+                        serialize=False,
+                        to="claims.claim",
+                    ),
+                ),
+                ("document", claims.search.SearchDocumentField(editable=False)),
+            ],
+            options={
+                "db_table": "claims_claim_search",
+                "managed": False,
+            },
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_cpt_codes(apps, schema_editor):
+    from claims import cpt
+
+    cpt.rebuild(apps=apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("claims", "0006_claim_search_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ClaimCptCode",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("code", models.CharField(max_length=20, verbose_name="CPT Code")),
+                (
+                    "position",
+                    models.PositiveSmallIntegerField(
+                        default=0, verbose_name="Position"
+                    ),
+                ),
+                (
+                    "claim",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="cpt_codes",
+                        to="claims.claim",
+                        verbose_name="Claim",
+                    ),
+                ),
+                (
+                    "detail",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="codes",
+                        to="claims.claimdetail",
+                        verbose_name="Claim Detail",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "CPT Code",
+                "verbose_name_plural": "CPT Codes",
+                "ordering": ["position"],
+                "indexes": [
+                    models.Index(fields=["code", "claim"], name="cpt_code_claim_idx")
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_cpt_codes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:47
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("claims", "0007_claim_cpt_codes"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="claim",
+            index=models.Index(fields=["updated_at", "id"], name="claim_updated_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="claim",
+            index=models.Index(
+                fields=["assigned_to", "updated_at", "id"],
+                name="claim_assignee_updated_idx",
+            ),
+        ),
+    ]
@@ -2,6 +2,34 @@ from django.db import models
 from django.utils import timezone
 from django.contrib.auth.models import User
 
+from .search import SearchDocumentField, annotate_rank, filter_search
+
+
+class ClaimQuerySet(models.QuerySet):
+    """Shared scoping and filtering for claim listings"""
+
+    def accessible_to(self, user):
+        """Restrict to the claims a user may see (all for admins, assigned ones for reviewers)"""
+        user_profile = getattr(user, 'userprofile', None)
+        if user_profile and user_profile.can_see_all_claims:
+            return self
+        return self.filter(assigned_to=user)
+
+    def filter_list(self, search='', status='', insurer=''):
+        """Apply the claims list search box and dropdown filters"""
+        qs = self
+        if search:
+            qs = filter_search(qs, search)
+        if status:
+            qs = qs.filter(status=status)
+        if insurer:
+            qs = qs.filter(insurer_name=insurer)
+        return qs
+
+    def ranked(self, search):
+        """Annotate full-text relevance as ``search_rank`` (order with search.SEARCH_ORDERING)"""
+        return annotate_rank(self, search)
+
 
 class Claim(models.Model):
     """Insurance claim data model"""
@@ -24,10 +52,22 @@ class Claim(models.Model):
     created_at = models.DateTimeField(default=timezone.now, verbose_name="Created At")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Updated At")
     
+    objects = ClaimQuerySet.as_manager()
+    
     class Meta:
         verbose_name = "Claim"
         verbose_name_plural = "Claims"
         ordering = ['-created_at']
+        # Cover the claims list: keyset order, reviewer scope and the dropdown filters;
+        # plus the API's (updated_at, id) sync order, for everyone and per reviewer
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='claim_created_idx'),
+            models.Index(fields=['assigned_to', '-created_at', '-id'], name='claim_assignee_created_idx'),
+            models.Index(fields=['status', 'insurer_name', '-created_at', '-id'], name='claim_status_insurer_idx'),
+            models.Index(fields=['insurer_name', '-created_at', '-id'], name='claim_insurer_created_idx'),
+            models.Index(fields=['updated_at', 'id'], name='claim_updated_idx'),
+            models.Index(fields=['assigned_to', 'updated_at', 'id'], name='claim_assignee_updated_idx'),
+        ]
     
     def __str__(self):
         return f'Claim {self.claim_id} - {self.patient_name}'
@@ -38,6 +78,18 @@ class Claim(models.Model):
         return self.billed_amount - self.paid_amount
 
 
+class ClaimSearchEntry(models.Model):
+    """Row of the full-text search index, maintained by database triggers (see claims.search)"""
+    
+    # FTS5 tables key rows by rowid; the PostgreSQL table uses the same column name
+    claim = models.OneToOneField(Claim, on_delete=models.DO_NOTHING, primary_key=True, db_column='rowid', db_constraint=False, related_name='search_entry')
+    document = SearchDocumentField(editable=False)
+    
+    class Meta:
+        managed = False
+        db_table = 'claims_claim_search'
+
+
 class ClaimDetail(models.Model):
     """Additional claim information"""
     
@@ -54,6 +106,26 @@ class ClaimDetail(models.Model):
         return f'Detail {self.id} for Claim {self.claim.claim_id}'
 
 
+class ClaimCptCode(models.Model):
+    """One CPT code parsed from ClaimDetail.cpt_codes (maintained by claims.cpt)"""
+    
+    claim = models.ForeignKey(Claim, on_delete=models.CASCADE, related_name='cpt_codes', verbose_name="Claim")
+    detail = models.ForeignKey(ClaimDetail, on_delete=models.CASCADE, related_name='codes', verbose_name="Claim Detail")
+    code = models.CharField(max_length=20, verbose_name="CPT Code")
+    position = models.PositiveSmallIntegerField(default=0, verbose_name="Position")
+    
+    class Meta:
+        verbose_name = "CPT Code"
+        verbose_name_plural = "CPT Codes"
+        ordering = ['position']
+        indexes = [
+            models.Index(fields=['code', 'claim'], name='cpt_code_claim_idx'),
+        ]
+    
+    def __str__(self):
+        return self.code
+
+
 class Flag(models.Model):
     """Flag marking a claim for review"""
     
@@ -66,6 +138,9 @@ class Flag(models.Model):
         verbose_name = "Flag"
         verbose_name_plural = "Flags"
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['claim', 'user', '-created_at'], name='flag_claim_user_created_idx'),
+        ]
     
     def __str__(self):
         return f'Flag {self.id} for Claim {self.claim.claim_id}'
@@ -84,6 +159,9 @@ class Note(models.Model):
         verbose_name = "Note"
         verbose_name_plural = "Notes"
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['claim', '-created_at'], name='note_claim_created_idx'),
+        ]
     
     def __str__(self):
         return f'Note {self.id} for Claim {self.claim.claim_id}'
@@ -125,3 +203,34 @@ class UserProfile(models.Model):
     def can_assign_claims(self):
         """Check if user can assign claims to others"""
         return self.role in ['admin', 'supervisor']
+
+
+class KpiSummary(models.Model):
+    """Materialized claim and flag totals per scope, maintained by claims.kpis"""
+    
+    SCOPE_CHOICES = [
+        ('global', 'Global'),
+        ('insurer', 'Insurer'),
+        ('status', 'Status'),
+        ('assignee', 'Assignee'),
+    ]
+    
+    scope = models.CharField(max_length=20, choices=SCOPE_CHOICES, verbose_name="Scope")
+    # Insurer name, status, or assignee user id ('' for the global row and for unassigned claims)
+    key = models.CharField(max_length=200, blank=True, default='', verbose_name="Key")
+    claim_count = models.BigIntegerField(default=0, verbose_name="Claims")
+    flag_count = models.BigIntegerField(default=0, verbose_name="Flags")
+    assigned_count = models.BigIntegerField(default=0, verbose_name="Assigned Claims")
+    billed_total = models.DecimalField(max_digits=18, decimal_places=2, default=0, verbose_name="Total Billed")
+    paid_total = models.DecimalField(max_digits=18, decimal_places=2, default=0, verbose_name="Total Paid")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Updated At")
+    
+    class Meta:
+        verbose_name = "KPI Summary"
+        verbose_name_plural = "KPI Summaries"
+        constraints = [
+            models.UniqueConstraint(fields=['scope', 'key'], name='unique_kpi_summary_scope_key'),
+        ]
+    
+    def __str__(self):
+        return f'{self.get_scope_display()} {self.key}'.strip()
@@ -0,0 +1,162 @@
+"""Keyset (cursor) pagination helpers.
+
+Pages are addressed by an opaque cursor holding the ordering values of the
+boundary row instead of an OFFSET, so fetching page N costs the same as
+fetching page 1 regardless of table size.
+"""
+import base64
+import binascii
+import json
+import math
+from dataclasses import dataclass
+from typing import Optional
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+
+DEFAULT_PAGE_SIZE = 25
+MAX_PAGE_SIZE = 100
+# /api/claims/ pages (?limit=)
+API_DEFAULT_PAGE_SIZE = 1000
+API_MAX_PAGE_SIZE = 5000
+
+
+class InvalidCursor(ValueError):
+    """Raised when a cursor token cannot be decoded"""
+
+
+@dataclass
+class Page:
+    """One page of keyset-paginated results"""
+
+    items: list
+    next_cursor: Optional[str]
+    prev_cursor: Optional[str]
+    per_page: int
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.prev_cursor is not None
+
+
+def clamp_page_size(value, default: int = DEFAULT_PAGE_SIZE, maximum: int = MAX_PAGE_SIZE) -> int:
+    """Parse a user-supplied page size, falling back to the default and capping at the maximum"""
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return default
+    if size < 1:
+        return default
+    return min(size, maximum)
+
+
+class KeysetPaginator:
+    """Paginate a queryset over a stable, unique ordering.
+
+    ``ordering`` uses the usual ``'-field'`` notation and must end with a unique
+    column (normally ``id``) so that every row has a distinct position.
+    """
+
+    def __init__(self, queryset, ordering=('-created_at', '-id'), per_page: int = DEFAULT_PAGE_SIZE):
+        self.queryset = queryset
+        self.ordering = tuple(ordering)
+        self.per_page = per_page
+        self.fields = [name.lstrip('-') for name in self.ordering]
+        self.descending = [name.startswith('-') for name in self.ordering]
+
+    # Cursor encoding -----------------------------------------------------
+
+    def _row_value(self, row, field):
+        return row[field] if isinstance(row, dict) else getattr(row, field)
+
+    def _encode(self, row, direction: str) -> str:
+        values = []
+        for field in self.fields:
+            value = self._row_value(row, field)
+            values.append(value.isoformat() if hasattr(value, 'isoformat') else value)
+        payload = json.dumps([direction, values], separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+    def _decode(self, token: str):
+        try:
+            padded = token + '=' * (-len(token) % 4)
+            direction, values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        except (ValueError, TypeError, binascii.Error) as exc:
+            raise InvalidCursor('Malformed cursor') from exc
+        if direction not in ('n', 'p') or not isinstance(values, list) or len(values) != len(self.fields):
+            raise InvalidCursor('Malformed cursor')
+        model = self.queryset.model
+        decoded = []
+        for field, value in zip(self.fields, values):
+            try:
+                value = model._meta.get_field(field).to_python(value)
+            except FieldDoesNotExist:
+                # Annotated ordering values (e.g. search rank) are numbers, stored as-is
+                if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+                    raise InvalidCursor('Malformed cursor')
+            except (TypeError, ValueError, ValidationError) as exc:
+                raise InvalidCursor('Malformed cursor') from exc
+            # Ordering columns are never NULL, and NULL can't be compared in a filter
+            if value is None:
+                raise InvalidCursor('Malformed cursor')
+            decoded.append(value)
+        return direction, decoded
+
+    # Filtering -----------------------------------------------------------
+
+    def _after(self, values, forward: bool) -> Q:
+        """Build the row-value comparison ``(a, b, ...) > (x, y, ...)`` in ordering direction"""
+        condition = Q()
+        for i, field in enumerate(self.fields):
+            move_down = self.descending[i] == forward
+            step = Q(**{f'{field}__{"lt" if move_down else "gt"}': values[i]})
+            for prev_field, prev_value in zip(self.fields[:i], values[:i]):
+                step &= Q(**{prev_field: prev_value})
+            condition |= step
+        # Redundant bound on the leading column: databases can't seek an index on the
+        # OR-expansion alone, so without it deep pages scan from the top of the index.
+        move_down = self.descending[0] == forward
+        return Q(**{f'{self.fields[0]}__{"lte" if move_down else "gte"}': values[0]}) & condition
+
+    def _reversed_ordering(self):
+        return [name[1:] if name.startswith('-') else f'-{name}' for name in self.ordering]
+
+    def _window(self, values, forward: bool):
+        qs = self.queryset
+        if values is not None:
+            qs = qs.filter(self._after(values, forward))
+        qs = qs.order_by(*(self.ordering if forward else self._reversed_ordering()))
+        return qs[:self.per_page + 1]
+
+    def page_queryset(self, cursor: Optional[str] = None):
+        """The unevaluated queryset page() runs for ``cursor`` (e.g. to EXPLAIN it)"""
+        direction, values = self._decode(cursor) if cursor else ('n', None)
+        return self._window(values, direction == 'n')
+
+    def cursor_for(self, row, backward: bool = False) -> str:
+        """Cursor for the page after ``row`` (or before it when ``backward``)"""
+        return self._encode(row, 'p' if backward else 'n')
+
+    def page(self, cursor: Optional[str] = None) -> Page:
+        """Return the page following (or preceding) ``cursor``; the first page when no cursor is given"""
+        direction, values = self._decode(cursor) if cursor else ('n', None)
+        forward = direction == 'n'
+
+        rows = list(self._window(values, forward))
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if not forward:
+            rows.reverse()
+
+        if forward:
+            has_next, has_prev = has_more, values is not None
+        else:
+            has_next, has_prev = True, has_more
+
+        next_cursor = self._encode(rows[-1], 'n') if rows and has_next else None
+        prev_cursor = self._encode(rows[0], 'p') if rows and has_prev else None
+        return Page(items=rows, next_cursor=next_cursor, prev_cursor=prev_cursor, per_page=self.per_page)
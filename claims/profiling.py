@@ -0,0 +1,76 @@
+"""Capture cProfile data for individual requests and keep it on disk.
+
+ProfilingMiddleware (claims/middleware.py) starts a profiler for a request
+when an admin asks for one (``?profile=1`` or an ``X-Profile: 1`` header)
+or when it is picked by CLAIMS_PROFILE_SAMPLE_RATE. Each capture is a
+``.prof`` file (pstats format, viewable with snakeviz, tuna or
+``python -m pstats``) plus a ``.json`` file with the request's details,
+both named after the profile id. Only the newest CLAIMS_PROFILE_KEEP
+captures are kept. ``manage.py list_profiles`` lists and summarises them.
+"""
+import json
+import os
+import pstats
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+
+
+def profile_dir() -> Path:
+    return Path(getattr(settings, 'CLAIMS_PROFILE_DIR', Path(settings.BASE_DIR) / '.profiles'))
+
+
+def new_profile_id(view: str) -> str:
+    """Sortable by capture time, e.g. ``20260101T120000-claims.index-1a2b3c4d``"""
+    stamp = datetime.now().strftime('%Y%m%dT%H%M%S')
+    return f"{stamp}-{view.replace(':', '.')}-{uuid.uuid4().hex[:8]}"
+
+
+def save(profile_id: str, profiler, meta: dict) -> Path:
+    """Write ``profiler``'s stats and ``meta`` and prune old captures"""
+    directory = profile_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    stats = pstats.Stats(profiler)
+    meta = dict(meta, id=profile_id, calls=stats.total_calls, profiled_seconds=round(stats.total_tt, 6))
+    path = directory / f'{profile_id}.prof'
+    stats.dump_stats(path)
+    (directory / f'{profile_id}.json').write_text(json.dumps(meta))
+    prune(getattr(settings, 'CLAIMS_PROFILE_KEEP', 200))
+    return path
+
+
+def list_profiles(view: str = '') -> list:
+    """Metadata of the stored captures, newest first, optionally for one view"""
+    directory = profile_dir()
+    if not directory.is_dir():
+        return []
+    profiles = []
+    for meta_path in sorted(directory.glob('*.json'), reverse=True):
+        try:
+            meta = json.loads(meta_path.read_text())
+        except (OSError, ValueError):
+            continue
+        if view and meta.get('view') != view:
+            continue
+        meta['file'] = str(meta_path.with_suffix('.prof'))
+        profiles.append(meta)
+    return profiles
+
+
+def load_stats(profiles: list) -> pstats.Stats:
+    """One pstats.Stats combining the given captures"""
+    paths = [profile['file'] for profile in profiles if os.path.exists(profile['file'])]
+    if not paths:
+        raise ValueError('No profile data found')
+    return pstats.Stats(*paths)
+
+
+def prune(keep: int) -> int:
+    """Delete all but the newest ``keep`` captures; returns how many were removed"""
+    captures = sorted(profile_dir().glob('*.prof'), reverse=True)
+    for path in captures[keep:]:
+        path.unlink(missing_ok=True)
+        path.with_suffix('.json').unlink(missing_ok=True)
+    return max(0, len(captures) - keep)
@@ -0,0 +1,338 @@
+"""Full-text claim search.
+
+The search index (``claims_claim_search``, installed by migration 0006) covers
+claim id, patient, insurer, CPT codes and denial reasons: an FTS5 table on
+SQLite, a weighted tsvector table with a GIN index on PostgreSQL. Database
+triggers keep it current on every write; bulk loads drop them with
+suspended() and rebuild the index in one pass instead, into a shadow table
+that is swapped in atomically, so searches keep working throughout. ``ClaimSearchEntry``
+maps the table so the ORM can join it; queries match each word as a prefix
+and rank by relevance (lower ``search_rank`` is better on both backends).
+Without an index (other backends, SQLite built without FTS5) search falls
+back to ``icontains``.
+"""
+import re
+from contextlib import contextmanager
+
+from django.db import OperationalError, connections, transaction
+from django.db.models import Expression, F, FloatField, Lookup, Q, TextField, Value
+
+TABLE = 'claims_claim_search'
+
+# Keyset ordering for ranked search results
+SEARCH_ORDERING = ('search_rank', '-id')
+
+# SQLite: FTS5 table keyed by claim rowid; triggers rebuild a claim's row when it or its details change
+SQLITE_DOCUMENT = """
+    INSERT INTO claims_claim_search (rowid, claim_id, patient_name, insurer_name, denial_reasons, cpt_codes)
+    SELECT c.id, c.claim_id, c.patient_name, c.insurer_name,
+           (SELECT group_concat(d.denial_reason, ' ') FROM claims_claimdetail d WHERE d.claim_id = c.id),
+           (SELECT group_concat(d.cpt_codes, ' ') FROM claims_claimdetail d WHERE d.claim_id = c.id)
+    FROM claims_claim c WHERE {where};
+"""
+
+SQLITE_CREATE = [
+    """
+    CREATE VIRTUAL TABLE claims_claim_search USING fts5(
+        claim_id, patient_name, insurer_name, denial_reasons, cpt_codes,
+        tokenize = 'unicode61 remove_diacritics 2', prefix = '1 2 3'
+    );
+    """,
+    # Weight claim id and patient name above insurer, then denial reasons / CPT codes
+    "INSERT INTO claims_claim_search (claims_claim_search, rank) VALUES ('rank', 'bm25(10.0, 5.0, 2.0, 1.0, 1.0)');",
+    SQLITE_DOCUMENT.format(where='1'),
+]
+
+SQLITE_TRIGGERS = [
+    'CREATE TRIGGER claims_claim_search_ai AFTER INSERT ON claims_claim BEGIN'
+    + SQLITE_DOCUMENT.format(where='c.id = NEW.id') + 'END;',
+    'CREATE TRIGGER claims_claim_search_au AFTER UPDATE OF claim_id, patient_name, insurer_name ON claims_claim BEGIN'
+    ' DELETE FROM claims_claim_search WHERE rowid = OLD.id;'
+    + SQLITE_DOCUMENT.format(where='c.id = NEW.id') + 'END;',
+    'CREATE TRIGGER claims_claim_search_ad AFTER DELETE ON claims_claim BEGIN'
+    ' DELETE FROM claims_claim_search WHERE rowid = OLD.id; END;',
+    'CREATE TRIGGER claims_claimdetail_search_ai AFTER INSERT ON claims_claimdetail BEGIN'
+    ' DELETE FROM claims_claim_search WHERE rowid = NEW.claim_id;'
+    + SQLITE_DOCUMENT.format(where='c.id = NEW.claim_id') + 'END;',
+    'CREATE TRIGGER claims_claimdetail_search_au AFTER UPDATE ON claims_claimdetail BEGIN'
+    ' DELETE FROM claims_claim_search WHERE rowid IN (OLD.claim_id, NEW.claim_id);'
+    + SQLITE_DOCUMENT.format(where='c.id IN (OLD.claim_id, NEW.claim_id)') + 'END;',
+    'CREATE TRIGGER claims_claimdetail_search_ad AFTER DELETE ON claims_claimdetail BEGIN'
+    ' DELETE FROM claims_claim_search WHERE rowid = OLD.claim_id;'
+    + SQLITE_DOCUMENT.format(where='c.id = OLD.claim_id') + 'END;',
+]
+
+SQLITE_DROP_TRIGGERS = [
+    'DROP TRIGGER IF EXISTS claims_claim_search_ai;',
+    'DROP TRIGGER IF EXISTS claims_claim_search_au;',
+    'DROP TRIGGER IF EXISTS claims_claim_search_ad;',
+    'DROP TRIGGER IF EXISTS claims_claimdetail_search_ai;',
+    'DROP TRIGGER IF EXISTS claims_claimdetail_search_au;',
+    'DROP TRIGGER IF EXISTS claims_claimdetail_search_ad;',
+]
+
+SQLITE_DROP = SQLITE_DROP_TRIGGERS + ['DROP TABLE IF EXISTS claims_claim_search;']
+
+SQLITE_RENAME = ['ALTER TABLE claims_claim_search_new RENAME TO claims_claim_search;']
+
+# PostgreSQL: weighted tsvector per claim with a GIN index, maintained the same way
+POSTGRES_DOCUMENT = """
+    INSERT INTO claims_claim_search (rowid, document)
+    SELECT c.id,
+           setweight(to_tsvector('simple', coalesce(c.claim_id, '') || ' ' || coalesce(c.patient_name, '')), 'A')
+           || setweight(to_tsvector('simple', coalesce(c.insurer_name, '')), 'B')
+           || setweight(to_tsvector('simple', coalesce(string_agg(d.denial_reason, ' '), '')
+                                              || ' ' || coalesce(string_agg(d.cpt_codes, ' '), '')), 'C')
+    FROM claims_claim c
+    LEFT JOIN claims_claimdetail d ON d.claim_id = c.id
+    WHERE {where}
+    GROUP BY c.id;
+"""
+
+POSTGRES_CREATE = [
+    'CREATE TABLE claims_claim_search (rowid integer PRIMARY KEY, document tsvector NOT NULL);',
+    POSTGRES_DOCUMENT.format(where='true'),
+    'CREATE INDEX claims_claim_search_document_idx ON claims_claim_search USING gin (document);',
+]
+
+POSTGRES_TRIGGERS = [
+    """
+    CREATE FUNCTION claims_claim_search_refresh(target integer) RETURNS void AS $$
+        DELETE FROM claims_claim_search WHERE rowid = target;
+    """ + POSTGRES_DOCUMENT.format(where='c.id = target') + """
+    $$ LANGUAGE sql;
+    """,
+    """
+    CREATE FUNCTION claims_claim_search_trigger() RETURNS trigger AS $$
+    BEGIN
+        IF TG_TABLE_NAME = 'claims_claim' THEN
+            IF TG_OP = 'DELETE' THEN
+                DELETE FROM claims_claim_search WHERE rowid = OLD.id;
+            ELSE
+                PERFORM claims_claim_search_refresh(NEW.id);
+            END IF;
+        ELSE
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                PERFORM claims_claim_search_refresh(OLD.claim_id);
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                PERFORM claims_claim_search_refresh(NEW.claim_id);
+            END IF;
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+    """,
+    """
+    CREATE TRIGGER claims_claim_search_claim
+    AFTER INSERT OR UPDATE OF claim_id, patient_name, insurer_name OR DELETE ON claims_claim
+    FOR EACH ROW EXECUTE FUNCTION claims_claim_search_trigger();
+    """,
+    """
+    CREATE TRIGGER claims_claim_search_detail
+    AFTER INSERT OR UPDATE OR DELETE ON claims_claimdetail
+    FOR EACH ROW EXECUTE FUNCTION claims_claim_search_trigger();
+    """,
+]
+
+POSTGRES_DROP_TRIGGERS = [
+    'DROP TRIGGER IF EXISTS claims_claim_search_detail ON claims_claimdetail;',
+    'DROP TRIGGER IF EXISTS claims_claim_search_claim ON claims_claim;',
+    'DROP FUNCTION IF EXISTS claims_claim_search_trigger();',
+    'DROP FUNCTION IF EXISTS claims_claim_search_refresh(integer);',
+]
+
+POSTGRES_DROP = POSTGRES_DROP_TRIGGERS + ['DROP TABLE IF EXISTS claims_claim_search;']
+
+# Hold off claim/detail writes while a rebuild reads them (searches still run); SQLite's
+# write lock, taken by the rebuild's first write, already does this
+POSTGRES_LOCK = ['LOCK TABLE claims_claim, claims_claimdetail IN SHARE MODE;']
+
+POSTGRES_RENAME = [
+    'ALTER TABLE claims_claim_search_new RENAME TO claims_claim_search;',
+    'ALTER INDEX claims_claim_search_new_document_idx RENAME TO claims_claim_search_document_idx;',
+]
+
+# Rebuilds fill this table from scratch while the live index keeps serving searches
+SHADOW_TABLE = TABLE + '_new'
+
+_TOKEN = re.compile(r'\w+', re.UNICODE)
+_available = {}
+
+
+def tokens(text: str) -> list:
+    return _TOKEN.findall((text or '').lower())
+
+
+def match_expression(text: str, vendor: str) -> str:
+    """Prefix-match every word: ``"smi"* "jo"*`` (FTS5) or ``smi:* & jo:*`` (tsquery)"""
+    words = tokens(text)
+    if vendor == 'postgresql':
+        return ' & '.join(f'{word}:*' for word in words)
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def _execute(connection, statements) -> None:
+    with connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+
+def _schema(connection):
+    """(create statements, trigger statements, drop statements) for this backend, or None"""
+    if connection.vendor == 'sqlite':
+        return SQLITE_CREATE, SQLITE_TRIGGERS, SQLITE_DROP
+    if connection.vendor == 'postgresql':
+        return POSTGRES_CREATE, POSTGRES_TRIGGERS, POSTGRES_DROP
+    return None
+
+
+def _swap_statements(connection):
+    """(lock the source tables, drop triggers, rename the shadow table over the live one) for this backend"""
+    if connection.vendor == 'sqlite':
+        return [], SQLITE_DROP_TRIGGERS, SQLITE_RENAME
+    return POSTGRES_LOCK, POSTGRES_DROP_TRIGGERS, POSTGRES_RENAME
+
+
+def install(connection) -> bool:
+    """Create and fill the search index plus its triggers; False when the backend can't host it"""
+    schema = _schema(connection)
+    _available.pop(connection.alias, None)
+    if schema is None:
+        return False
+    create, triggers, _ = schema
+    try:
+        with transaction.atomic(using=connection.alias):
+            _execute(connection, create + triggers)
+    except OperationalError:
+        # SQLite built without FTS5: search keeps using icontains
+        return False
+    return True
+
+
+def uninstall(connection) -> None:
+    schema = _schema(connection)
+    _available.pop(connection.alias, None)
+    if schema is not None:
+        _execute(connection, schema[2])
+
+
+def rebuild(using: str = 'default') -> bool:
+    """Recreate the index from the claim and detail tables without taking it offline.
+
+    The new index is filled in a shadow table while searches keep using the
+    live one, then the old table is dropped, the shadow renamed over it and
+    the triggers recreated. It all happens in one transaction that keeps
+    claim and detail writes waiting, so none can land in the old index
+    between the fill and the swap, and no query ever finds the table missing.
+    """
+    connection = connections[using]
+    schema = _schema(connection)
+    if schema is None:
+        return False
+    if not index_available(using):
+        return install(connection)
+    create, triggers, _ = schema
+    lock, drop_triggers, rename = _swap_statements(connection)
+    try:
+        with transaction.atomic(using=using):
+            _execute(connection, lock + [f'DROP TABLE IF EXISTS {SHADOW_TABLE};']
+                     + [statement.replace(TABLE, SHADOW_TABLE) for statement in create]
+                     + drop_triggers + [f'DROP TABLE {TABLE};'] + rename + triggers)
+    except OperationalError:
+        return False
+    return True
+
+
+@contextmanager
+def suspended(using: str = 'default'):
+    """Drop the per-row triggers for a bulk load and rebuild the index in one pass afterwards.
+
+    The index stays searchable throughout: it serves its pre-load contents
+    until rebuild() swaps the fresh one in.
+    """
+    if not index_available(using):
+        yield
+        return
+    _, drop_triggers, _ = _swap_statements(connections[using])
+    _execute(connections[using], drop_triggers)
+    try:
+        yield
+    finally:
+        rebuild(using)
+
+
+def index_available(using: str = 'default') -> bool:
+    """Whether the search index table exists on this database"""
+    if using not in _available:
+        connection = connections[using]
+        present = False
+        if connection.vendor in ('sqlite', 'postgresql'):
+            with connection.cursor() as cursor:
+                present = TABLE in connection.introspection.table_names(cursor)
+        _available[using] = present
+    return _available[using]
+
+
+class SearchDocumentField(TextField):
+    """The indexed document column; only usable through the ``match`` lookup and SearchRank"""
+
+
+@SearchDocumentField.register_lookup
+class Match(Lookup):
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        # FTS5 matches against the hidden column named after the table (its alias here)
+        _, params = self.process_rhs(compiler, connection)
+        return f'{connection.ops.quote_name(self.lhs.alias)} MATCH %s', params
+
+    def as_postgresql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f"{lhs} @@ to_tsquery('simple', {rhs})", (*lhs_params, *rhs_params)
+
+
+class SearchRank(Expression):
+    """Relevance of the matched index row; lower is better"""
+
+    output_field = FloatField()
+
+    def __init__(self, document, query):
+        super().__init__()
+        self.document = document
+        self.query = query
+
+    def get_source_expressions(self):
+        return [self.document]
+
+    def set_source_expressions(self, exprs):
+        (self.document,) = exprs
+
+    def as_sql(self, compiler, connection):
+        # FTS5's rank column is bm25() with the weights configured in migration 0006
+        return f'{connection.ops.quote_name(self.document.alias)}.rank', []
+
+    def as_postgresql(self, compiler, connection):
+        document, params = compiler.compile(self.document)
+        return f"-ts_rank({document}, to_tsquery('simple', %s))", (*params, self.query)
+
+
+def _icontains(text: str) -> Q:
+    return Q(patient_name__icontains=text) | Q(claim_id__icontains=text) | Q(insurer_name__icontains=text)
+
+
+def filter_search(queryset, text: str):
+    """Restrict a claim queryset to rows matching ``text``"""
+    if not tokens(text) or not index_available(queryset.db):
+        return queryset.filter(_icontains(text))
+    query = match_expression(text, connections[queryset.db].vendor)
+    return queryset.filter(search_entry__document__match=query)
+
+
+def annotate_rank(queryset, text: str):
+    """Add ``search_rank`` for ordering with SEARCH_ORDERING (expects filter_search() applied)"""
+    if not tokens(text) or not index_available(queryset.db):
+        return queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
+    query = match_expression(text, connections[queryset.db].vendor)
+    return queryset.annotate(search_rank=SearchRank(F('search_entry__document'), query))
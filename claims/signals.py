@@ -0,0 +1,99 @@
+"""Model signal handlers that keep derived data in sync with claim writes."""
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import cache, cpt, kpis
+from .models import Claim, ClaimDetail, Flag, Note
+
+KPI_FIELDS = ('insurer_name', 'status', 'assigned_to_id', 'billed_amount', 'paid_amount')
+
+
+@receiver(pre_save, sender=Claim)
+def remember_claim_kpi_state(sender, instance, **kwargs):
+    """Capture the stored values so post_save can move the claim between summary rows"""
+    if kpis.is_suspended() or instance.pk is None:
+        instance._kpi_previous = None
+        return
+    instance._kpi_previous = Claim.objects.filter(pk=instance.pk).values(*KPI_FIELDS).first()
+
+
+@receiver(post_save, sender=Claim)
+def update_claim_kpis(sender, instance, created, **kwargs):
+    if kpis.is_suspended():
+        return
+    previous = getattr(instance, '_kpi_previous', None)
+    new_keys = kpis.scope_keys(instance.insurer_name, instance.status, instance.assigned_to_id)
+    deltas = {}
+    if previous is None:
+        kpis.add_delta(deltas, new_keys, kpis.claim_vector(instance.billed_amount, instance.paid_amount, instance.assigned_to_id))
+    else:
+        old_keys = kpis.scope_keys(previous['insurer_name'], previous['status'], previous['assigned_to_id'])
+        # Flags follow the claim only when it changes rows; otherwise they cancel out
+        flags = instance.flags.count() if old_keys != new_keys else 0
+        kpis.add_delta(deltas, old_keys, kpis.claim_vector(previous['billed_amount'], previous['paid_amount'], previous['assigned_to_id'], flags), sign=-1)
+        kpis.add_delta(deltas, new_keys, kpis.claim_vector(instance.billed_amount, instance.paid_amount, instance.assigned_to_id, flags))
+    kpis.apply_deltas(deltas)
+    instance._kpi_previous = None
+
+
+@receiver(post_delete, sender=Claim)
+def remove_claim_kpis(sender, instance, **kwargs):
+    if kpis.is_suspended():
+        return
+    # Cascaded flags are deleted (and decremented) before their claim
+    deltas = {}
+    keys = kpis.scope_keys(instance.insurer_name, instance.status, instance.assigned_to_id)
+    kpis.add_delta(deltas, keys, kpis.claim_vector(instance.billed_amount, instance.paid_amount, instance.assigned_to_id), sign=-1)
+    kpis.apply_deltas(deltas)
+
+
+def _flag_keys(flag):
+    claim = Claim.objects.filter(pk=flag.claim_id).values('insurer_name', 'status', 'assigned_to_id').first()
+    if claim is None:
+        return [('global', '')]
+    return kpis.scope_keys(claim['insurer_name'], claim['status'], claim['assigned_to_id'])
+
+
+@receiver(post_save, sender=Flag)
+def add_flag_kpis(sender, instance, created, **kwargs):
+    if created and not kpis.is_suspended():
+        deltas = {}
+        kpis.add_delta(deltas, _flag_keys(instance), {'flag_count': 1})
+        kpis.apply_deltas(deltas)
+
+
+@receiver(post_delete, sender=Flag)
+def remove_flag_kpis(sender, instance, **kwargs):
+    if not kpis.is_suspended():
+        deltas = {}
+        kpis.add_delta(deltas, _flag_keys(instance), {'flag_count': 1}, sign=-1)
+        kpis.apply_deltas(deltas)
+
+
+@receiver(post_save, sender=ClaimDetail)
+def sync_claim_cpt_codes(sender, instance, update_fields=None, **kwargs):
+    # Deletes cascade to the code rows; bulk imports write them per batch
+    if update_fields is None or 'cpt_codes' in update_fields:
+        cpt.replace([instance])
+
+
+@receiver(post_save, sender=Claim)
+@receiver(post_delete, sender=Claim)
+@receiver(post_save, sender=Flag)
+@receiver(post_delete, sender=Flag)
+@receiver(post_save, sender=ClaimDetail)
+@receiver(post_delete, sender=ClaimDetail)
+def invalidate_claim_listing_cache(sender, instance, **kwargs):
+    # Bulk paths suspend KPI updates and invalidate the cache once when done.
+    # Details feed search results and the CPT/denial analytics, so they count too.
+    if kpis.is_suspended():
+        return
+    cache.invalidate()
+    cache.invalidate_claim(instance.pk if sender is Claim else instance.claim_id)
+
+
+@receiver(post_save, sender=Note)
+@receiver(post_delete, sender=Note)
+def invalidate_claim_fragment_cache(sender, instance, **kwargs):
+    if not kpis.is_suspended():
+        cache.invalidate_claim(instance.claim_id)
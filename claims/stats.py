@@ -0,0 +1,83 @@
+"""KPI figures for the claims list, admin dashboard and stats API.
+
+Figures come from the materialized KpiSummary rows (claims.kpis) when one
+covers the request. Otherwise they are computed with a single aggregate()
+statement over the caller's claim scope.
+"""
+from django.db.models import Count, F, Func, Max, Q, Subquery, Sum
+
+from . import kpis
+from .models import Claim, Flag
+
+
+def aggregate_kpis(claims, flags=None) -> dict:
+    """Count, assignment split, billed/paid totals and flag count in one SQL statement.
+
+    ``flags`` is the Flag queryset to count (defaults to flags on ``claims``).
+    """
+    if flags is None:
+        flags = Flag.objects.filter(claim__in=claims.order_by().values('pk'))
+    flag_count = flags.order_by().values(n=Func(F('id'), function='COUNT'))
+    totals = claims.order_by().aggregate(
+        claim_count=Count('id'),
+        assigned_count=Count('id', filter=Q(assigned_to__isnull=False)),
+        billed_total=Sum('billed_amount'),
+        paid_total=Sum('paid_amount'),
+        # Uncorrelated scalar subquery; Max() only satisfies aggregate()'s signature
+        flag_count=Max(Subquery(flag_count)),
+    )
+    return {name: totals[name] or 0 for name in kpis.COUNTERS}
+
+
+def _summary_or_aggregate(scope: str, key: str, claims, flags=None) -> dict:
+    return kpis.get_summary(scope, key) or aggregate_kpis(claims, flags)
+
+
+def _format(totals: dict, **extra) -> dict:
+    stats = {
+        'total_claims': totals['claim_count'],
+        'flagged_claims': totals['flag_count'],
+        'total_billed': totals['billed_total'],
+        'total_paid': totals['paid_total'],
+        'average_underpayment': totals['billed_total'] - totals['paid_total'],
+    }
+    stats.update(extra)
+    return stats
+
+
+def dashboard_stats() -> dict:
+    """Global KPIs for admin views, including the assigned/unassigned split"""
+    totals = _summary_or_aggregate('global', '', Claim.objects.all(), Flag.objects.all())
+    return _format(
+        totals,
+        assigned_claims=totals['assigned_count'],
+        unassigned_claims=totals['claim_count'] - totals['assigned_count'],
+    )
+
+
+def list_stats(user, claims, search: str = '', status: str = '', insurer: str = '') -> dict:
+    """KPIs for the claims list.
+
+    ``claims`` is the user's accessible queryset with the list filters applied.
+    Admins see global billed/paid/flag totals with a filtered claim count;
+    reviewers see totals for their (filtered) assigned claims and the flag
+    count across all of them.
+    """
+    user_profile = getattr(user, 'userprofile', None)
+    if user_profile and user_profile.can_see_all_claims:
+        scope = _summary_or_aggregate('global', '', Claim.objects.all(), Flag.objects.all())
+        if search or (status and insurer):
+            claim_count = claims.count()
+        elif status:
+            claim_count = (kpis.get_summary('status', status) or {'claim_count': claims.count()})['claim_count']
+        elif insurer:
+            claim_count = (kpis.get_summary('insurer', insurer) or {'claim_count': claims.count()})['claim_count']
+        else:
+            claim_count = scope['claim_count']
+        return _format({**scope, 'claim_count': claim_count})
+
+    assigned = Claim.objects.filter(assigned_to=user)
+    assigned_flags = Flag.objects.filter(claim__assigned_to=user)
+    if search or status or insurer:
+        return _format(aggregate_kpis(claims, assigned_flags))
+    return _format(_summary_or_aggregate('assignee', str(user.pk), assigned, assigned_flags))
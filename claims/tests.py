@@ -0,0 +1,505 @@
+import asyncio
+import base64
+import io
+import json
+import sqlite3
+import tempfile
+from datetime import date
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from asgiref.sync import sync_to_async
+
+from . import events, kpis, search
+from .asgi import EventStreamApp
+from .models import Claim, ClaimCptCode, ClaimDetail, Flag, Note, UserProfile
+from .stats import dashboard_stats
+
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(CACHES=LOCMEM_CACHE, CLAIMS_PROFILING=False)
+class QueryCountTestCase(TestCase):
+    """Views must run a fixed number of queries however many rows they show"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin', password='x')
+        UserProfile.objects.create(user=cls.admin, role='admin')
+        cls.reviewer = User.objects.create_user('reviewer', password='x')
+        UserProfile.objects.create(user=cls.reviewer, role='reviewer')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def add_claims(self, count: int, start: int = 0) -> list:
+        claims = [
+            Claim.objects.create(
+                claim_id=f'C{number:05d}', patient_name=f'Patient {number}',
+                billed_amount=Decimal('100.00'), paid_amount=Decimal('40.00'),
+                status='Pending', insurer_name=f'Insurer {number % 3}', discharge_date=date(2024, 1, 1),
+                assigned_to=self.reviewer if number % 2 else None,
+            )
+            for number in range(start, start + count)
+        ]
+        kpis.rebuild()
+        return claims
+
+    def add_flags(self, claims: list) -> None:
+        for claim in claims:
+            Flag.objects.create(claim=claim, user=self.admin, reason='Underpaid')
+        kpis.rebuild()
+
+    def count_queries(self, url: str, **headers) -> int:
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, headers=headers)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+
+class StatsQueryTests(QueryCountTestCase):
+    """KPI blocks come from KpiSummary rows, not per-claim or per-flag queries"""
+
+    def test_index(self):
+        claims = self.add_claims(2)
+        # Session, user, profile, page rows, global KPI row, status and insurer options
+        with self.assertNumQueries(7):
+            self.client.get(reverse('claims:index'))
+        few = self.count_queries(reverse('claims:index'))
+        self.add_flags(self.add_claims(20, start=2) + claims)
+        self.assertEqual(self.count_queries(reverse('claims:index')), few)
+
+    def test_index_cached_stats(self):
+        self.add_claims(2)
+        self.client.get(reverse('claims:index'))
+        # Cached KPI block and filter options leave session, user, profile and page rows
+        with self.assertNumQueries(4):
+            self.client.get(reverse('claims:index'))
+
+    def test_dashboard_stats(self):
+        self.add_flags(self.add_claims(20))
+        # The global KpiSummary row
+        with self.assertNumQueries(1):
+            stats = dashboard_stats()
+        self.assertEqual((stats['total_claims'], stats['flagged_claims'], stats['assigned_claims']), (20, 20, 10))
+
+    def test_admin_dashboard(self):
+        claims = self.add_claims(2)
+        # Session, user, profile, global KPI row, status and insurer options, recent flags
+        with self.assertNumQueries(7):
+            self.client.get(reverse('claims:admin_dashboard'))
+        few = self.count_queries(reverse('claims:admin_dashboard'))
+        self.add_flags(self.add_claims(20, start=2) + claims)
+        self.assertEqual(self.count_queries(reverse('claims:admin_dashboard')), few)
+
+    def test_api_admin_stats(self):
+        claims = self.add_claims(2)
+        # Session, user, profile, global KPI row, recent flags with their claims
+        with self.assertNumQueries(5):
+            self.client.get(reverse('claims:api_admin_stats'))
+        few = self.count_queries(reverse('claims:api_admin_stats'))
+        self.add_flags(self.add_claims(20, start=2) + claims)
+        self.assertEqual(self.count_queries(reverse('claims:api_admin_stats')), few)
+
+    def test_reviewer_index(self):
+        self.client.force_login(self.reviewer)
+        claims = self.add_claims(2)
+        few = self.count_queries(reverse('claims:index'))
+        self.add_flags(self.add_claims(20, start=2) + claims)
+        self.assertEqual(self.count_queries(reverse('claims:index')), few)
+
+
+class ClaimDetailQueryTests(QueryCountTestCase):
+    """Details, CPT codes, notes and flags are prefetched, not read per row"""
+
+    def setUp(self):
+        super().setUp()
+        self.claim = self.add_claims(1, start=1)[0]
+        ClaimDetail.objects.create(claim=self.claim, cpt_codes='99213, 85025', denial_reason='Not covered')
+
+    def add_notes_and_flags(self, count: int) -> None:
+        for number in range(count):
+            user = self.admin if number % 2 else self.reviewer
+            Note.objects.create(claim=self.claim, user=user, content=f'Note {number}')
+            Flag.objects.create(claim=self.claim, user=user, reason=f'Reason {number}')
+
+    def test_claim_detail(self):
+        url = reverse('claims:claim_detail', args=[self.claim.claim_id])
+        # Session, user, profile, claim with assignee, details, CPT codes, notes, flags
+        with self.assertNumQueries(8):
+            self.client.get(url)
+        empty = self.count_queries(url)
+        self.add_notes_and_flags(10)
+        self.assertEqual(self.count_queries(url), empty)
+
+    def test_claim_detail_htmx(self):
+        url = reverse('claims:claim_detail', args=[self.claim.claim_id])
+        empty = self.count_queries(url, HX_Request='true')
+        self.add_notes_and_flags(10)
+        self.assertEqual(self.count_queries(url, HX_Request='true'), empty)
+
+    def test_claim_details_partial(self):
+        url = reverse('claims:claim_details_partial', args=[self.claim.claim_id])
+        with self.assertNumQueries(8):
+            self.client.get(url)
+        empty = self.count_queries(url)
+        self.add_notes_and_flags(10)
+        self.assertEqual(self.count_queries(url), empty)
+
+    def test_reviewer_claim_details_partial(self):
+        self.client.force_login(self.reviewer)
+        url = reverse('claims:claim_details_partial', args=[self.claim.claim_id])
+        empty = self.count_queries(url)
+        self.add_notes_and_flags(10)
+        self.assertEqual(self.count_queries(url), empty)
+
+
+@override_settings(CACHES=LOCMEM_CACHE, CLAIMS_PROFILING=True, CLAIMS_PROFILE_SAMPLE_RATE=0.0)
+class ProfilingTests(TestCase):
+    def setUp(self):
+        admin = User.objects.create_user('admin', password='x')
+        UserProfile.objects.create(user=admin, role='admin')
+        self.client.force_login(admin)
+
+    def test_busy_profiler_skips_capture(self):
+        # Python 3.12+ raises ValueError when another profiler is already active
+        with mock.patch('cProfile.Profile.enable', side_effect=ValueError), \
+                mock.patch('claims.middleware.save') as save:
+            response = self.client.get(reverse('claims:api_admin_stats'), {'profile': '1'})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Profile-Id', response.headers)
+        save.assert_not_called()
+
+    def test_profile_saved_with_response(self):
+        with mock.patch('claims.middleware.save') as save:
+            response = self.client.get(reverse('claims:api_admin_stats'), {'profile': '1'})
+        save.assert_called_once()
+        self.assertEqual(save.call_args.args[0], response['X-Profile-Id'])
+
+    def test_streamed_profile_saved_after_body(self):
+        with mock.patch('claims.middleware.save') as save:
+            response = self.client.get(reverse('claims:export_claims_csv'), {'profile': '1'})
+            self.assertTrue(response.streaming)
+            save.assert_not_called()
+            b''.join(response.streaming_content)
+            save.assert_called_once()
+            response.close()
+        save.assert_called_once()
+        self.assertTrue(save.call_args.args[2]['streaming'])
+
+    def test_unread_streamed_profile_saved_on_close(self):
+        with mock.patch('claims.middleware.save') as save:
+            response = self.client.get(reverse('claims:export_claims_csv'), {'profile': '1'})
+            response.close()
+        save.assert_called_once()
+
+
+class ClaimsApiConditionalTests(QueryCountTestCase):
+    def test_etag_revalidation(self):
+        claims = self.add_claims(3)
+        url = reverse('claims:api_claims')
+        response = self.client.get(url)
+        self.assertNotIn('Last-Modified', response.headers)
+        self.assertEqual(self.client.get(url, headers={'If-None-Match': response['ETag']}).status_code, 304)
+
+        # A deletion doesn't move any updated_at, but it changes the body and so the ETag
+        claims[1].delete()
+        response = self.client.get(url, headers={'If-None-Match': response['ETag'], 'If-Modified-Since': 'Fri, 01 Jan 2100 00:00:00 GMT'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 2)
+
+
+class CursorTests(QueryCountTestCase):
+    """Crafted cursors are a 400, never a 500"""
+
+    BAD_CURSORS = (
+        ['n', [[], 1]],
+        ['n', [{'a': 1}, 1]],
+        ['n', [None, 1]],
+        ['n', ['2024-01-01T00:00:00', 'x']],
+        ['n', ['2024-01-01T00:00:00', [1]]],
+        ['n', ['not a date', 1]],
+        ['x', ['2024-01-01T00:00:00', 1]],
+        ['n', ['2024-01-01T00:00:00']],
+        'n',
+    )
+
+    def cursor(self, payload) -> str:
+        return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip('=')
+
+    def test_malformed_cursors(self):
+        self.add_claims(3)
+        for url in (reverse('claims:index'), reverse('claims:api_claims')):
+            for payload in self.BAD_CURSORS:
+                response = self.client.get(url, {'cursor': self.cursor(payload)})
+                self.assertEqual(response.status_code, 400, (url, payload))
+            self.assertEqual(self.client.get(url, {'cursor': '%%%'}).status_code, 400)
+
+    def test_malformed_search_cursors(self):
+        self.add_claims(3)
+        for rank in ('1', [1], {'r': 1}, None, True, float('nan')):
+            response = self.client.get(reverse('claims:index'), {'search': 'Patient', 'cursor': self.cursor(['n', [rank, 1]])})
+            self.assertEqual(response.status_code, 400, rank)
+
+    def test_cursor_round_trip(self):
+        self.add_claims(5)
+        response = self.client.get(reverse('claims:api_claims'), {'limit': 2})
+        seen = [record['id'] for record in response.json()]
+        while response.get('X-Next-Cursor'):
+            response = self.client.get(reverse('claims:api_claims'), {'limit': 2, 'cursor': response['X-Next-Cursor']})
+            seen += [record['id'] for record in response.json()]
+        self.assertEqual(sorted(seen), [f'C{number:05d}' for number in range(5)])
+
+
+class SearchRebuildTests(QueryCountTestCase):
+    def test_write_right_after_rebuild_is_indexed(self):
+        if not search.index_available():
+            self.skipTest('SQLite built without FTS5')
+        self.add_claims(2)
+        execute = search._execute
+        added = []
+
+        def execute_then_write(connection, statements):
+            # A claim saved by another request straight after the rebuild's first statements commit
+            execute(connection, statements)
+            if not added:
+                added.append(self.add_claims(1, start=7))
+
+        with mock.patch.object(search, '_execute', execute_then_write):
+            self.assertTrue(search.rebuild())
+        self.assertEqual(list(Claim.objects.filter_list('Patient 7').values_list('claim_id', flat=True)), ['C00007'])
+        self.assertEqual(Claim.objects.filter_list('Patient').count(), 3)
+
+
+class LoadDetailCptTests(TestCase):
+    CLAIMS = (
+        'id|patient_name|billed_amount|paid_amount|status|insurer_name|discharge_date\n'
+        '1|Ann|100|40|Pending|Aetna|2024-01-01\n'
+        '2|Bob|100|40|Pending|Aetna|2024-01-01\n'
+    )
+    DETAILS = (
+        'id|claim_id|denial_reason|cpt_codes\n'
+        f'1|1|Late|99204,{"9" * 21},82947\n'
+        '2|2|Late|90834\n'
+    )
+
+    def load(self, **options) -> str:
+        with tempfile.TemporaryDirectory() as directory:
+            paths = {}
+            for name, text in (('csv_list', self.CLAIMS), ('csv_detail', self.DETAILS)):
+                paths[name] = f'{directory}/{name}.csv'
+                with open(paths[name], 'w') as f:
+                    f.write(text)
+            out = io.StringIO()
+            call_command('load_sample_data', quiet=True, stdout=out, **paths, **options)
+        return out.getvalue()
+
+    def test_overlong_codes_rejected(self):
+        output = self.load()
+        codes = ClaimCptCode.objects.filter(claim__claim_id='1').values_list('code', flat=True)
+        self.assertEqual(list(codes), ['99204', '82947'])
+        self.assertIn('over-long CPT codes rejected: 1', output)
+
+    def test_failed_code_write_rolls_back_its_batch(self):
+        with mock.patch('claims.cpt.replace', side_effect=[DatabaseError('boom'), 0]):
+            output = self.load(batch_size=1)
+        self.assertIn('Error writing detail batch 1', output)
+        self.assertEqual(list(ClaimDetail.objects.values_list('claim__claim_id', flat=True)), ['2'])
+
+
+class BulkEndpointTests(QueryCountTestCase):
+    def setUp(self):
+        super().setUp()
+        self.claims = self.add_claims(4)
+        self.claim_ids = [claim.claim_id for claim in self.claims]
+
+    def post(self, name: str, body):
+        return self.client.post(reverse(f'claims:{name}'), json.dumps(body), content_type='application/json')
+
+    def test_bulk_flag(self):
+        response = self.post('bulk_flag_claims', {'claim_ids': self.claim_ids, 'reason': ' Underpaid '})
+        self.assertEqual(response.json()['count'], 4)
+        self.assertEqual(set(Flag.objects.values_list('reason', flat=True)), {'Underpaid'})
+        self.assertEqual(kpis.get_summary('global', '')['flag_count'], 4)
+
+    def test_bulk_flag_rejects_bad_reasons(self):
+        for reason in (5, ['Underpaid'], {'text': 'x'}, '', '   ', 'x' * 201):
+            response = self.post('bulk_flag_claims', {'claim_ids': self.claim_ids, 'reason': reason})
+            self.assertEqual(response.status_code, 400, reason)
+            self.assertIn('error', response.json())
+        self.assertFalse(Flag.objects.exists())
+
+    def test_bulk_note_rejects_bad_content(self):
+        for content in (5, True, ['Call back'], ''):
+            response = self.post('bulk_add_notes', {'claim_ids': self.claim_ids, 'content': content})
+            self.assertEqual(response.status_code, 400, content)
+        response = self.post('bulk_add_notes', {'claim_ids': self.claim_ids, 'content': 'Call back'})
+        self.assertEqual(response.json()['count'], 4)
+
+    def test_bulk_rejects_bad_claim_ids(self):
+        self.assertEqual(self.post('bulk_flag_claims', {'claim_ids': 'C00001', 'reason': 'x'}).status_code, 400)
+        response = self.post('bulk_flag_claims', {'claim_ids': self.claim_ids + ['NOPE'], 'reason': 'x'})
+        self.assertEqual((response.status_code, response.json()['claim_ids']), (404, ['NOPE']))
+
+    def test_reviewer_cannot_flag_unassigned_claims(self):
+        self.client.force_login(self.reviewer)
+        response = self.post('bulk_flag_claims', {'claim_ids': self.claim_ids, 'reason': 'x'})
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(sorted(response.json()['claim_ids']), self.claim_ids[::2])
+
+    def test_bulk_assign(self):
+        response = self.post('bulk_assign_claims', {'claim_ids': self.claim_ids, 'user_id': self.reviewer.pk})
+        self.assertEqual(response.json()['count'], 2)
+        self.assertEqual(Claim.objects.filter(assigned_to=self.reviewer).count(), 4)
+        self.assertEqual(kpis.get_summary('assignee', str(self.reviewer.pk))['claim_count'], 4)
+
+
+class FlakyBroker(events.InProcessBroker):
+    """Fails its first ``failures`` reads like a locked SQLite event log"""
+
+    def __init__(self, failures: int):
+        super().__init__()
+        self.failures = failures
+
+    def read(self, after, timeout):
+        if self.failures:
+            self.failures -= 1
+            raise sqlite3.OperationalError('database is locked')
+        return super().read(after, min(timeout, 0.05))
+
+
+class LockedBroker(events.InProcessBroker):
+    def publish(self, event):
+        raise sqlite3.OperationalError('database is locked')
+
+
+@mock.patch.object(events, 'get_broker', LockedBroker)
+class PublishFailureTests(QueryCountTestCase):
+    """A change that was saved is reported as saved even when its event can't be published"""
+
+    def setUp(self):
+        super().setUp()
+        self.claim = self.add_claims(1)[0]
+
+    def test_flag_and_remove(self):
+        with self.assertLogs('claims.events', 'ERROR'):
+            response = self.client.post(reverse('claims:flag_claim', args=[self.claim.claim_id]), {'reason': 'Underpaid'})
+        self.assertTrue(response.json()['success'])
+        flag = Flag.objects.get()
+        with self.assertLogs('claims.events', 'ERROR'):
+            response = self.client.delete(reverse('claims:remove_flag', args=[flag.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Flag.objects.exists())
+
+    def test_bulk_assign(self):
+        body = json.dumps({'claim_ids': [self.claim.claim_id], 'user_id': self.admin.pk})
+        with self.assertLogs('claims.events', 'ERROR'):
+            response = self.client.post(reverse('claims:bulk_assign_claims'), body, content_type='application/json')
+        self.assertEqual(response.json()['count'], 1)
+
+
+@mock.patch.object(events, 'HUB_RETRY_DELAY', 0.01)
+class AsyncHubTests(SimpleTestCase):
+    async def test_pump_survives_broker_errors(self):
+        broker = FlakyBroker(failures=2)
+        hub = events.AsyncHub(broker)
+        _backlog, subscriber = await hub.subscribe(0)
+        seq = broker.publish({'type': 'claim_flagged'})
+        with self.assertLogs('claims.events', 'ERROR'):
+            received, _frame = await asyncio.wait_for(subscriber.get(), 5)
+        self.assertEqual(received, seq)
+        hub.unsubscribe(subscriber)
+
+    async def test_subscribe_restarts_a_dead_pump(self):
+        broker = events.InProcessBroker()
+        hub = events.AsyncHub(broker)
+        _backlog, first = await hub.subscribe(0)
+        hub._pump_task.cancel()
+        await asyncio.sleep(0)
+        _backlog, second = await hub.subscribe(0)
+        self.assertFalse(hub._pump_task.done())
+        seq = broker.publish({'type': 'claim_flagged'})
+        self.assertEqual((await asyncio.wait_for(second.get(), 10))[0], seq)
+        self.assertEqual((await asyncio.wait_for(first.get(), 10))[0], seq)
+        hub.unsubscribe(first)
+        hub.unsubscribe(second)
+
+
+class EventStreamAppTests(TransactionTestCase):
+    """/events under ASGI: authenticated from the session cookie and streamed outside Django's handler"""
+
+    async def inner_app(self, scope, receive, send):
+        self.passed_through.append(scope['path'])
+
+    def setUp(self):
+        self.passed_through = []
+        self.app = EventStreamApp(self.inner_app)
+        admin = User.objects.create_user('admin', password='x')
+        UserProfile.objects.create(user=admin, role='admin')
+        reviewer = User.objects.create_user('reviewer', password='x')
+        UserProfile.objects.create(user=reviewer, role='reviewer')
+        self.cookies = {}
+        for user in (admin, reviewer):
+            # A client each: logging another user into the same session flushes it
+            client = self.client_class()
+            client.force_login(user)
+            self.cookies[user.username] = f'sessionid={client.cookies["sessionid"].value}'.encode()
+
+    async def open(self, cookie: bytes, path: str = '/events', method: str = 'GET'):
+        """Run the app until it has sent a body frame (or finished); returns (messages, disconnect, task)"""
+        disconnect = asyncio.Event()
+        messages = []
+
+        async def receive():
+            await disconnect.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            messages.append(message)
+
+        scope = {'type': 'http', 'method': method, 'path': path, 'query_string': b'', 'headers': [(b'cookie', cookie)]}
+        task = asyncio.ensure_future(self.app(scope, receive, send))
+        for _ in range(500):
+            if task.done() or any(message.get('body') for message in messages):
+                break
+            await asyncio.sleep(0.01)
+        return messages, disconnect, task
+
+    async def test_admin_stream(self):
+        messages, disconnect, task = await self.open(self.cookies['admin'])
+        self.assertEqual(messages[0]['status'], 200)
+        self.assertIn(b'connected', messages[1]['body'])
+        seq = await sync_to_async(events.notify_clients)('flag_removed', {'flag_id': 1})
+        for _ in range(500):
+            if any(f'id: {seq}'.encode() in message.get('body', b'') for message in messages):
+                break
+            await asyncio.sleep(0.01)
+        else:
+            self.fail('event not delivered')
+        disconnect.set()
+        await asyncio.wait_for(task, 5)
+        self.assertFalse(events.get_hub().subscribers)
+
+    async def test_reviewer_is_refused(self):
+        messages, _disconnect, task = await self.open(self.cookies['reviewer'])
+        await asyncio.wait_for(task, 5)
+        self.assertEqual(messages[0]['status'], 403)
+
+    async def test_anonymous_is_refused(self):
+        messages, _disconnect, task = await self.open(b'')
+        await asyncio.wait_for(task, 5)
+        self.assertEqual(messages[0]['status'], 403)
+
+    async def test_other_requests_go_to_django(self):
+        await self.app({'type': 'http', 'method': 'GET', 'path': '/', 'headers': []}, None, None)
+        await self.app({'type': 'http', 'method': 'POST', 'path': '/events', 'headers': []}, None, None)
+        self.assertEqual(self.passed_through, ['/', '/events'])
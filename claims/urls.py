@@ -13,11 +13,19 @@ urlpatterns = [
     path('note/<int:note_id>/remove/', views.remove_note, name='remove_note'),
     path('claim/<str:claim_id>/assign/', views.assign_claim, name='assign_claim'),
 
+    # Bulk actions on lists of claim ids (one transaction, one SSE event per request)
+    path('api/claims/bulk/flag/', views.bulk_flag_claims, name='bulk_flag_claims'),
+    path('api/claims/bulk/note/', views.bulk_add_notes, name='bulk_add_notes'),
+    path('api/claims/bulk/assign/', views.bulk_assign_claims, name='bulk_assign_claims'),
+
     # APIs/exports (role-based access)
     path('api/admin/stats/', views.api_admin_stats, name='api_admin_stats'),
+    path('api/admin/analytics/', views.api_admin_analytics, name='api_admin_analytics'),
+    path('api/admin/auto-assign/', views.api_auto_assign, name='api_auto_assign'),
     path('api/claims/', views.api_claims, name='api_claims'),
     path('export/claims/json/', views.export_claims_json, name='export_claims_json'),
     path('export/claims/csv/', views.export_claims_csv, name='export_claims_csv'),
+    path('export/claims/parquet/', views.export_claims_parquet, name='export_claims_parquet'),
 
     # Auth and profile
     path('auth/register/', views.user_register, name='user_register'),
@@ -30,4 +38,7 @@ urlpatterns = [
 
     # SSE events for live updates (admin only)
     path('events', views.admin_events, name='events'),
+
+    # Prometheus scrape target (admins, or CLAIMS_METRICS_TOKEN as a bearer token)
+    path('metrics', views.prometheus_metrics, name='metrics'),
 ]
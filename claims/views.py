@@ -1,53 +1,138 @@
 from django.shortcuts import render, get_object_or_404, redirect
-from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
+from django.http import FileResponse, JsonResponse, HttpResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import login, logout, authenticate
 from django.contrib import messages
-from django.db.models import Sum, Q
 from django.utils import timezone
+from django.conf import settings
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
 from django.template.loader import render_to_string
 from django.contrib.auth.models import User
+from django.db import connections
+from django.db.models import Prefetch, prefetch_related_objects
+from django.core.handlers.asgi import ASGIRequest
+from asgiref.sync import sync_to_async
+import asyncio
+import hashlib
+import hmac
 import json
-import queue
+from datetime import datetime
 from .models import Claim, ClaimDetail, Flag, Note, UserProfile
 from .forms import UserRegistrationForm, UserLoginForm, UserProfileForm, NoteForm, FlagForm
+from .pagination import API_DEFAULT_PAGE_SIZE, API_MAX_PAGE_SIZE, KeysetPaginator, InvalidCursor, clamp_page_size
+from .stats import dashboard_stats, list_stats
+from .analytics import clamp_limit, underpayment_drivers
+from .cache import claim_fragment, filter_options, get_or_compute, role_scope
+from .search import SEARCH_ORDERING
+from .serializers import claim_record, list_rows, record_values
+from .exporting import arrow_stream, buffered, claim_records, csv_lines, gzipped, json_array, ndjson, parquet_file, stream_under_asgi
+from .importing import require_pyarrow
+from .assignment import auto_assign
+from .bulk import BatchError, accessible_claims, add_notes, assign_claims, flag_claims, parse_claim_ids
+from .events import bounded, client_buffer, encode_frame, get_broker, get_hub, metrics, notify_clients
+from .metrics import registry
+
+# Seconds between heartbeats on an idle SSE stream
+SSE_HEARTBEAT_SECONDS = 15
+
+
+def _parse_event_id(value):
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
 
-# Simple in-process real-time event hub (SSE)
-_event_clients = set()
 
-def notify_clients(event_type: str, payload: dict) -> None:
-    event = { 'type': event_type, 'timestamp': timezone.now().isoformat(), **payload }
-    for client_q in list(_event_clients):
-        try:
-            client_q.put_nowait(event)
-        except Exception:
-            _event_clients.discard(client_q)
+def _last_event_id(request):
+    """The Last-Event-ID sent by a reconnecting EventSource (or ?last_event_id=)"""
+    return _parse_event_id(request.headers.get('Last-Event-ID') or request.GET.get('last_event_id'))
+
+
+def _can_watch_events(request) -> bool:
+    return request.user.is_authenticated and getattr(getattr(request.user, 'userprofile', None), 'is_admin', False)
+
+
+def _sse_frame(event: dict, seq=None) -> bytes:
+    return encode_frame(json.dumps(event), seq)
 
 
-def admin_events(request):
-    """Server-Sent Events endpoint for admin dashboard real-time updates."""
+def _heartbeat_frame() -> bytes:
+    return _sse_frame({'type': 'heartbeat', 'ts': timezone.now().isoformat()})
+
+
+def _event_stream(broker, after: int, missed: bool):
+    """SSE frames for a WSGI worker thread, which blocks on the broker between events"""
+    # Initial connection message
+    yield _sse_frame({'type': 'connection', 'message': 'connected'})
+    if missed:
+        # Events were lost between connections: refetch state instead of replaying
+        yield _sse_frame({'type': 'resync'}, after)
+    last_seq = after
+    limit = client_buffer()
+    while True:
+        events = broker.read(last_seq, timeout=SSE_HEARTBEAT_SECONDS)
+        if not events:
+            yield _heartbeat_frame()
+            continue
+        frames = bounded([(seq, encode_frame(data, seq)) for seq, data in events], limit)
+        metrics.add(delivered=len(frames))
+        for seq, frame in frames:
+            yield frame
+        last_seq = events[-1][0]
+
+
+async def _async_event_stream(after: int, missed: bool):
+    """SSE frames under ASGI: the client is an asyncio.Queue on the loop's shared hub, not a thread"""
+    yield _sse_frame({'type': 'connection', 'message': 'connected'})
+    if missed:
+        yield _sse_frame({'type': 'resync'}, after)
+    hub = get_hub()
+    backlog, subscriber = await hub.subscribe(after)
+    last_seq = after
+    try:
+        for seq, frame in backlog:
+            yield frame
+            last_seq = seq
+        while True:
+            try:
+                seq, frame = await asyncio.wait_for(subscriber.get(), SSE_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield _heartbeat_frame()
+                continue
+            if seq > last_seq:
+                yield frame
+                last_seq = seq
+    finally:
+        hub.unsubscribe(subscriber)
+
+
+async def admin_events(request):
+    """Server-Sent Events endpoint for admin dashboard real-time updates.
+
+    Under claims_burger.asgi, GET requests never reach this view: they are
+    streamed by claims.asgi.EventStreamApp without holding a thread. Behind
+    a plain Django ASGI app the stream is still served from the event loop,
+    but Django keeps a thread for the request until it ends; under WSGI each
+    open stream occupies a worker thread.
+    """
     # Only allow admin users
-    if not request.user.is_authenticated or not getattr(request.user.userprofile, 'is_admin', False):
+    if not await sync_to_async(_can_watch_events)(request):
         return HttpResponse('Access denied', status=403)
     
-    def event_stream():
-        client_q = queue.Queue()
-        _event_clients.add(client_q)
-        try:
-            # Initial connection message
-            yield f"data: {json.dumps({'type': 'connection', 'message': 'connected'})}\n\n"
-            while True:
-                try:
-                    event = client_q.get(timeout=15)
-                    yield f"data: {json.dumps(event)}\n\n"
-                except queue.Empty:
-                    yield f"data: {json.dumps({'type': 'heartbeat', 'ts': timezone.now().isoformat()})}\n\n"
-        finally:
-            _event_clients.discard(client_q)
-
-    response = StreamingHttpResponse(event_stream(), content_type='text/event-stream')
+    broker = get_broker()
+    after, missed = await sync_to_async(broker.resume)(_last_event_id(request))
+    # The stream never queries the database; don't hold a connection while it is open
+    await sync_to_async(connections.close_all)()
+    if isinstance(request, ASGIRequest):
+        stream = _async_event_stream(after, missed)
+    else:
+        stream = _event_stream(broker, after, missed)
+    
+    response = StreamingHttpResponse(stream, content_type='text/event-stream')
     response['Cache-Control'] = 'no-cache'
     return response
 
@@ -57,8 +142,9 @@ def index(request):
     if not request.user.is_authenticated:
         return redirect('claims:user_login')
     
-    page = request.GET.get('page', 1)
-    per_page = 10
+    # Keyset pagination: ?cursor=<token>&per_page=<n> (capped at MAX_PAGE_SIZE)
+    cursor = request.GET.get('cursor') or None
+    per_page = clamp_page_size(request.GET.get('per_page'))
     
     # Search and filter functionality
     search = request.GET.get('search', '')
@@ -67,66 +153,50 @@ def index(request):
     
     # Role-based claim access
     user_profile = getattr(request.user, 'userprofile', None)
-    if user_profile and user_profile.can_see_all_claims:
-        # Admin users can see all claims
-        claims = Claim.objects.all()
-    else:
-        # Regular users only see their assigned claims
-        claims = Claim.objects.filter(assigned_to=request.user)
+    claims = Claim.objects.accessible_to(request.user).filter_list(search, status_filter, insurer_filter)
     
+    # Searches are ordered by full-text relevance, everything else newest first
+    # The table only renders a few columns, so pages are read as lean named-tuple rows
     if search:
-        claims = claims.filter(
-            Q(patient_name__icontains=search) |
-            Q(claim_id__icontains=search) |
-            Q(insurer_name__icontains=search)
-        )
-    
-    if status_filter:
-        claims = claims.filter(status=status_filter)
-    
-    if insurer_filter:
-        claims = claims.filter(insurer_name=insurer_filter)
-    
-    claims = claims.order_by('-created_at')
-    
-    # Get unique statuses and insurers for filter dropdowns (only for user's accessible claims)
-    statuses = claims.values_list('status', flat=True).distinct()
-    insurers = claims.values_list('insurer_name', flat=True).distinct()
-    
-    # KPI stats based on user's access level
-    total_claims = claims.count()
-    if user_profile and user_profile.can_see_all_claims:
-        flagged_claims = Flag.objects.count()
-        total_billed = Claim.objects.aggregate(total=Sum('billed_amount'))['total'] or 0
-        total_paid = Claim.objects.aggregate(total=Sum('paid_amount'))['total'] or 0
+        paginator = KeysetPaginator(list_rows(claims.ranked(search), ranked=True), ordering=SEARCH_ORDERING, per_page=per_page)
     else:
-        flagged_claims = Flag.objects.filter(claim__assigned_to=request.user).count()
-        total_billed = claims.aggregate(total=Sum('billed_amount'))['total'] or 0
-        total_paid = claims.aggregate(total=Sum('paid_amount'))['total'] or 0
+        paginator = KeysetPaginator(list_rows(claims), ordering=('-created_at', '-id'), per_page=per_page)
+    try:
+        page = paginator.page(cursor)
+    except InvalidCursor:
+        return HttpResponse('Invalid cursor', status=400)
     
-    average_underpayment = total_billed - total_paid
+    # KPI stats based on user's access level (free-text searches are too varied to cache)
+    if search:
+        stats = list_stats(request.user, claims, search, status_filter, insurer_filter)
+    else:
+        stats = get_or_compute(
+            'list_stats', (role_scope(request.user), status_filter, insurer_filter),
+            lambda: list_stats(request.user, claims, search, status_filter, insurer_filter),
+        )
     
     context = {
-        'claims': claims,
+        'claims': page.items,
+        'page': page,
+        'per_page': per_page,
         'search': search,
         'status_filter': status_filter,
         'insurer_filter': insurer_filter,
-        'statuses': statuses,
-        'insurers': insurers,
         'user': request.user,
         'user_profile': user_profile,
-        'stats': {
-            'total_claims': total_claims,
-            'flagged_claims': flagged_claims,
-            'total_billed': total_billed,
-            'average_underpayment': average_underpayment,
-        }
+        'stats': stats,
     }
     
+    # HTMX "load more": append the next rows (plus a new sentinel) to the existing table body
+    if request.headers.get('HX-Request') and request.GET.get('append'):
+        return render(request, 'partials/claims_rows.html', context)
+    
     # If this is an HTMX request, return just the table fragment to avoid duplicating the page UI
     if request.headers.get('HX-Request'):
         return render(request, 'partials/claims_table.html', context)
 
+    # Unique statuses and insurers for the filter dropdowns (only for user's accessible claims)
+    context['statuses'], context['insurers'] = filter_options(request.user, Claim.objects.accessible_to(request.user))
     return render(request, 'index.html', context)
 
 
@@ -208,10 +278,57 @@ def user_profile(request):
     return render(request, 'auth/profile.html', context)
 
 
+def _cpt_codes_list(detail):
+    """The detail's CPT codes, from its prefetched ClaimCptCode rows"""
+    if not detail:
+        return []
+    return [entry.code for entry in detail.codes.all()]
+
+
+def _claim_detail_context(request, claim, user_profile):
+    """Template context shared by the claim detail page and fragment.
+
+    Details (with their CPT codes), notes and flags (with their users) are
+    prefetched in four queries; the current user's notes and flags are
+    filtered in Python.
+    """
+    prefetch_related_objects(
+        [claim],
+        Prefetch('details', queryset=ClaimDetail.objects.order_by('pk').prefetch_related('codes')),
+        Prefetch('notes', queryset=Note.objects.select_related('user').order_by('-created_at')),
+        Prefetch('flags', queryset=Flag.objects.select_related('user').order_by('-created_at')),
+    )
+    all_notes = list(claim.notes.all())
+    all_flags = list(claim.flags.all())
+    detail = next(iter(claim.details.all()), None)
+    user_id = request.user.pk if request.user.is_authenticated else None
+    
+    return {
+        'claim': claim,
+        'detail': detail,
+        'cpt_codes_list': _cpt_codes_list(detail),
+        'user_notes': [note for note in all_notes if note.user_id == user_id],
+        'user_flags': [flag for flag in all_flags if flag.user_id == user_id],
+        'all_notes': all_notes,
+        'all_flags': all_flags,
+        'user': request.user,
+        'user_profile': user_profile,
+    }
+
+
+def _claim_fragment_response(request, claim, user_profile):
+    """Render (or fetch from cache) the HTMX claim details fragment"""
+    def render_fragment():
+        context = _claim_detail_context(request, claim, user_profile)
+        return render_to_string('partials/claim_details.html', context, request=request)
+
+    return HttpResponse(claim_fragment(request, claim, render_fragment))
+
+
 @login_required
 def claim_detail(request, claim_id):
     """Claim detail view with role-based access control"""
-    claim = get_object_or_404(Claim, claim_id=claim_id)
+    claim = get_object_or_404(Claim.objects.select_related('assigned_to'), claim_id=claim_id)
     
     # Check if user has access to this claim
     user_profile = getattr(request.user, 'userprofile', None)
@@ -219,86 +336,26 @@ def claim_detail(request, claim_id):
         messages.error(request, 'You do not have permission to view this claim.')
         return redirect('claims:index')
     
-    # Prepare CPT codes list for display badges
-    cpt_codes_list = []
-    if hasattr(claim, 'details') and claim.details.exists():
-        detail_obj = claim.details.first()
-        if detail_obj and detail_obj.cpt_codes:
-            raw = str(detail_obj.cpt_codes)
-            # Split on comma or whitespace, normalize and dedupe while preserving order
-            parts = [p.strip() for p in raw.replace('\n', ',').replace('\t', ',').split(',') if p.strip()]
-            seen = set()
-            for p in parts:
-                if p not in seen:
-                    seen.add(p)
-                    cpt_codes_list.append(p)
-
-    # Get user-specific notes and flags
-    user_notes = claim.notes.filter(user=request.user).order_by('-created_at')
-    user_flags = claim.flags.filter(user=request.user).order_by('-created_at')
-    
-    # Get all notes and flags for admin users
-    all_notes = claim.notes.all().order_by('-created_at')
-    all_flags = claim.flags.all().order_by('-created_at')
-    
-    context = {
-        'claim': claim,
-        'user_notes': user_notes,
-        'user_flags': user_flags,
-        'all_notes': all_notes,
-        'all_flags': all_flags,
-        'user': request.user,
-        'user_profile': user_profile,
-        'note_form': NoteForm(),
-        'flag_form': FlagForm(),
-        'cpt_codes_list': cpt_codes_list,
-    }
-    
     # If this is an HTMX request, return the partial template
     if request.headers.get('HX-Request'):
-        return render(request, 'partials/claim_details.html', context)
+        return _claim_fragment_response(request, claim, user_profile)
+    
+    context = _claim_detail_context(request, claim, user_profile)
+    context.update(note_form=NoteForm(), flag_form=FlagForm())
     
     return render(request, 'claim_detail.html', context)
 
 
 def claim_details_partial(request, claim_id):
     """HTMX partial for claim details"""
-    claim = get_object_or_404(Claim, claim_id=claim_id)
+    claim = get_object_or_404(Claim.objects.select_related('assigned_to'), claim_id=claim_id)
     
     # Check access permissions
     user_profile = getattr(request.user, 'userprofile', None)
     if not (user_profile and user_profile.can_see_all_claims) and claim.assigned_to != request.user:
         return HttpResponse('<div class="text-red-600">Access denied</div>', status=403)
     
-    cpt_codes_list = []
-    if hasattr(claim, 'details') and claim.details.exists():
-        detail_obj = claim.details.first()
-        if detail_obj and detail_obj.cpt_codes:
-            raw = str(detail_obj.cpt_codes)
-            parts = [p.strip() for p in raw.replace('\n', ',').replace('\t', ',').split(',') if p.strip()]
-            seen = set()
-            for p in parts:
-                if p not in seen:
-                    seen.add(p)
-                    cpt_codes_list.append(p)
-
-    # Build lists according to user role
-    user_notes = claim.notes.filter(user=request.user).order_by('-created_at') if request.user.is_authenticated else claim.notes.none()
-    user_flags = claim.flags.filter(user=request.user).order_by('-created_at') if request.user.is_authenticated else claim.flags.none()
-    all_notes = claim.notes.all().order_by('-created_at')
-    all_flags = claim.flags.all().order_by('-created_at')
-
-    context = {
-        'claim': claim,
-        'cpt_codes_list': cpt_codes_list,
-        'user_notes': user_notes,
-        'user_flags': user_flags,
-        'all_notes': all_notes,
-        'all_flags': all_flags,
-        'user': request.user,
-        'user_profile': user_profile,
-    }
-    return render(request, 'partials/claim_details.html', context)
+    return _claim_fragment_response(request, claim, user_profile)
 
 
 @login_required
@@ -462,31 +519,15 @@ def admin_dashboard(request):
         messages.error(request, 'Access denied. Admin privileges required.')
         return redirect('claims:index')
     
-    total_claims = Claim.objects.count()
-    flagged_claims = Flag.objects.count()
-    total_billed = Claim.objects.aggregate(total=Sum('billed_amount'))['total'] or 0
-    total_paid = Claim.objects.aggregate(total=Sum('paid_amount'))['total'] or 0
-    average_underpayment = total_billed - total_paid
+    stats = get_or_compute('dashboard_stats', (), dashboard_stats)
     
     # Get recent flags for real-time updates
-    recent_flags = Flag.objects.select_related('claim').order_by('-created_at')[:10]
+    stats['recent_flags'] = Flag.objects.select_related('claim').order_by('-created_at')[:10]
     
-    # Get claims by assignment status
-    unassigned_claims = Claim.objects.filter(assigned_to__isnull=True).count()
-    assigned_claims = Claim.objects.filter(assigned_to__isnull=False).count()
-    
-    stats = {
-        'total_claims': total_claims,
-        'flagged_claims': flagged_claims,
-        'total_billed': total_billed,
-        'total_paid': total_paid,
-        'average_underpayment': average_underpayment,
-        'unassigned_claims': unassigned_claims,
-        'assigned_claims': assigned_claims,
-        'recent_flags': recent_flags
-    }
+    # Insurer choices for the underpayment drivers panel
+    _statuses, insurers = filter_options(request.user, Claim.objects.all())
     
-    return render(request, 'admin_dashboard.html', {'stats': stats})
+    return render(request, 'admin_dashboard.html', {'stats': stats, 'insurers': insurers})
 
 
 def api_admin_stats(request):
@@ -495,11 +536,7 @@ def api_admin_stats(request):
     if not (user_profile and user_profile.can_see_all_claims):
         return JsonResponse({'error': 'Access denied'}, status=403)
     
-    total_claims = Claim.objects.count()
-    flagged_claims = Flag.objects.count()
-    total_billed = Claim.objects.aggregate(total=Sum('billed_amount'))['total'] or 0
-    total_paid = Claim.objects.aggregate(total=Sum('paid_amount'))['total'] or 0
-    average_underpayment = total_billed - total_paid
+    stats = get_or_compute('dashboard_stats', (), dashboard_stats)
     
     # Get recent flags
     recent_flags = Flag.objects.select_related('claim').order_by('-created_at')[:10]
@@ -516,109 +553,175 @@ def api_admin_stats(request):
         })
     
     return JsonResponse({
-        'total_claims': total_claims,
-        'flagged_claims': flagged_claims,
-        'total_billed': float(total_billed),
-        'total_paid': float(total_paid),
-        'average_underpayment': float(average_underpayment),
-        'recent_flags': flags_data
+        'total_claims': stats['total_claims'],
+        'flagged_claims': stats['flagged_claims'],
+        'total_billed': float(stats['total_billed']),
+        'total_paid': float(stats['total_paid']),
+        'average_underpayment': float(stats['average_underpayment']),
+        'recent_flags': flags_data,
+        'event_stream': metrics.snapshot(),
     })
 
 
+def api_admin_analytics(request):
+    """Top CPT codes and denial reasons by count and by underpayment - admin only"""
+    user_profile = getattr(request.user, 'userprofile', None)
+    if not (user_profile and user_profile.can_see_all_claims):
+        return JsonResponse({'error': 'Access denied'}, status=403)
+    
+    insurer = request.GET.get('insurer', '')
+    dates = {}
+    for param in ('date_from', 'date_to'):
+        value = request.GET.get(param, '')
+        try:
+            dates[param] = parse_date(value) if value else None
+        except ValueError:
+            dates[param] = None
+        if value and dates[param] is None:
+            return JsonResponse({'error': f'{param} must be a YYYY-MM-DD date'}, status=400)
+    limit = clamp_limit(request.GET.get('limit'))
+    
+    drivers = underpayment_drivers(insurer, dates['date_from'], dates['date_to'], limit)
+    for rankings in drivers.values():
+        for ranking, rows in rankings.items():
+            rankings[ranking] = [{**row, 'underpayment': float(row['underpayment'])} for row in rows]
+    
+    return JsonResponse({
+        'filters': {
+            'insurer': insurer,
+            'date_from': dates['date_from'].isoformat() if dates['date_from'] else None,
+            'date_to': dates['date_to'].isoformat() if dates['date_to'] else None,
+            'limit': limit,
+        },
+        **drivers,
+    })
+
+
+def _updated_since(value):
+    """Parse ?updated_since= (ISO 8601 date or datetime; naive values are in the current time zone)"""
+    if not value:
+        return None
+    since = parse_datetime(value)
+    if since is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError('updated_since must be an ISO 8601 date or datetime')
+        since = datetime.combine(day, datetime.min.time())
+    if timezone.is_naive(since):
+        since = timezone.make_aware(since)
+    return since
+
+
 def api_claims(request):
-    """API endpoint for claims data - role-based access"""
+    """API endpoint for claims data - role-based access.
+
+    Returns a JSON array of up to ?limit= claims in (updated_at, id) order,
+    filtered like the claims list (?search=, ?status=, ?insurer=) and by
+    ?updated_since=. The next page's cursor is in the Link and X-Next-Cursor
+    headers. Responses carry a strong ETag of the body; If-None-Match requests
+    that still match get a 304.
+    """
     if not request.user.is_authenticated:
         return JsonResponse({'error': 'Authentication required'}, status=401)
     
-    user_profile = getattr(request.user, 'userprofile', None)
-    if user_profile and user_profile.can_see_all_claims:
-        claims = Claim.objects.all()
-    else:
-        claims = Claim.objects.filter(assigned_to=request.user)
+    try:
+        since = _updated_since(request.GET.get('updated_since'))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
     
-    claims_data = [{
-        'id': claim.claim_id,
-        'patient_name': claim.patient_name,
-        'billed_amount': float(claim.billed_amount),
-        'paid_amount': float(claim.paid_amount),
-        'status': claim.status,
-        'insurer_name': claim.insurer_name,
-        'discharge_date': claim.discharge_date.strftime('%Y-%m-%d') if claim.discharge_date else None
-    } for claim in claims]
+    claims = Claim.objects.accessible_to(request.user).filter_list(
+        request.GET.get('search', ''), request.GET.get('status', ''), request.GET.get('insurer', ''),
+    )
+    if since:
+        claims = claims.filter(updated_at__gte=since)
     
-    return JsonResponse(claims_data, safe=False)
+    limit = clamp_page_size(request.GET.get('limit'), API_DEFAULT_PAGE_SIZE, API_MAX_PAGE_SIZE)
+    paginator = KeysetPaginator(record_values(claims, 'updated_at', 'id', named=True), ordering=('updated_at', 'id'), per_page=limit)
+    try:
+        page = paginator.page(request.GET.get('cursor') or None)
+    except InvalidCursor:
+        return JsonResponse({'error': 'Invalid cursor'}, status=400)
+    
+    claims_data = []
+    for row in page.items:
+        record = claim_record(row)
+        record['updated_at'] = row.updated_at.isoformat()
+        claims_data.append(record)
+    response = JsonResponse(claims_data, safe=False)
+    
+    if page.next_cursor:
+        query = request.GET.copy()
+        query['cursor'] = page.next_cursor
+        query['limit'] = limit
+        next_url = request.build_absolute_uri(f'{request.path}?{query.urlencode()}')
+        response['Link'] = f'<{next_url}>; rel="next"'
+        response['X-Next-Cursor'] = page.next_cursor
+    
+    # The ETag hashes the exact body, so it changes with any edit, reassignment or deletion in this
+    # page. No Last-Modified: a timestamp can't see deletions and has one-second resolution, so
+    # If-Modified-Since could answer 304 for a page that did change.
+    response['ETag'] = quote_etag(hashlib.blake2b(response.content, digest_size=16).hexdigest())
+    patch_cache_control(response, private=True, no_cache=True)
+    return get_conditional_response(request, etag=response['ETag'], response=response)
+
+
+def _export_queryset(request):
+    """Claims for an export: the user's accessible claims with the list view's filters"""
+    return Claim.objects.accessible_to(request.user).filter_list(
+        request.GET.get('search', ''), request.GET.get('status', ''), request.GET.get('insurer', ''),
+    )
 
 
 @login_required
+@stream_under_asgi
 def export_claims_json(request):
-    """Export claims data as JSON - role-based access"""
-    user_profile = getattr(request.user, 'userprofile', None)
-    if user_profile and user_profile.can_see_all_claims:
-        claims = Claim.objects.all()
-    else:
-        claims = Claim.objects.filter(assigned_to=request.user)
-    
-    claims_data = []
+    """Export claims data as JSON (or NDJSON with ?format=ndjson) - role-based access"""
+    records = claim_records(_export_queryset(request))
     
-    for claim in claims:
-        claim_data = {
-            'id': claim.claim_id,
-            'patient_name': claim.patient_name,
-            'billed_amount': float(claim.billed_amount),
-            'paid_amount': float(claim.paid_amount),
-            'status': claim.status,
-            'insurer_name': claim.insurer_name,
-            'discharge_date': claim.discharge_date.strftime('%Y-%d-%m') if claim.discharge_date else None
-        }
-        
-        # Add claim details if available
-        if hasattr(claim, 'details') and claim.details.exists():
-            detail = claim.details.first()
-            claim_data['cpt_codes'] = detail.cpt_codes if detail.cpt_codes else None
-            claim_data['denial_reason'] = detail.denial_reason if detail.denial_reason else None
-        
-        claims_data.append(claim_data)
+    # Stream the rows as they are read instead of building the whole document in memory
+    if request.GET.get('format') == 'ndjson':
+        response = StreamingHttpResponse(buffered(ndjson(records)), content_type='application/x-ndjson')
+        response['Content-Disposition'] = 'attachment; filename=claim_list_data.ndjson'
+        return response
     
-    response = HttpResponse(
-        json.dumps(claims_data, indent=2),
-        content_type='application/json'
-    )
+    response = StreamingHttpResponse(buffered(json_array(records)), content_type='application/json')
     response['Content-Disposition'] = 'attachment; filename=claim_list_data.json'
     return response
 
 
 @login_required
+@stream_under_asgi
 def export_claims_csv(request):
-    """Export claims data as CSV - role-based access"""
-    import csv
+    """Export claims data as CSV (gzipped with ?compress=gzip) - role-based access"""
+    chunks = buffered(csv_lines(_export_queryset(request)))
     
-    user_profile = getattr(request.user, 'userprofile', None)
-    if user_profile and user_profile.can_see_all_claims:
-        claims = Claim.objects.all()
-    else:
-        claims = Claim.objects.filter(assigned_to=request.user)
+    if request.GET.get('compress') == 'gzip':
+        response = StreamingHttpResponse(gzipped(chunks), content_type='application/gzip')
+        response['Content-Disposition'] = 'attachment; filename=claim_list_data.csv.gz'
+        return response
     
-    response = HttpResponse(content_type='text/csv')
+    response = StreamingHttpResponse(chunks, content_type='text/csv')
     response['Content-Disposition'] = 'attachment; filename=claim_list_data.csv'
+    return response
+
+
+@login_required
+@stream_under_asgi
+def export_claims_parquet(request):
+    """Export claims as Parquet (or an Arrow IPC stream with ?format=arrow) - role-based access"""
+    try:
+        require_pyarrow()
+    except ImportError as e:
+        return JsonResponse({'error': str(e)}, status=501)
     
-    writer = csv.writer(response, delimiter='|')
-    
-    # Write header
-    writer.writerow(['id', 'patient_name', 'billed_amount', 'paid_amount', 'status', 'insurer_name', 'discharge_date'])
-    
-    # Write data
-    for claim in claims:
-        writer.writerow([
-            claim.claim_id,
-            claim.patient_name,
-            claim.billed_amount,
-            claim.paid_amount,
-            claim.status,
-            claim.insurer_name,
-            claim.discharge_date.strftime('%Y-%m-%d') if claim.discharge_date else ''
-        ])
+    claims = _export_queryset(request)
+    if request.GET.get('format') == 'arrow':
+        response = StreamingHttpResponse(arrow_stream(claims), content_type='application/vnd.apache.arrow.stream')
+        response['Content-Disposition'] = 'attachment; filename=claim_list_data.arrows'
+        return response
     
-    return response
+    return FileResponse(parquet_file(claims), as_attachment=True, filename='claim_list_data.parquet',
+                        content_type='application/vnd.apache.parquet')
 
 
 @login_required
@@ -647,3 +750,149 @@ def assign_claim(request, claim_id):
         claim.assigned_to = None
         claim.save()
         return JsonResponse({'success': True, 'message': 'Claim unassigned'})
+
+
+def _bulk_request(request):
+    """``(data, claim rows)`` for a bulk endpoint: JSON or form-encoded, every claim accessible"""
+    if request.META.get('CONTENT_TYPE', '').startswith('application/json'):
+        try:
+            data = json.loads(request.body or '{}')
+        except ValueError:
+            raise BatchError('Invalid JSON body')
+        if not isinstance(data, dict):
+            raise BatchError('Expected a JSON object')
+        claim_ids = data.get('claim_ids')
+    else:
+        data = request.POST
+        claim_ids = data.getlist('claim_ids')
+    return data, accessible_claims(request.user, parse_claim_ids(claim_ids))
+
+
+def _batch_error(error: BatchError) -> JsonResponse:
+    return JsonResponse({'error': str(error), 'claim_ids': error.claim_ids}, status=error.status)
+
+
+@login_required
+@csrf_exempt
+@require_http_methods(["POST"])
+def bulk_flag_claims(request):
+    """Flag many claims with one reason: {"claim_ids": [...], "reason": "..."}"""
+    try:
+        data, rows = _bulk_request(request)
+    except BatchError as e:
+        return _batch_error(e)
+    
+    reason = data.get('reason') or ''
+    reason = reason.strip() if isinstance(reason, str) else ''
+    if not reason or len(reason) > Flag._meta.get_field('reason').max_length:
+        return JsonResponse({'error': 'A reason of at most 200 characters is required'}, status=400)
+    
+    flags = flag_claims(request.user, rows, reason)
+    
+    # One event for the whole batch (only for admin users, as with single flags)
+    user_profile = getattr(request.user, 'userprofile', None)
+    if user_profile and user_profile.can_see_all_claims:
+        notify_clients('flags_added', {'count': len(flags), 'reason': reason, 'user': request.user.username})
+    
+    return JsonResponse({'success': True, 'count': len(flags), 'message': f'Flagged {len(flags)} claims'})
+
+
+@login_required
+@csrf_exempt
+@require_http_methods(["POST"])
+def bulk_add_notes(request):
+    """Add the same note to many claims: {"claim_ids": [...], "content": "..."}"""
+    try:
+        data, rows = _bulk_request(request)
+    except BatchError as e:
+        return _batch_error(e)
+    
+    content = data.get('content') or ''
+    content = content.strip() if isinstance(content, str) else ''
+    if not content:
+        return JsonResponse({'error': 'Note content is required'}, status=400)
+    
+    notes = add_notes(request.user, rows, content)
+    return JsonResponse({'success': True, 'count': len(notes), 'message': f'Added a note to {len(notes)} claims'})
+
+
+@login_required
+@csrf_exempt
+@require_http_methods(["POST"])
+def bulk_assign_claims(request):
+    """Assign many claims to one user, or unassign them: {"claim_ids": [...], "user_id": 3 | null}"""
+    user_profile = getattr(request.user, 'userprofile', None)
+    if not (user_profile and user_profile.can_assign_claims):
+        return JsonResponse({'error': 'Access denied. You cannot assign claims.'}, status=403)
+    
+    try:
+        data, rows = _bulk_request(request)
+    except BatchError as e:
+        return _batch_error(e)
+    
+    assignee = None
+    user_id = data.get('user_id')
+    if user_id:
+        assignee = User.objects.filter(id=user_id).first() if str(user_id).isdigit() else None
+        if assignee is None:
+            return JsonResponse({'error': 'User not found'}, status=404)
+    
+    changed = assign_claims(rows, assignee)
+    if changed:
+        notify_clients('claims_assigned', {'count': changed, 'assigned_to': getattr(assignee, 'username', None)})
+    
+    target = f'assigned to {assignee.username}' if assignee else 'unassigned'
+    return JsonResponse({'success': True, 'count': changed, 'message': f'{changed} claims {target}'})
+
+
+@login_required
+@csrf_exempt
+@require_http_methods(["POST"])
+def api_auto_assign(request):
+    """Spread unassigned claims across active reviewers - admin/supervisor only.
+
+    JSON options: statuses, insurer, limit, reviewers (usernames),
+    count_weight, billed_weight and dry_run.
+    """
+    user_profile = getattr(request.user, 'userprofile', None)
+    if not (user_profile and user_profile.can_assign_claims):
+        return JsonResponse({'error': 'Access denied. You cannot assign claims.'}, status=403)
+    
+    try:
+        data = json.loads(request.body or '{}')
+        if not isinstance(data, dict):
+            raise ValueError('Expected a JSON object')
+        limit = data.get('limit')
+        if limit is not None and (isinstance(limit, bool) or not isinstance(limit, (int, str))):
+            raise ValueError('limit must be a positive integer')
+        summary = auto_assign(
+            statuses=data.get('statuses') or None,
+            insurer=data.get('insurer') or '',
+            limit=int(limit) if limit is not None else None,
+            usernames=data.get('reviewers') or None,
+            count_weight=float(data.get('count_weight', 1)),
+            billed_weight=float(data.get('billed_weight', 1)),
+            dry_run=bool(data.get('dry_run')),
+        )
+    except (TypeError, ValueError) as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    if summary['assigned']:
+        notify_clients('claims_assigned', {'count': summary['assigned'], 'auto': True})
+    
+    for reviewer in summary['reviewers']:
+        reviewer['billed_added'] = float(reviewer['billed_added'])
+        reviewer['billed_total'] = float(reviewer['billed_total'])
+    return JsonResponse(summary)
+
+
+def prometheus_metrics(request):
+    """Per-view request metrics in the Prometheus text format - admins, or a bearer token scraper"""
+    token = getattr(settings, 'CLAIMS_METRICS_TOKEN', '')
+    authorization = request.headers.get('Authorization', '')
+    scraper = bool(token) and hmac.compare_digest(authorization.encode(), f'Bearer {token}'.encode())
+    user_profile = getattr(request.user, 'userprofile', None)
+    if not (scraper or (user_profile and user_profile.can_see_all_claims)):
+        return HttpResponse('Access denied\n', status=403, content_type='text/plain')
+    
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
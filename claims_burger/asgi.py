@@ -0,0 +1,19 @@
+"""
+ASGI config for claims_burger project.
+
+Serve with an ASGI server (e.g. ``uvicorn claims_burger.asgi:application``) so
+the admin SSE stream runs on the event loop instead of holding a worker thread
+per connected dashboard (claims.asgi.EventStreamApp; everything else is Django).
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'claims_burger.settings')
+
+django_application = get_asgi_application()
+
+from claims.asgi import EventStreamApp  # noqa: E402 (needs the app registry loaded above)
+
+application = EventStreamApp(django_application)
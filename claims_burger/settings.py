@@ -29,6 +29,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Outermost, so its timings include the rest of the stack
+    'claims.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -37,6 +39,8 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'django_htmx.middleware.HtmxMiddleware',
+    # After authentication, which it needs to recognise admins asking for a profile
+    'claims.middleware.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'claims_burger.urls'
@@ -58,6 +62,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'claims_burger.wsgi.application'
+ASGI_APPLICATION = 'claims_burger.asgi.application'
 
 # Database
 DATABASES = {
@@ -67,6 +72,56 @@ DATABASES = {
     }
 }
 
+# Cache
+# Set REDIS_URL (e.g. redis://localhost:6379/0) to share the cache across processes and hosts;
+# otherwise a file-based cache is used, which needs no services and is still shared by the
+# web workers and management commands (e.g. imports) on one machine.
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get('CLAIMS_CACHE_DIR', str(BASE_DIR / '.django_cache')),
+        }
+    }
+
+# Seconds to keep cached filter options / KPI blocks, and rendered claim detail fragments
+CLAIMS_CACHE_TIMEOUT = 300
+CLAIMS_FRAGMENT_CACHE_TIMEOUT = 60
+
+# Live events for the admin SSE stream (see claims/events.py). 'memory' only reaches clients
+# of the publishing process; set CLAIMS_EVENT_BROKER=sqlite when running several worker
+# processes (e.g. gunicorn -w 4) so they share one event log on this machine.
+CLAIMS_EVENT_BROKER = os.environ.get('CLAIMS_EVENT_BROKER', 'memory')
+CLAIMS_EVENTS_DB = os.environ.get('CLAIMS_EVENTS_DB', str(BASE_DIR / '.claims_events.sqlite3'))
+# Recent events kept for Last-Event-ID replay after a reconnect
+CLAIMS_EVENT_BUFFER = 1000
+# Frames an SSE client may have pending; a bigger burst becomes one 'stats_changed' refetch hint
+CLAIMS_SSE_CLIENT_BUFFER = 100
+
+# Per-request timing and SQL metrics (claims/middleware.py), served at /metrics. Scrapers
+# authenticate with 'Authorization: Bearer <CLAIMS_METRICS_TOKEN>'; admins can view it logged in.
+CLAIMS_REQUEST_METRICS = os.environ.get('CLAIMS_REQUEST_METRICS', '1') != '0'
+CLAIMS_METRICS_TOKEN = os.environ.get('CLAIMS_METRICS_TOKEN', '')
+# Add a Server-Timing header (app and db time, query count) to every response
+CLAIMS_SERVER_TIMING = True
+# Log a warning when one request repeats this many identical queries (0 to disable)
+CLAIMS_DUPLICATE_QUERY_WARNING = 10
+
+# cProfile captures (claims/profiling.py): admins add ?profile=1 or 'X-Profile: 1' to a request;
+# CLAIMS_PROFILE_SAMPLE_RATE (e.g. 0.001) also profiles that fraction of all requests.
+# List them with 'manage.py list_profiles'; only the newest CLAIMS_PROFILE_KEEP are kept.
+CLAIMS_PROFILING = os.environ.get('CLAIMS_PROFILING', '1') != '0'
+CLAIMS_PROFILE_SAMPLE_RATE = float(os.environ.get('CLAIMS_PROFILE_SAMPLE_RATE', '0'))
+CLAIMS_PROFILE_DIR = os.environ.get('CLAIMS_PROFILE_DIR', str(BASE_DIR / '.profiles'))
+CLAIMS_PROFILE_KEEP = 200
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
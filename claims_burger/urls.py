@@ -5,6 +5,7 @@ from django.contrib import admin
 from django.urls import path, include
 
 urlpatterns = [
-    path('admin/', admin.site.urls),
+    # Before the Django admin, whose catch-all would otherwise swallow admin/dashboard/
     path('', include('claims.urls')),
+    path('admin/', admin.site.urls),
 ]